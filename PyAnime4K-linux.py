@@ -1,608 +1,723 @@
-import json
-import os
-import sys
-from PySide6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit, QFileDialog,
-                               QMainWindow, QMessageBox, QComboBox, QLabel, QLineEdit, QFrame)
-from PySide6.QtCore import QThread, Signal, QSharedMemory
-from PySide6.QtGui import QIcon, QTextCursor, QTextBlockFormat, Qt, QAction, QIntValidator
-from ffmpeg_progress_yield import FfmpegProgress
-from tqdm import tqdm
-import subprocess
-import cv2
-import psutil
-from pathlib import Path
-
-
-class MainWindow(QMainWindow):
-    output_signal = Signal(str)
-    progress_signal = Signal(str)
-    error_box_signal = Signal(str)
-    f_probe_signal = Signal(str)
-    finished_signal = Signal(str)
-
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("PyAnime4K-GUI v2.6")
-        self.setWindowIcon(QIcon('Resources/anime.ico'))
-        self.setGeometry(100, 100, 1000, 650)
-        self.selected_files = None
-        self.std_thread = QThread()
-        self.encode_thread = QThread()
-        self.pass_param_thread = QThread()
-        self.compare_thread = QThread()
-        self.progress_thread = QThread()
-        self.reading_thread = QThread()
-        self.ffmpeg_progress = None
-        self.current_file = None
-        self.process = None
-        self.cancel_encode = False
-        self.progress_msg = None
-        self.error_msg = None
-        self.output_dir = None
-        self.exception_msg = None
-        self.paused = False
-        self.combined = None
-        self.split_pos = None
-        self.f_probe_msg = None
-        self.finished_msg = None
-        self.progress_signal.connect(self.update_progress)
-        self.error_box_signal.connect(self.error_box)
-        self.f_probe_signal.connect(self.send_f_probe_msg)
-        self.finished_signal.connect(self.send_finished_msg)
-
-        # Create a central widget
-        central_widget = QWidget(self)
-        self.setCentralWidget(central_widget)
-        self.menu_bar = self.menuBar()
-        self.file_menu = self.menu_bar.addMenu('File')
-        self.about_in_menu_bar = QAction(QIcon(r"Resources\about.ico"), 'About', self)
-        self.about_in_menu_bar.triggered.connect(self.about_page)
-        self.exit_from_menu_bar = QAction(QIcon(r"Resources\exit.ico"), 'Exit Application', self)
-        self.exit_from_menu_bar.triggered.connect(self.close)
-        self.file_menu.addActions([self.about_in_menu_bar, self.exit_from_menu_bar])
-
-        # Layout setup
-        text_edit_layout = QVBoxLayout(central_widget)
-        buttons_layout = QVBoxLayout()
-        text_and_combo_layout = QHBoxLayout()
-        combo_column_container = QWidget()
-        combo_column_layout = QVBoxLayout(combo_column_container)
-
-        # Create a QTextEdit widget for logs
-        self.log_widget = QTextEdit(self)
-        self.log_widget.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
-        self.log_widget.setFrameShape(QFrame.Shape.NoFrame)
-        self.log_widget.setFrameShadow(QFrame.Shadow.Plain)
-        self.log_widget.setAttribute(Qt.WidgetAttribute.WA_StyledBackground, True)
-        self.log_widget.setReadOnly(True)
-        self.width_combo = QLineEdit(self)
-        self.width_combo.setText("3840")
-
-        self.height_combo = QLineEdit(self)
-        self.height_combo.setText("2160")
-
-        self.bit_combo = QLineEdit(self)
-        self.bit_combo.setText("10M")
-
-        self.max_combo = QLineEdit(self)
-        self.max_combo.setText("20M")
-        self.buffer_combo = QLineEdit(self)
-        self.buffer_combo.setText("40M")
-        self.set_line_edit_frames()
-
-        self.codec_combo = QComboBox(self)
-        self.codec_combo.setEditable(False)
-        # noinspection SpellCheckingInspection
-        self.codec_combo.addItems(["hevc_amf (AMD)", "hevc_nvenc (Nvidia)", "h264_amf (AMD)",
-                                   "h264_nvenc (Nvidia)", "av1_amf (AMD)", "av1_nvenc (Nvidia)",
-                                   "libx265 (CPU)", "libx264 (CPU)", "libaom-av1 (CPU)"])
-        self.shader_combo = QComboBox(self)
-        self.shader_combo.setWindowTitle("Shader")
-        # noinspection SpellCheckingInspection
-        self.shader_combo.addItems(["Anime4K_ModeA.glsl",
-                                    "Anime4K_ModeA+A+UL.glsl",
-                                    "Anime4k_ModeB.glsl",
-                                    "Anime4K_ModeB+B.glsl",
-                                    "Anime4K_ModeC.glsl",
-                                    "Anime4K_ModeC+A.glsl",
-                                    "Anime4k-ModeA-UL.glsl",
-                                    "Anime4K_ModeA+FSR.glsl",
-                                    "FSRCNNX_x2_16-0-4-1.glsl"
-                                    ])
-        self.hdr_combo = QComboBox(self)
-        self.hdr_combo.addItems(["off", "on"])
-        # Add the log widget to the layout
-        combo_column_layout.addWidget(QLabel("📏Video Width:"))
-        combo_column_layout.addWidget(self.width_combo)
-        combo_column_layout.addWidget(QLabel("📐Video Height:"))
-        combo_column_layout.addWidget(self.height_combo)
-        combo_column_layout.addWidget(QLabel("📶Bitrate:"))
-        combo_column_layout.addWidget(self.bit_combo)
-        combo_column_layout.addWidget(QLabel("🌟Max Bitrate:"))
-        combo_column_layout.addWidget(self.max_combo)
-        combo_column_layout.addWidget(QLabel("💽Buffer Size:"))
-        combo_column_layout.addWidget(self.buffer_combo)
-        combo_column_layout.addWidget(QLabel("🎛️Codec:"))
-        combo_column_layout.addWidget(self.codec_combo)
-        combo_column_layout.addWidget(QLabel("💡Shader:"))
-        combo_column_layout.addWidget(self.shader_combo)
-        combo_column_layout.addWidget(QLabel("🌅HDR:"))
-        combo_column_layout.addWidget(self.hdr_combo)
-
-        text_and_combo_layout.addWidget(self.log_widget, 1)
-        text_and_combo_layout.addWidget(combo_column_container, 0)
-
-        text_edit_layout.addLayout(text_and_combo_layout)
-
-        # Create buttons
-        self.compare_button = QPushButton("🎬Compare Videos")
-        self.select_button = QPushButton("📁Select Video Files")
-        self.output_button = QPushButton("📤Open Output Folder")
-        self.upscale_button = QPushButton("🟢Upscale")
-        self.cancel_button = QPushButton("🛑Cancel")
-
-        # Add buttons to the layout
-        buttons_layout.addWidget(self.compare_button)
-        buttons_layout.addWidget(self.select_button)
-        buttons_layout.addWidget(self.output_button)
-        buttons_layout.addWidget(self.upscale_button)
-        buttons_layout.addWidget(self.cancel_button)
-        text_edit_layout.addLayout(buttons_layout)
-
-        self.pass_param_thread.run = self.pass_param
-        # Connect button clicks to log messages
-        self.compare_button.clicked.connect(self.compare_selection)
-        self.select_button.clicked.connect(self.open_file_dialog)
-        self.output_button.clicked.connect(self.open_output_folder)
-        self.upscale_button.clicked.connect(self.thread_check)
-        self.cancel_button.clicked.connect(self.cancel_operation)
-        open("output.txt", "w").close()
-        self.append_ascii_art()
-
-    def set_line_edit_frames(self):
-        line_edits = [self.width_combo,
-                      self.height_combo,
-                      self.max_combo,
-                      self.bit_combo,
-                      self.buffer_combo]
-        for edit in line_edits:
-            edit.setFrame(False)
-            if edit == line_edits[0] or edit == line_edits[1]:
-                edit.setMaxLength(4)
-                edit.setValidator(QIntValidator(0, 9999))
-            else:
-                edit.setMaxLength(3)
-
-
-    # noinspection PyMethodMayBeStatic
-    def about_page(self):
-        subprocess.Popen("start https://github.com/7gxycn08/PyAnime4K-GUI",
-                         shell=True, creationflags=subprocess.CREATE_NEW_CONSOLE)
-
-    def send_f_probe_msg(self, received_msg):
-        self.log_widget.append(f"[Upscaling] - {os.path.basename(self.current_file)} - {received_msg}")
-
-    def send_finished_msg(self, received_msg):
-        self.log_widget.append(f"[Upscaling] - {os.path.basename(self.current_file)} - {received_msg}")
-
-    def compare_selection(self):
-        first, _ = QFileDialog.getOpenFileName(self, "Select First Video", "", "Video File (*.mkv)")
-        if first:
-            second, _ = QFileDialog.getOpenFileName(self, "Select Second Video", "",
-                                                    "Video File (*.mkv)")
-            if first and second:
-                self.compare_thread.run = lambda: self.compare_videos_side_by_side(first, second)
-                self.compare_thread.start()
-
-    def thread_check(self):
-        self.cancel_encode = False
-        if self.pass_param_thread.isRunning():
-            return
-        else:
-            self.pass_param_thread.start()
-
-    def closeEvent(self, event):
-        if self.exit_confirm_box() == QMessageBox.StandardButton.Yes:
-            self.cancel_encode = True
-            self.encode_thread.wait()
-            try:
-                self.stop_ffmpeg()
-                event.accept()
-            except Exception as e:
-                self.error_box_signal.emit(e)
-                event.accept()
-            event.accept()
-        else:
-            event.ignore()
-
-    def exit_confirm_box(self):
-        exit_message_box = QMessageBox(self)
-        exit_message_box.setIcon(QMessageBox.Icon.Question)
-        exit_message_box.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-        exit_message_box.setWindowTitle("PyAnime4K-GUI")
-        exit_message_box.setWindowIcon(QIcon(r"Resources\anime.ico"))
-        exit_message_box.setFixedSize(400, 200)
-        exit_message_box.setText(f"Do you want to exit PyAnime4K-GUI?")
-        screen = app.primaryScreen()
-        screen_geometry = screen.availableGeometry()
-        x = (screen_geometry.width() - exit_message_box.width()) // 2
-        y = (screen_geometry.height() - exit_message_box.height()) // 2
-        exit_message_box.move(x, y)
-        result = exit_message_box.exec()
-        return result
-
-    def open_output_folder(self):  # noqa
-        if self.output_dir:
-            env = os.environ.copy()
-
-            # Restore the original library path if a freezer modified it.
-            if "LD_LIBRARY_PATH_ORIG" in env:
-                env["LD_LIBRARY_PATH"] = env.pop("LD_LIBRARY_PATH_ORIG")
-            else:
-                env.pop("LD_LIBRARY_PATH", None)
-
-            for var in (
-                    "QT_PLUGIN_PATH",
-                    "QT_QPA_PLATFORM_PLUGIN_PATH",
-                    "QML_IMPORT_PATH",
-                    "QML2_IMPORT_PATH",
-            ):
-                env.pop(var, None)
-            subprocess.run(["xdg-open", self.output_dir],env=env, check=False)
-
-    def cancel_operation(self):
-        self.cancel_encode = True
-        self.stop_ffmpeg()
-        # noinspection SpellCheckingInspection
-        self.log_widget.append("Upscaling Canceled.")
-
-    def log_message(self, message):
-        self.log_widget.append(message)
-
-    def open_file_dialog(self):
-        file_paths, _ = QFileDialog.getOpenFileNames(self, "Select Files", "",
-                                                     "Video Files (*.mkv *.mp4)")
-        if file_paths:
-            self.log_widget.clear()
-            self.selected_files = file_paths
-            for file in self.selected_files:
-                self.log_widget.append(f"[Added] - {file}")
-
-        else:
-            self.log_widget.clear()
-            self.log_widget.append(f"File selection canceled.")
-            return
-
-        output_path = QFileDialog.getExistingDirectory(None, "Select Output Directory")
-        if output_path:
-            self.output_dir = output_path
-            self.activateWindow()
-
-        else:
-            self.selected_files = None
-            self.log_widget.clear()
-            self.log_widget.append(f"File selection canceled.")
-            self.activateWindow()
-
-    def update_progress(self, received_msg):
-        # noinspection SpellCheckingInspection
-        self.log_widget.append(f"[Upscaling] - {os.path.basename(self.current_file)} - {received_msg}")
-
-    def is_ffmpeg_running(self):
-        return any(
-            p.info["name"] and p.info["name"].lower().startswith("ffmpeg")
-            for p in psutil.process_iter(["name"])
-        )
-
-    def stop_ffmpeg(self):
-        if self.is_ffmpeg_running():
-            # noinspection SpellCheckingInspection
-            subprocess.run(["pkill", "-9", "-x", "ffmpeg"])
-
-    def start_encoding(self, process):
-        # noinspection PyBroadException
-        try:
-            # noinspection SpellCheckingInspection
-            self.f_probe_msg = "Calculating Video Duration With FFprobe..."
-            self.f_probe_signal.emit(self.f_probe_msg)
-            # noinspection SpellCheckingInspection
-            ff_probe = Path(__file__).parent / "ffmpeg" / "ffprobe"
-            probe_process = subprocess.Popen(
-                [
-                    str(ff_probe),
-                    "-v", "error",
-                    "-select_streams", "v:0",
-                    "-show_entries", "format=duration",
-                    "-of", "json",
-                    self.current_file
-                ],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            stdout, stderr = probe_process.communicate()
-            try:
-                data = json.loads(stdout)
-                duration = float(data["format"]["duration"])
-            except (KeyError, ValueError, json.JSONDecodeError):
-                duration = None
-            self.progress_msg = f"Video Duration is {duration} Seconds."
-            self.progress_signal.emit(self.progress_msg)
-
-            p_bar = tqdm(total=100, position=1, desc="Progress")
-            # noinspection SpellCheckingInspection
-            for progress in process.run_command_with_progress(duration_override=duration):
-                if self.cancel_encode:
-                    return
-                p_bar.update(progress - p_bar.n)
-                # noinspection SpellCheckingInspection
-                tqdm_line = p_bar.format_meter(
-                    n=p_bar.n,
-                    total=p_bar.total,
-                    elapsed=p_bar.format_dict['elapsed'],
-                    ncols=80,
-                )
-                self.progress_msg = tqdm_line
-                self.progress_signal.emit(self.progress_msg)
-                p_bar.refresh()
-                if progress == 100:
-                    self.finished_msg = "Upscaling Finished Successfully."
-                    self.finished_signal.emit(self.finished_msg)
-            p_bar.close()
-
-        except Exception as e:
-            if self.cancel_encode:
-                return
-            self.exception_msg = e
-            self.cancel_encode = True
-            self.error_msg = str(process.stderr)
-            self.error_box_signal.emit(self.error_msg)
-            self.stop_ffmpeg()
-
-    # noinspection PyMethodMayBeStatic
-    # noinspection SpellCheckingInspection
-    def get_codec(self, selected_codec):
-        codecs = (
-            "hevc_amf",
-            "hevc_nvenc",
-            "h264_amf",
-            "h264_nvenc",
-            "av1_amf",
-            "av1_nvenc",
-            "libaom-av1",
-            "libx265",
-        )
-
-        for codec in codecs:
-            if codec in selected_codec:
-                return codec
-
-        return "libx264"
-
-    def pass_param(self):
-        if self.cancel_encode:
-            return
-
-        width = self.width_combo.text()
-        height = self.height_combo.text()
-        bit_rate = self.bit_combo.text()
-        max_bitrate = self.max_combo.text()
-        buffer_size = self.buffer_combo.text()
-        selected_codec = self.codec_combo.currentText()
-        codec = self.get_codec(selected_codec)
-        shader = self.shader_combo.currentText()
-        hdr = self.hdr_combo.currentText()
-        if not self.selected_files:
-            return
-
-        for file in self.selected_files:
-            sys.stdout.flush()
-            sys.stderr.flush()
-            if hdr == "on":
-                # noinspection SpellCheckingInspection
-                ff_mpeg = Path(__file__).parent / "ffmpeg" / "ffmpeg"
-                output = Path(self.output_dir) / f"{Path(file).stem}-upscaled.mkv"
-                shader_path = Path(__file__).parent / "shaders" / shader
-
-                command = [
-                    str(ff_mpeg),
-                    "-loglevel", "info",
-                    "-i", str(file),
-                    "-map", "0:v",
-                    "-map", "0:s?",
-                    "-map", "0:a",
-                    "-vf", (
-                        f"format=p010le,"
-                        f"libplacebo=w={width}:h={height}:upscaler=ewa_lanczos:"
-                        f"custom_shader_path={shader_path}"
-                    ),
-                    "-c:s", "copy",
-                    "-c:a", "copy",
-                    "-c:d", "copy",
-                    "-b:v", str(bit_rate),
-                    "-maxrate", str(max_bitrate),
-                    "-bufsize", str(buffer_size),
-                    "-c:v", str(codec),
-                    "-map_metadata", "0",
-                    str(output)
-                ]
-            else:
-                # noinspection SpellCheckingInspection
-                ff_mpeg = Path(__file__).parent / "ffmpeg" / "ffmpeg"
-                output = Path(self.output_dir) / f"{Path(file).stem}-upscaled.mkv"
-                shader_path = Path(__file__).parent / "shaders" / shader
-
-                command = [
-                    str(ff_mpeg),
-                    "-loglevel", "info",
-                    "-i", str(file),
-                    "-map", "0:v",
-                    "-map", "0:s?",
-                    "-map", "0:a?",
-                    "-init_hw_device", "vulkan",
-                    "-vf",
-                    (
-                        f"format=yuv420p,hwupload,"
-                        f"libplacebo=w={width}:h={height}:upscaler=ewa_lanczos:"
-                        f"custom_shader_path={shader_path}"
-                    ),
-                    "-c:s", "copy",
-                    "-c:a", "copy",
-                    "-c:d", "copy",
-                    "-b:v", str(bit_rate),
-                    "-maxrate", str(max_bitrate),
-                    "-bufsize", str(buffer_size),
-                    "-c:v", str(codec),
-                    str(output),
-                ]
-
-            if self.cancel_encode:
-                break
-            self.current_file = file
-            process = FfmpegProgress(command)
-            self.cancel_encode = False
-            if self.encode_thread.isRunning():
-                self.encode_thread.wait()
-            self.encode_thread.run = lambda: self.start_encoding(process)
-            self.encode_thread.start()
-            self.encode_thread.wait()
-
-    def error_box(self, received_msg):
-        with open("output.txt", "a") as file:
-            file.write(str(received_msg) + "\n")
-        with open("output.txt", 'r', encoding='utf-8') as read_file:
-            text = read_file.read()
-        self.log_widget.append(text)
-        warning_message_box = QMessageBox(self)
-        warning_message_box.setIcon(QMessageBox.Icon.Critical)
-        warning_message_box.setWindowTitle("PyAnime4K-GUI Error")
-        warning_message_box.setWindowIcon(QIcon(r"Resources\anime.ico"))
-        warning_message_box.setFixedSize(400, 200)
-        warning_message_box.setText(f"Unexpected Error Occurred.")
-        screen = app.primaryScreen()
-        screen_geometry = screen.availableGeometry()
-        x = (screen_geometry.width() - warning_message_box.width()) // 2
-        y = (screen_geometry.height() - warning_message_box.height()) // 2
-        warning_message_box.move(x, y)
-        warning_message_box.exec()
-
-    def compare_videos_side_by_side(self, video1_path, video2_path):
-        def update_split(val):
-            self.split_pos = val
-            if self.paused:
-                update_frame()
-
-        def update_frame():
-            frame1_resized = cv2.resize(frame1, (width, height))
-            frame2_resized = cv2.resize(frame2, (width, height))
-            self.combined = frame1_resized.copy()
-            self.combined[:, self.split_pos:] = frame2_resized[:, self.split_pos:]
-            cv2.line(self.combined, (self.split_pos, 0), (self.split_pos, height), (0, 255, 0),
-                     2)
-
-        try:
-            cap1 = cv2.VideoCapture(video1_path)
-            cap2 = cv2.VideoCapture(video2_path)
-
-            if not cap1.isOpened() or not cap2.isOpened():
-                raise Exception
-
-            width = int(self.width_combo.text())
-            height = int(self.height_combo.text())
-            fps = 60
-
-            window_name = "Video Comparison"
-            self.split_pos = width // 2
-
-            cv2.namedWindow(window_name)
-            cv2.setNumThreads(os.cpu_count())
-            cv2.createTrackbar("Split", window_name, self.split_pos, width, update_split)
-
-            frame1, frame2 = None, None
-
-            while True:
-                if not self.paused:
-                    ret1, frame1 = cap1.read()
-                    ret2, frame2 = cap2.read()
-
-                    if not ret1 or not ret2:
-                        break
-
-                    update_frame()
-
-                cv2.imshow(window_name, self.combined)
-
-                key = cv2.waitKey(int(1000 / fps)) & 0xFF
-                if key == 27 or cv2.getWindowProperty(window_name,
-                                                      cv2.WND_PROP_VISIBLE) < 1:  # Esc key or window closed
-                    break
-                elif key == ord(' '):  # Space key
-                    self.paused = not self.paused
-
-            cap1.release()
-            cap2.release()
-            cv2.destroyAllWindows()
-        except Exception as e:
-            self.error_box_signal.emit(e)
-
-    def append_ascii_art(self):
-        ascii_art = """
-  ⠀⢀⣀⣀⣤⣤⣤⣤⣶⣶⣶⣶⣿⡿⡫⢶⠏⡃⣥⣩⢵⣶⣾⣿⣿⣿⣿⣿⣷⣿⣬⣿⣒⣪⢨⣻⠿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿
-⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⠏⠜⠩⣔⠪⣑⣶⣾⣿⣿⣿⣿⣿⣿⣟⣻⣿⣿⣿⣿⡯⣟⠳⣭⣻⢦⣛⢿⣿⠟⠛⠛⠛⠛⠛⠛⠛⠛
-⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⢟⠱⣢⣵⣯⠔⡫⢖⣿⣿⣿⣿⣿⣿⣿⣺⡿⣿⣿⣿⣿⣿⣯⣓⢿⡿⣑⢝⡲⣕⠝⢿⣷⣦⣤⣀⡀⠀⠀⠀
-⣿⣿⣿⣿⣿⣿⣿⣿⢟⢕⣵⣿⡛⢿⣿⣿⣎⠵⣿⣿⣿⣿⣿⠿⠿⠿⢯⣿⣿⣿⣿⣿⣿⣿⢿⣙⢮⣑⢮⣿⣦⢣⡻⣿⣿⣿⣿⣿⣶⣤
-⣿⣿⣿⣿⣿⡿⠋⢔⣥⣿⣿⣿⣿⣄⠀⠉⠉⠉⠉⠉⠁⠀⠀⠀⠀⠀⠀⠀⠈⠉⠛⢿⣿⢏⡳⣭⣳⣾⣿⣿⣿⣷⢕⢎⢿⣿⣿⣿⣿⣿
-⣿⣿⣿⣿⡿⡡⣱⢛⢿⣿⣿⣿⣿⡿⠃⠀⠀⠀⠀⠀⢌⣆⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⠳⣬⣾⣿⣿⣿⡟⡙⢌⢦⢨⣃⢿⣿⣿⣿⣿
-⣿⣿⣿⣿⢡⠱⠣⡡⠩⠻⠿⠋⠁⠀⠀⠀⠀⠀⠀⠀⣾⣿⣧⡀⠀⠀⠀⢦⡂⠀⠀⠀⠀⠀⠈⠛⢿⣿⠡⡱⣘⣬⣶⣶⣏⣎⣿⣿⣿⣿
-⣿⣿⣿⡇⠢⣷⣷⣷⣱⢠⡀⠀⠀⠀⠀⠀⠀⣀⠀⢸⣿⣿⣿⣿⣦⡀⠀⠘⡇⡄⡀⠐⠀⠀⠀⠀⠈⠻⣷⣷⣿⣿⣿⣿⣿⡞⢸⣿⣿⣿
-⣿⣿⡟⡈⢂⢹⣿⣿⣿⣿⣿⠇⠀⠀⠀⠀⠀⣾⠀⣿⣿⣿⣿⣿⣿⣿⣦⣀⠱⣎⡀⠘⠄⠀⠀⠀⠀⠀⠈⢙⡋⠇⠏⣿⣿⡇⣻⣿⣿⣿
-⣿⣿⡧⣼⣿⣿⣿⣿⣿⠟⠁⠀⠀⠀⠀⠀⢸⣛⣓⣛⠛⠛⢿⣿⣿⣿⣫⠅⠉⣍⣥⠚⢷⠀⠀⠀⠀⠀⠹⢻⢿⡏⠏⡏⡟⣷⢱⡿⠿⠿
-⣿⣿⡇⣿⣿⣿⠻⠿⣅⣀⣀⡀⠀⠀⠀⡄⣿⠋⣡⣴⣦⢈⢿⡎⣿⣿⣶⡇⣾⠋⠙⣷⠸⡆⠀⢀⢄⠀⠀⠈⣩⣓⣥⣥⣃⣿⢨⣤⣤⣤
-⡛⠛⠃⢻⣿⣿⣄⣤⣧⣿⣿⠟⠀⠀⠀⢡⡅⢹⣏⣀⣹⡇⢸⣏⢹⣿⣿⣖⡻⠷⠾⢟⣲⢰⠀⠑⢸⠀⣶⣿⣿⣿⣿⣿⣿⣿⢀⠀⠀⠀
-⣿⣿⣿⡎⣟⢻⠹⡉⢏⠻⡜⢁⣠⠀⠢⠸⣷⣜⣿⣿⣫⣼⣼⣛⣘⣧⣿⣿⣿⣭⣨⣥⣶⠸⢦⡀⡄⠀⠈⢟⢿⢿⣿⣿⣿⢣⣿⣿⣿⣿
-⣿⣿⣿⣿⡘⢦⣢⣹⣮⣶⣷⣿⣿⢀⠕⢁⢻⣿⣿⠿⢛⣫⣭⣵⣶⣶⣶⣿⣿⣿⣶⢀⡏⠦⡠⠜⢰⢆⡤⣵⣕⣵⣾⢛⢡⣿⣿⣿⣿⣿
-⣿⣿⣿⣿⣿⣌⢻⣿⣿⣿⣿⡿⡟⢇⠱⣅⠈⢿⣦⡸⡿⠿⣛⣫⣭⣽⣶⣶⣶⠶⣢⣾⠏⠂⠠⢄⢸⣭⡪⢊⡿⢋⣴⣿⣾⣿⣿⣿⣿⣿
-⣿⣿⣿⣿⣿⠋⢄⣍⠻⣿⡃⢝⡪⣵⢟⡢⢀⡬⡛⢿⣦⣽⣛⣛⣛⣛⣛⣯⣵⡾⠟⠁⠀⡀⢮⡑⣘⠿⠓⠥⣶⣿⣿⡿⣻⣿⣿⣿⣿⣿
-⣿⣿⣿⡿⠇⢢⣿⣿⣿⣶⣝⣛⠿⢬⣕⣲⣟⣁⡄⡀⠈⣉⡛⠛⠿⠿⠟⢫⣉⣤⣾⠠⠰⢟⣩⣥⣶⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿
-⣿⣿⡿⠁⣱⣿⣿⣿⣿⣿⣿⣿⠃⠀⠀⠉⠉⠛⠛⠓⠂⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⢰⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿
-⣿⡿⠑⣼⣿⣿⣿⣿⣿⣿⣿⣿⠀⠀⠀⠀⠀⠀⠀⠀⠀⢿⣿⣿⣿⣿⣿⣿⡿⣋⣿⡈⢹⣿⣿⣿⠉⠉⠉⠉⠉⠙⠛⠛⠛⠛⠋⠛⠛⠉
-⣿⣇⣾⣿⣿⣿⣿⣿⣿⣿⣿⣿⠀⠀⠀⠀⠀⣠⠰⠚⣼⣷⣭⡻⠿⡿⢿⣫⣾⣿⢸⣧⠀⠒⡘⠿⠀⠀⠀⠀⠀⠀⠀⠀⠀⣷⣿⣿⣷⣶
-⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⡿⠇⠀⠴⠂⡾⠁⣠⣾⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⢸⣿⣷⠄⢾⠀⣳⣄⡀⠦⠤⠤⠤⢤⣰⣿⣿⣿⣿⣿
-⣿⣿⣿⣿⣿⠟⣩⣴⣶⣾⣿⣿⣿⣾⡄⢸⡇⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⡿⣸⡿⢡⡶⠃⣸⣿⣿⣿⣿⣿⣿⣿⣿⣶⣬⡙⢿⣿⣿
-⣿⣿⣿⠟⣡⣾⣿⣿⢿⣿⣿⣿⣿⣿⣷⡈⣇⢛⣛⣻⠿⢿⣿⣿⣿⠿⢟⣛⣭⡥⢁⣴⣏⣡⣶⣿⣿⣿⢻⣿⣿⣿⣿⣿⠛⣿⣿⣎⠻⣿
-⣿⣿⠁⣺⡟⠿⡿⠛⠈⣿⣽⣿⣿⡟⠻⣿⠇⣿⣿⣿⣿⣶⣿⣟⣥⣾⣿⣿⣿⢰⣿⣿⣿⣿⣿⣿⣟⣓⡄⠸⣿⣿⡿⠫⠀⢸⣿⣿⣥⠹
-⣿⠣⡪⠏⠀⠀⠨⠀⡀⢿⣿⣿⡿⢰⠇⡽⣸⣿⣿⣿⣿⠟⠡⣿⣿⣿⣿⣿⣿⢸⣿⣿⣿⣿⢿⣿⣿⢻⠀⠠⠙⠛⠁⠀⠀⠺⣿⠛⢛⣸
-⣅⠍⠀⠀⠀⠀⠘⠀⢠⣺⣿⣿⣿⣦⣾⢃⡹⠟⠿⠟⣡⠆⣆⠛⢿⡿⣿⢟⡁⣼⣿⣿⠿⢽⠯⡠⠀⠈⠀⠀⠀⠀⠁⠀⠁⠀⠉⠠⠨⢿
-⠃⠀⠀⠀⠀⠀⠀⢀⣨⡸⣛⣿⣿⣿⡟⣴⠋⢊⣷⣾⡟⢀⣿⢸⠢⠶⣴⣿⡇⣿⣿⣿⣷⣆⣑⢱⡀⠀⠂⠀⠀⠀⠀⡄⠀⠆⠀⠀⣴⣿
-        """
-        cursor = self.log_widget.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-
-        block_format = QTextBlockFormat()
-        block_format.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        cursor.insertBlock(block_format)
-        cursor.insertText(ascii_art)
-        self.log_widget.setTextCursor(cursor)
-
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    if app.styleHints().colorScheme() == Qt.ColorScheme.Dark:
-        with open(r"Resources/dark_theme_utf8.qss", "r") as f:
-            app.setStyleSheet(f.read())
-    else:
-        with open(r"Resources/light_theme_utf8.qss", "r") as f:
-            app.setStyleSheet(f.read())
-    shared_mem = QSharedMemory("PyAnime4K")
-    if not shared_mem.create(1):
-        # Already running
-        msg = QMessageBox()
-        msg.setWindowTitle("PyAnime4K-GUI Error")
-        msg.setWindowIcon(QIcon(r"Resources\anime.ico"))
-        msg.setText("Another instance is already running.")
-        msg.setIcon(QMessageBox.Icon.Warning)
-        msg.exec()
-        sys.exit(0)
-    window = MainWindow()
-    window.show()
+import os
+import sys
+from anime4k.startup import StartupProfile
+
+startup = StartupProfile("--startup-profile" in sys.argv)
+
+from PySide6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit, QFileDialog,
+                               QMainWindow, QMessageBox, QComboBox, QLabel, QLineEdit, QFrame)
+from PySide6.QtCore import QThread, Signal, QSharedMemory, QTimer
+from PySide6.QtGui import QIcon, QTextCursor, QTextBlockFormat, Qt, QAction, QIntValidator
+import subprocess
+from anime4k.capabilities import CapabilityError, load_capabilities
+from anime4k.command import (ASPECT_POLICIES, AUTO_SHADER, CODEC_LABELS, NATIVE_POLICIES, SHADERS, EncodeSettings,
+                             codec_from_label, parse_rendition, rate_args)
+from anime4k.encoder import Encoder
+from anime4k.jobdb import JobStore, batches
+from anime4k.metrics import MetricsLog
+from anime4k.probe import ProbeError, ProbeService
+from anime4k.process import QUIT_TIMEOUT, TERMINATE_TIMEOUT
+from anime4k.scheduler import JobScheduler, JobState
+from anime4k.status import LOG_MAX_BLOCKS, STATUS_INTERVAL_MS, StatusBoard, log_file
+from anime4k.tools import cache_dir
+from anime4k.tuner import ConcurrencyTuner
+
+startup.mark("imports")
+
+
+class MainWindow(QMainWindow):
+    output_signal = Signal(str)
+    progress_signal = Signal(str, str)
+    error_box_signal = Signal(str)
+    job_state_signal = Signal(object)
+    batch_finished_signal = Signal()
+    probe_signal = Signal(str, object)
+    capabilities_signal = Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("PyAnime4K-GUI v2.6")
+        self.setWindowIcon(QIcon('Resources/anime.ico'))
+        self.setGeometry(100, 100, 1000, 650)
+        self.selected_files = None
+        self.std_thread = QThread()
+        self.pass_param_thread = QThread()
+        self.compare_thread = QThread()
+        self.progress_thread = QThread()
+        self.reading_thread = QThread()
+        self.capabilities_thread = QThread()
+        self.measure_thread = QThread()
+        self.preview_thread = QThread()
+        self.capabilities = None
+        self.ffmpeg_progress = None
+        self.scheduler = JobScheduler(on_state_change=self.job_state_changed)
+        self.job_store = None
+        self.status_board = StatusBoard()
+        self.log_file = log_file()
+        self.probe_service = None
+        self.process = None
+        self.cancel_encode = False
+        self.progress_msg = None
+        self.error_msg = None
+        self.output_dir = None
+        self.exception_msg = None
+        self.failed_jobs = []
+        self.progress_signal.connect(self.update_progress)
+        self.error_box_signal.connect(self.error_box)
+        self.job_state_signal.connect(self.update_job_state)
+        self.batch_finished_signal.connect(self.batch_finished)
+        self.probe_signal.connect(self.update_probe)
+        self.capabilities_signal.connect(self.update_capabilities)
+        self.output_signal.connect(self.log_message)
+
+        # Create a central widget
+        central_widget = QWidget(self)
+        self.setCentralWidget(central_widget)
+        self.menu_bar = self.menuBar()
+        self.file_menu = self.menu_bar.addMenu('File')
+        self.about_in_menu_bar = QAction(QIcon(r"Resources\about.ico"), 'About', self)
+        self.about_in_menu_bar.triggered.connect(self.about_page)
+        self.exit_from_menu_bar = QAction(QIcon(r"Resources\exit.ico"), 'Exit Application', self)
+        self.exit_from_menu_bar.triggered.connect(self.close)
+        self.measure_in_menu_bar = QAction('Measure Quality (PSNR/SSIM/VMAF)', self)
+        self.measure_in_menu_bar.triggered.connect(self.measure_selection)
+        self.resume_in_menu_bar = QAction('Resume Queue', self)
+        self.resume_in_menu_bar.triggered.connect(self.resume_queue)
+        self.history_in_menu_bar = QAction('Queue History', self)
+        self.history_in_menu_bar.triggered.connect(self.queue_history)
+        self.file_menu.addActions([self.resume_in_menu_bar, self.history_in_menu_bar, self.measure_in_menu_bar,
+                                   self.about_in_menu_bar, self.exit_from_menu_bar])
+
+        # Layout setup
+        text_edit_layout = QVBoxLayout(central_widget)
+        buttons_layout = QVBoxLayout()
+        text_and_combo_layout = QHBoxLayout()
+        combo_column_container = QWidget()
+        combo_column_layout = QVBoxLayout(combo_column_container)
+
+        # Create a QTextEdit widget for logs
+        self.log_widget = QTextEdit(self)
+        self.log_widget.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
+        self.log_widget.setFrameShape(QFrame.Shape.NoFrame)
+        self.log_widget.setFrameShadow(QFrame.Shadow.Plain)
+        self.log_widget.setAttribute(Qt.WidgetAttribute.WA_StyledBackground, True)
+        self.log_widget.setReadOnly(True)
+        self.log_widget.document().setMaximumBlockCount(LOG_MAX_BLOCKS)
+        # One row per running job, redrawn by status_timer instead of appending every progress tick
+        self.status_widget = QLabel(self)
+        self.status_widget.setVisible(False)
+        self.status_timer = QTimer(self)
+        self.status_timer.setInterval(STATUS_INTERVAL_MS)
+        self.status_timer.timeout.connect(self.refresh_status)
+        self.width_combo = QLineEdit(self)
+        self.width_combo.setText("3840")
+
+        self.height_combo = QLineEdit(self)
+        self.height_combo.setText("2160")
+
+        self.bit_combo = QLineEdit(self)
+        self.bit_combo.setText("10M")
+
+        self.max_combo = QLineEdit(self)
+        self.max_combo.setText("20M")
+        self.buffer_combo = QLineEdit(self)
+        self.buffer_combo.setText("40M")
+        self.quality_combo = QLineEdit(self)
+        self.quality_combo.setText("0")
+        self.jobs_combo = QLineEdit(self)
+        self.jobs_combo.setText("1")
+        self.segments_combo = QLineEdit(self)
+        self.segments_combo.setText("1")
+        self.checkpoint_combo = QLineEdit(self)
+        self.checkpoint_combo.setText("0")
+        self.pipeline_combo = QLineEdit(self)
+        self.pipeline_combo.setText("0")
+        self.renditions_combo = QLineEdit(self)
+        self.set_line_edit_frames()
+
+        self.codec_combo = QComboBox(self)
+        self.codec_combo.setEditable(False)
+        self.codec_combo.addItems(CODEC_LABELS)
+        self.shader_combo = QComboBox(self)
+        self.shader_combo.setWindowTitle("Shader")
+        # "auto" picks a shader per file from a quick look at its frames
+        self.shader_combo.addItems(SHADERS + [AUTO_SHADER])
+        self.hdr_combo = QComboBox(self)
+        self.hdr_combo.addItems(["off", "on"])
+        self.native_combo = QComboBox(self)
+        self.native_combo.addItems(NATIVE_POLICIES)
+        # "keep" fits the target inside width x height with each source's aspect ratio
+        self.aspect_combo = QComboBox(self)
+        self.aspect_combo.addItems(ASPECT_POLICIES)
+        self.reuse_combo = QComboBox(self)
+        self.reuse_combo.addItems(["on", "off"])
+        # Add the log widget to the layout
+        combo_column_layout.addWidget(QLabel("📏Video Width:"))
+        combo_column_layout.addWidget(self.width_combo)
+        combo_column_layout.addWidget(QLabel("📐Video Height:"))
+        combo_column_layout.addWidget(self.height_combo)
+        combo_column_layout.addWidget(QLabel("🖼️Aspect Ratio:"))
+        combo_column_layout.addWidget(self.aspect_combo)
+        combo_column_layout.addWidget(QLabel("📶Bitrate:"))
+        combo_column_layout.addWidget(self.bit_combo)
+        combo_column_layout.addWidget(QLabel("🌟Max Bitrate:"))
+        combo_column_layout.addWidget(self.max_combo)
+        combo_column_layout.addWidget(QLabel("💽Buffer Size:"))
+        combo_column_layout.addWidget(self.buffer_combo)
+        combo_column_layout.addWidget(QLabel("🎯Quality (CRF/CQ, 0 = bitrate):"))
+        combo_column_layout.addWidget(self.quality_combo)
+        combo_column_layout.addWidget(QLabel("🎛️Codec:"))
+        combo_column_layout.addWidget(self.codec_combo)
+        combo_column_layout.addWidget(QLabel("💡Shader:"))
+        combo_column_layout.addWidget(self.shader_combo)
+        combo_column_layout.addWidget(QLabel("🌅HDR:"))
+        combo_column_layout.addWidget(self.hdr_combo)
+        combo_column_layout.addWidget(QLabel("⏩Already at Target Size:"))
+        combo_column_layout.addWidget(self.native_combo)
+        combo_column_layout.addWidget(QLabel("🎞️Extra Renditions:"))
+        combo_column_layout.addWidget(self.renditions_combo)
+        combo_column_layout.addWidget(QLabel("♻️Reuse Outputs:"))
+        combo_column_layout.addWidget(self.reuse_combo)
+        combo_column_layout.addWidget(QLabel("⚙️Parallel Jobs (0 = auto):"))
+        combo_column_layout.addWidget(self.jobs_combo)
+        combo_column_layout.addWidget(QLabel("✂️Split Segments:"))
+        combo_column_layout.addWidget(self.segments_combo)
+        combo_column_layout.addWidget(QLabel("💾Checkpoint Every (s):"))
+        combo_column_layout.addWidget(self.checkpoint_combo)
+        combo_column_layout.addWidget(QLabel("🔀Pipeline Encoders:"))
+        combo_column_layout.addWidget(self.pipeline_combo)
+
+        text_and_combo_layout.addWidget(self.log_widget, 1)
+        text_and_combo_layout.addWidget(combo_column_container, 0)
+
+        text_edit_layout.addLayout(text_and_combo_layout)
+        text_edit_layout.addWidget(self.status_widget)
+
+        # Create buttons
+        self.compare_button = QPushButton("🎬Compare Videos")
+        self.preview_button = QPushButton("🔍Preview")
+        self.select_button = QPushButton("📁Select Video Files")
+        self.output_button = QPushButton("📤Open Output Folder")
+        self.upscale_button = QPushButton("🟢Upscale")
+        self.cancel_button = QPushButton("🛑Cancel")
+
+        # Add buttons to the layout
+        buttons_layout.addWidget(self.compare_button)
+        buttons_layout.addWidget(self.preview_button)
+        buttons_layout.addWidget(self.select_button)
+        buttons_layout.addWidget(self.output_button)
+        buttons_layout.addWidget(self.upscale_button)
+        buttons_layout.addWidget(self.cancel_button)
+        text_edit_layout.addLayout(buttons_layout)
+
+        self.pass_param_thread.run = self.pass_param
+        # Connect button clicks to log messages
+        self.compare_button.clicked.connect(self.compare_selection)
+        self.preview_button.clicked.connect(self.preview_selection)
+        self.select_button.clicked.connect(self.open_file_dialog)
+        self.output_button.clicked.connect(self.open_output_folder)
+        self.upscale_button.clicked.connect(self.thread_check)
+        self.cancel_button.clicked.connect(self.cancel_operation)
+        open("output.txt", "w").close()
+        self.append_ascii_art()
+        self.status_timer.start()
+        QTimer.singleShot(0, self.init_subsystems)
+
+    def init_subsystems(self):
+        # Runs once the window is on screen; nothing here may delay the first paint.
+        self.probe_service = ProbeService()
+        self.probe_service.preload()
+        self.capabilities_thread.run = self.detect_capabilities
+        self.capabilities_thread.start()
+        self.job_store = JobStore()
+        recovered = self.job_store.recover()
+        waiting = self.job_store.counts().get(JobState.QUEUED, 0)
+        if waiting:
+            self.log_message(f"[Queue] - {waiting} files waiting from an earlier session"
+                             f"{f', {recovered} of them interrupted' if recovered else ''}"
+                             f" - File > Resume Queue upscales them")
+        startup.mark("subsystems")
+
+    def detect_capabilities(self):
+        try:
+            self.capabilities_signal.emit(load_capabilities())
+        except OSError as e:
+            self.capabilities_signal.emit(e)
+
+    def update_capabilities(self, result):
+        if isinstance(result, OSError):
+            self.log_message(f"[Capabilities] - Could not check ffmpeg - {result}")
+            return
+        self.capabilities = result
+        labels = result.codec_labels()
+        if labels:
+            selected = self.codec_combo.currentText()
+            self.codec_combo.clear()
+            self.codec_combo.addItems(labels)
+            if selected in labels:
+                self.codec_combo.setCurrentText(selected)
+        self.log_message(f"[Capabilities] - {result.summary()}")
+        for problem in result.problems(EncodeSettings()):
+            self.log_message(f"[Capabilities] - Warning: {problem}")
+
+    def set_line_edit_frames(self):
+        line_edits = [self.width_combo,
+                      self.height_combo,
+                      self.max_combo,
+                      self.bit_combo,
+                      self.buffer_combo,
+                      self.quality_combo,
+                      self.jobs_combo,
+                      self.segments_combo,
+                      self.checkpoint_combo,
+                      self.pipeline_combo,
+                      self.renditions_combo]
+        for edit in line_edits:
+            edit.setFrame(False)
+            if edit == line_edits[0] or edit == line_edits[1] or edit == self.checkpoint_combo:
+                edit.setMaxLength(4)
+                edit.setValidator(QIntValidator(0, 9999))
+            elif edit == self.segments_combo:
+                edit.setMaxLength(2)
+                edit.setValidator(QIntValidator(1, 99))
+            elif edit == self.jobs_combo or edit == self.pipeline_combo:
+                edit.setMaxLength(2)
+                edit.setValidator(QIntValidator(0, 99))
+            elif edit == self.quality_combo:
+                edit.setMaxLength(2)
+                edit.setValidator(QIntValidator(0, 63))
+            elif edit == self.renditions_combo:
+                # Comma separated, each encoded from the same upscale as the main output
+                edit.setPlaceholderText("1920x1080:libx264:6M")
+            else:
+                edit.setMaxLength(3)
+
+
+    # noinspection PyMethodMayBeStatic
+    def about_page(self):
+        subprocess.Popen("start https://github.com/7gxycn08/PyAnime4K-GUI",
+                         shell=True, creationflags=subprocess.CREATE_NEW_CONSOLE)
+
+    def send_finished_msg(self, file, received_msg):
+        self.log_message(f"[Upscaling] - {os.path.basename(file)} - {received_msg}")
+
+    def job_state_changed(self, job):
+        # Saved from the worker thread, so a state is stored even if the window closes before the signal arrives.
+        if self.job_store is not None:
+            self.job_store.update(job)
+        self.job_state_signal.emit(job)
+
+    def update_job_state(self, job):
+        if job.finished:
+            self.status_board.remove(job.id)
+        if job.state == JobState.QUEUED:
+            self.log_message(f"[Queued] - {os.path.basename(job.name)}")
+        elif job.state == JobState.DONE:
+            # Only a finished job counts; its progress can reach 100% before a failed mux or a cancel.
+            self.send_finished_msg(job.source, "Upscaling Finished Successfully.")
+        elif job.state == JobState.FAILED:
+            self.log_message(f"[Failed] - {os.path.basename(job.name)} - {job.error}")
+            if not self.cancel_encode:
+                self.exception_msg = job.error
+                self.error_msg = str(job.error)
+                # One summary box at the end of the batch instead of a dialog per failed file.
+                self.failed_jobs.append(f"{os.path.basename(job.name)}: {job.error}")
+                self.status_board.set("failed", f"[Failed] - {len(self.failed_jobs)} files, see the log")
+        elif job.state == JobState.CANCELLED:
+            self.log_message(f"[Canceled] - {os.path.basename(job.name)}")
+
+    def compare_selection(self):
+        first, _ = QFileDialog.getOpenFileName(self, "Select First Video", "", "Video File (*.mkv)")
+        if first:
+            second, _ = QFileDialog.getOpenFileName(self, "Select Second Video", "",
+                                                    "Video File (*.mkv)")
+            if first and second:
+                self.compare_thread.run = lambda: self.compare_videos_side_by_side(first, second)
+                self.compare_thread.start()
+
+    def measure_selection(self):
+        if self.measure_thread.isRunning():
+            return
+        reference, _ = QFileDialog.getOpenFileName(self, "Select Source Video", "", "Video Files (*.mkv *.mp4)")
+        if reference:
+            upscaled, _ = QFileDialog.getOpenFileName(self, "Select Upscaled Video", "", "Video Files (*.mkv *.mp4)")
+            if upscaled:
+                self.measure_thread.run = lambda: self.measure_quality(reference, upscaled)
+                self.measure_thread.start()
+
+    def measure_quality(self, reference, upscaled):
+        from anime4k.measure import format_summary, measure_files
+
+        self.output_signal.emit(f"[Measuring] - {os.path.basename(upscaled)} against {os.path.basename(reference)}")
+        try:
+            summary, paths = measure_files(reference, upscaled, self.probe_service,
+                                           shards=max(1, (os.cpu_count() or 2) // 2))
+        except Exception as e:
+            self.error_box_signal.emit(str(e))
+            return
+        self.output_signal.emit(f"[Quality] - {os.path.basename(upscaled)} - {format_summary(summary)}")
+        self.output_signal.emit(f"[Quality] - Per-frame values written to {paths[0]}")
+
+    def preview_selection(self):
+        if self.preview_thread.isRunning():
+            return
+        if not self.selected_files:
+            self.log_message("Select video files first, the preview uses the first one.")
+            return
+        file = self.selected_files[0]
+        self.preview_thread.run = lambda: self.preview_render(file)
+        self.preview_thread.start()
+
+    def preview_render(self, file):
+        from anime4k.compare import CompareViewer
+        from anime4k.metrics import format_seconds
+        from anime4k.preview import render_preview
+
+        settings = self.encode_settings()
+        if settings is None:
+            return
+        try:
+            info = self.probe_service.probe(file)
+            result = render_preview(file, info, settings,
+                                    on_message=lambda text: self.output_signal.emit(f"[Preview] - {text}"))
+        except Exception as e:
+            self.error_box_signal.emit(str(e))
+            return
+        estimate = format_seconds(result.estimate_s) if result.estimate_s else "unknown"
+        self.output_signal.emit(f"[Preview] - {os.path.basename(file)} - {result.fps:g} fps per clip, "
+                                f"{result.parallel_fps:g} fps over {result.clips} clips, "
+                                f"full upscale estimated at {estimate}")
+        try:
+            CompareViewer(str(result.source), str(result.upscaled), result.width, result.height).run()
+        except Exception as e:
+            self.error_box_signal.emit(str(e))
+
+    def thread_check(self):
+        self.cancel_encode = False
+        if self.pass_param_thread.isRunning():
+            return
+        else:
+            self.pass_param_thread.run = self.pass_param
+            self.pass_param_thread.start()
+
+    def resume_queue(self):
+        self.cancel_encode = False
+        if self.pass_param_thread.isRunning() or self.job_store is None:
+            return
+        stored = self.job_store.pending()
+        if not stored:
+            self.log_message("[Queue] - No files waiting.")
+            return
+        self.log_message(f"[Queue] - Resuming {len(stored)} files")
+        self.pass_param_thread.run = lambda: self.run_batch(stored)
+        self.pass_param_thread.start()
+
+    def queue_history(self):
+        if self.job_store is None:
+            return
+        counts = ", ".join(f"{count} {state}" for state, count in sorted(self.job_store.counts().items()))
+        self.log_message(f"[Queue] - {counts or 'No jobs yet.'}")
+        for job in reversed(self.job_store.history(20)):
+            self.log_message(f"[Queue] - {job.summary()}")
+
+    def closeEvent(self, event):
+        if self.exit_confirm_box() == QMessageBox.StandardButton.Yes:
+            self.cancel_encode = True
+            self.scheduler.cancel()
+            # Give the jobs' own ffmpeg processes time to stop, so none outlive the window.
+            self.scheduler.wait(QUIT_TIMEOUT + TERMINATE_TIMEOUT + 1)
+            event.accept()
+        else:
+            event.ignore()
+
+    def exit_confirm_box(self):
+        exit_message_box = QMessageBox(self)
+        exit_message_box.setIcon(QMessageBox.Icon.Question)
+        exit_message_box.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        exit_message_box.setWindowTitle("PyAnime4K-GUI")
+        exit_message_box.setWindowIcon(QIcon(r"Resources\anime.ico"))
+        exit_message_box.setFixedSize(400, 200)
+        exit_message_box.setText(f"Do you want to exit PyAnime4K-GUI?")
+        screen = app.primaryScreen()
+        screen_geometry = screen.availableGeometry()
+        x = (screen_geometry.width() - exit_message_box.width()) // 2
+        y = (screen_geometry.height() - exit_message_box.height()) // 2
+        exit_message_box.move(x, y)
+        result = exit_message_box.exec()
+        return result
+
+    def open_output_folder(self):  # noqa
+        if self.output_dir:
+            env = os.environ.copy()
+
+            # Restore the original library path if a freezer modified it.
+            if "LD_LIBRARY_PATH_ORIG" in env:
+                env["LD_LIBRARY_PATH"] = env.pop("LD_LIBRARY_PATH_ORIG")
+            else:
+                env.pop("LD_LIBRARY_PATH", None)
+
+            for var in (
+                    "QT_PLUGIN_PATH",
+                    "QT_QPA_PLATFORM_PLUGIN_PATH",
+                    "QML_IMPORT_PATH",
+                    "QML2_IMPORT_PATH",
+            ):
+                env.pop(var, None)
+            subprocess.run(["xdg-open", self.output_dir],env=env, check=False)
+
+    def cancel_operation(self):
+        self.cancel_encode = True
+        self.scheduler.cancel()
+        # noinspection SpellCheckingInspection
+        self.log_message("Upscaling Canceled.")
+
+    def log_message(self, message):
+        self.log_file.info(message)
+        self.log_widget.append(message)
+
+    def refresh_status(self):
+        rows = self.status_board.take()
+        if rows is not None:
+            self.status_widget.setText("\n".join(rows))
+            self.status_widget.setVisible(bool(rows))
+
+    def open_file_dialog(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Select Files", "",
+                                                     "Video Files (*.mkv *.mp4)")
+        if file_paths:
+            self.log_widget.clear()
+            self.selected_files = file_paths
+            for file in self.selected_files:
+                self.log_message(f"[Added] - {file}")
+            self.probe_service.probe_async(file_paths, self.probe_signal.emit)
+
+        else:
+            self.log_widget.clear()
+            self.log_message(f"File selection canceled.")
+            return
+
+        output_path = QFileDialog.getExistingDirectory(None, "Select Output Directory")
+        if output_path:
+            self.output_dir = output_path
+            self.activateWindow()
+
+        else:
+            self.selected_files = None
+            self.log_widget.clear()
+            self.log_message(f"File selection canceled.")
+            self.activateWindow()
+
+    def update_probe(self, file, result):
+        if isinstance(result, ProbeError):
+            self.log_message(f"[Probe Failed] - {os.path.basename(file)} - {result}")
+        else:
+            self.log_message(f"[Probed] - {os.path.basename(file)} - {result.summary()}")
+
+    def update_progress(self, file, received_msg):
+        # noinspection SpellCheckingInspection
+        self.log_message(f"[Upscaling] - {os.path.basename(file)} - {received_msg}")
+
+    def job_message(self, job, text):
+        self.progress_signal.emit(job.source, text)
+
+    def job_metrics(self, job, metrics, metrics_log):
+        self.progress_msg = metrics.summary()
+        if metrics.finished:
+            self.progress_signal.emit(job.source, self.progress_msg)
+        else:
+            self.status_board.set(job.id, f"[Upscaling] - {os.path.basename(job.source)} - {self.progress_msg}")
+        metrics_log.write(job, metrics)
+
+    # noinspection PyMethodMayBeStatic
+    # noinspection SpellCheckingInspection
+    def get_codec(self, selected_codec):
+        return codec_from_label(selected_codec)
+
+    def encode_settings(self):
+        """Settings from the combo boxes checked against ffmpeg's capabilities; None when they cannot work."""
+        selected_codec = self.codec_combo.currentText()
+        renditions = tuple(spec.strip() for spec in self.renditions_combo.text().split(",") if spec.strip())
+        settings = EncodeSettings(
+            width=int(self.width_combo.text()),
+            height=int(self.height_combo.text()),
+            bit_rate=self.bit_combo.text(),
+            max_bitrate=self.max_combo.text(),
+            buffer_size=self.buffer_combo.text(),
+            codec=self.get_codec(selected_codec),
+            shader=self.shader_combo.currentText(),
+            hdr=self.hdr_combo.currentText() == "on",
+            quality=int(self.quality_combo.text() or 0),
+            native=self.native_combo.currentText(),
+            aspect=self.aspect_combo.currentText(),
+            renditions=renditions,
+        )
+        try:
+            for spec in renditions:
+                parse_rendition(spec)
+            rate_args(settings)
+        except ValueError as e:
+            self.error_box_signal.emit(str(e))
+            return None
+        if self.capabilities is not None:
+            try:
+                settings, notes = self.capabilities.resolve(settings)
+            except CapabilityError as e:
+                self.error_box_signal.emit(str(e))
+                return None
+            for note in notes:
+                self.output_signal.emit(f"[Capabilities] - {note}")
+        return settings
+
+    def pass_param(self):
+        if self.cancel_encode:
+            return
+
+        settings = self.encode_settings()
+        if settings is None:
+            return
+        if not self.selected_files:
+            return
+
+        # Queued in the database first, so the files are still waiting if the app is closed or crashes.
+        stored = self.job_store.enqueue(self.selected_files, self.output_dir, settings,
+                                        segments=int(self.segments_combo.text() or 1),
+                                        segment_time=int(self.checkpoint_combo.text() or 0),
+                                        pipeline=int(self.pipeline_combo.text() or 0),
+                                        reuse=self.reuse_combo.currentText() == "on")
+        self.run_batch(stored)
+
+    def run_batch(self, stored):
+        """Upscale queued database jobs, one encoder per group of equal settings."""
+        self.scheduler.clear()
+        self.failed_jobs = []
+        self.status_board.remove("failed")
+        groups = batches(stored)
+        jobs = int(self.jobs_combo.text() or 1)
+        tuner = None
+        if jobs == 0:
+            tuner = ConcurrencyTuner(self.scheduler, [settings.codec for settings, _, _ in groups],
+                                     on_decision=lambda text: self.output_signal.emit(f"[Tuner] - {text}")).start()
+        else:
+            self.scheduler.set_max_workers(jobs)
+        for settings, options, group in groups:
+            metrics_log = MetricsLog(cache_dir() / "metrics.jsonl", settings, max_bytes=5 * 1024 * 1024)
+            encoder = Encoder(settings, self.probe_service, on_message=self.job_message,
+                              on_metrics=lambda job, metrics, log=metrics_log: self.job_metrics(job, metrics, log),
+                              tuner=tuner, **options)
+            group, geometries = encoder.by_geometry(group)
+            for line in geometries:
+                self.output_signal.emit(f"[Geometry] - {line}")
+            for record in group:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                if self.cancel_encode:
+                    break
+                job = encoder.job(record.source, os.path.dirname(record.output))
+                job.record_id = record.id
+                self.scheduler.submit(job)
+
+        self.scheduler.wait()
+        if tuner is not None:
+            tuner.stop()
+        self.batch_finished_signal.emit()
+
+    def batch_finished(self):
+        # Queued after every job state signal of the batch, so failed_jobs is complete here.
+        if self.failed_jobs and not self.cancel_encode:
+            self.error_box("\n".join(self.failed_jobs),
+                           f"{len(self.failed_jobs)} files failed to upscale, see the log for details.")
+
+    def error_box(self, received_msg, text="Unexpected Error Occurred."):
+        with open("output.txt", "a") as file:
+            file.write(str(received_msg) + "\n")
+        with open("output.txt", 'r', encoding='utf-8') as read_file:
+            text = read_file.read()
+        self.log_message(text)
+        warning_message_box = QMessageBox(self)
+        warning_message_box.setIcon(QMessageBox.Icon.Critical)
+        warning_message_box.setWindowTitle("PyAnime4K-GUI Error")
+        warning_message_box.setWindowIcon(QIcon(r"Resources\anime.ico"))
+        warning_message_box.setFixedSize(400, 200)
+        warning_message_box.setText(text)
+        screen = app.primaryScreen()
+        screen_geometry = screen.availableGeometry()
+        x = (screen_geometry.width() - warning_message_box.width()) // 2
+        y = (screen_geometry.height() - warning_message_box.height()) // 2
+        warning_message_box.move(x, y)
+        warning_message_box.exec()
+
+    def compare_videos_side_by_side(self, video1_path, video2_path):
+        from anime4k.compare import CompareViewer
+
+        try:
+            CompareViewer(video1_path, video2_path, int(self.width_combo.text()),
+                          int(self.height_combo.text())).run()
+        except Exception as e:
+            self.error_box_signal.emit(e)
+
+    def append_ascii_art(self):
+        ascii_art = """
+  ⠀⢀⣀⣀⣤⣤⣤⣤⣶⣶⣶⣶⣿⡿⡫⢶⠏⡃⣥⣩⢵⣶⣾⣿⣿⣿⣿⣿⣷⣿⣬⣿⣒⣪⢨⣻⠿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿
+⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⠏⠜⠩⣔⠪⣑⣶⣾⣿⣿⣿⣿⣿⣿⣟⣻⣿⣿⣿⣿⡯⣟⠳⣭⣻⢦⣛⢿⣿⠟⠛⠛⠛⠛⠛⠛⠛⠛
+⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⢟⠱⣢⣵⣯⠔⡫⢖⣿⣿⣿⣿⣿⣿⣿⣺⡿⣿⣿⣿⣿⣿⣯⣓⢿⡿⣑⢝⡲⣕⠝⢿⣷⣦⣤⣀⡀⠀⠀⠀
+⣿⣿⣿⣿⣿⣿⣿⣿⢟⢕⣵⣿⡛⢿⣿⣿⣎⠵⣿⣿⣿⣿⣿⠿⠿⠿⢯⣿⣿⣿⣿⣿⣿⣿⢿⣙⢮⣑⢮⣿⣦⢣⡻⣿⣿⣿⣿⣿⣶⣤
+⣿⣿⣿⣿⣿⡿⠋⢔⣥⣿⣿⣿⣿⣄⠀⠉⠉⠉⠉⠉⠁⠀⠀⠀⠀⠀⠀⠀⠈⠉⠛⢿⣿⢏⡳⣭⣳⣾⣿⣿⣿⣷⢕⢎⢿⣿⣿⣿⣿⣿
+⣿⣿⣿⣿⡿⡡⣱⢛⢿⣿⣿⣿⣿⡿⠃⠀⠀⠀⠀⠀⢌⣆⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⠳⣬⣾⣿⣿⣿⡟⡙⢌⢦⢨⣃⢿⣿⣿⣿⣿
+⣿⣿⣿⣿⢡⠱⠣⡡⠩⠻⠿⠋⠁⠀⠀⠀⠀⠀⠀⠀⣾⣿⣧⡀⠀⠀⠀⢦⡂⠀⠀⠀⠀⠀⠈⠛⢿⣿⠡⡱⣘⣬⣶⣶⣏⣎⣿⣿⣿⣿
+⣿⣿⣿⡇⠢⣷⣷⣷⣱⢠⡀⠀⠀⠀⠀⠀⠀⣀⠀⢸⣿⣿⣿⣿⣦⡀⠀⠘⡇⡄⡀⠐⠀⠀⠀⠀⠈⠻⣷⣷⣿⣿⣿⣿⣿⡞⢸⣿⣿⣿
+⣿⣿⡟⡈⢂⢹⣿⣿⣿⣿⣿⠇⠀⠀⠀⠀⠀⣾⠀⣿⣿⣿⣿⣿⣿⣿⣦⣀⠱⣎⡀⠘⠄⠀⠀⠀⠀⠀⠈⢙⡋⠇⠏⣿⣿⡇⣻⣿⣿⣿
+⣿⣿⡧⣼⣿⣿⣿⣿⣿⠟⠁⠀⠀⠀⠀⠀⢸⣛⣓⣛⠛⠛⢿⣿⣿⣿⣫⠅⠉⣍⣥⠚⢷⠀⠀⠀⠀⠀⠹⢻⢿⡏⠏⡏⡟⣷⢱⡿⠿⠿
+⣿⣿⡇⣿⣿⣿⠻⠿⣅⣀⣀⡀⠀⠀⠀⡄⣿⠋⣡⣴⣦⢈⢿⡎⣿⣿⣶⡇⣾⠋⠙⣷⠸⡆⠀⢀⢄⠀⠀⠈⣩⣓⣥⣥⣃⣿⢨⣤⣤⣤
+⡛⠛⠃⢻⣿⣿⣄⣤⣧⣿⣿⠟⠀⠀⠀⢡⡅⢹⣏⣀⣹⡇⢸⣏⢹⣿⣿⣖⡻⠷⠾⢟⣲⢰⠀⠑⢸⠀⣶⣿⣿⣿⣿⣿⣿⣿⢀⠀⠀⠀
+⣿⣿⣿⡎⣟⢻⠹⡉⢏⠻⡜⢁⣠⠀⠢⠸⣷⣜⣿⣿⣫⣼⣼⣛⣘⣧⣿⣿⣿⣭⣨⣥⣶⠸⢦⡀⡄⠀⠈⢟⢿⢿⣿⣿⣿⢣⣿⣿⣿⣿
+⣿⣿⣿⣿⡘⢦⣢⣹⣮⣶⣷⣿⣿⢀⠕⢁⢻⣿⣿⠿⢛⣫⣭⣵⣶⣶⣶⣿⣿⣿⣶⢀⡏⠦⡠⠜⢰⢆⡤⣵⣕⣵⣾⢛⢡⣿⣿⣿⣿⣿
+⣿⣿⣿⣿⣿⣌⢻⣿⣿⣿⣿⡿⡟⢇⠱⣅⠈⢿⣦⡸⡿⠿⣛⣫⣭⣽⣶⣶⣶⠶⣢⣾⠏⠂⠠⢄⢸⣭⡪⢊⡿⢋⣴⣿⣾⣿⣿⣿⣿⣿
+⣿⣿⣿⣿⣿⠋⢄⣍⠻⣿⡃⢝⡪⣵⢟⡢⢀⡬⡛⢿⣦⣽⣛⣛⣛⣛⣛⣯⣵⡾⠟⠁⠀⡀⢮⡑⣘⠿⠓⠥⣶⣿⣿⡿⣻⣿⣿⣿⣿⣿
+⣿⣿⣿⡿⠇⢢⣿⣿⣿⣶⣝⣛⠿⢬⣕⣲⣟⣁⡄⡀⠈⣉⡛⠛⠿⠿⠟⢫⣉⣤⣾⠠⠰⢟⣩⣥⣶⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿
+⣿⣿⡿⠁⣱⣿⣿⣿⣿⣿⣿⣿⠃⠀⠀⠉⠉⠛⠛⠓⠂⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⢰⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿
+⣿⡿⠑⣼⣿⣿⣿⣿⣿⣿⣿⣿⠀⠀⠀⠀⠀⠀⠀⠀⠀⢿⣿⣿⣿⣿⣿⣿⡿⣋⣿⡈⢹⣿⣿⣿⠉⠉⠉⠉⠉⠙⠛⠛⠛⠛⠋⠛⠛⠉
+⣿⣇⣾⣿⣿⣿⣿⣿⣿⣿⣿⣿⠀⠀⠀⠀⠀⣠⠰⠚⣼⣷⣭⡻⠿⡿⢿⣫⣾⣿⢸⣧⠀⠒⡘⠿⠀⠀⠀⠀⠀⠀⠀⠀⠀⣷⣿⣿⣷⣶
+⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⡿⠇⠀⠴⠂⡾⠁⣠⣾⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⢸⣿⣷⠄⢾⠀⣳⣄⡀⠦⠤⠤⠤⢤⣰⣿⣿⣿⣿⣿
+⣿⣿⣿⣿⣿⠟⣩⣴⣶⣾⣿⣿⣿⣾⡄⢸⡇⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⡿⣸⡿⢡⡶⠃⣸⣿⣿⣿⣿⣿⣿⣿⣿⣶⣬⡙⢿⣿⣿
+⣿⣿⣿⠟⣡⣾⣿⣿⢿⣿⣿⣿⣿⣿⣷⡈⣇⢛⣛⣻⠿⢿⣿⣿⣿⠿⢟⣛⣭⡥⢁⣴⣏⣡⣶⣿⣿⣿⢻⣿⣿⣿⣿⣿⠛⣿⣿⣎⠻⣿
+⣿⣿⠁⣺⡟⠿⡿⠛⠈⣿⣽⣿⣿⡟⠻⣿⠇⣿⣿⣿⣿⣶⣿⣟⣥⣾⣿⣿⣿⢰⣿⣿⣿⣿⣿⣿⣟⣓⡄⠸⣿⣿⡿⠫⠀⢸⣿⣿⣥⠹
+⣿⠣⡪⠏⠀⠀⠨⠀⡀⢿⣿⣿⡿⢰⠇⡽⣸⣿⣿⣿⣿⠟⠡⣿⣿⣿⣿⣿⣿⢸⣿⣿⣿⣿⢿⣿⣿⢻⠀⠠⠙⠛⠁⠀⠀⠺⣿⠛⢛⣸
+⣅⠍⠀⠀⠀⠀⠘⠀⢠⣺⣿⣿⣿⣦⣾⢃⡹⠟⠿⠟⣡⠆⣆⠛⢿⡿⣿⢟⡁⣼⣿⣿⠿⢽⠯⡠⠀⠈⠀⠀⠀⠀⠁⠀⠁⠀⠉⠠⠨⢿
+⠃⠀⠀⠀⠀⠀⠀⢀⣨⡸⣛⣿⣿⣿⡟⣴⠋⢊⣷⣾⡟⢀⣿⢸⠢⠶⣴⣿⡇⣿⣿⣿⣷⣆⣑⢱⡀⠀⠂⠀⠀⠀⠀⡄⠀⠆⠀⠀⣴⣿
+        """
+        cursor = self.log_widget.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+
+        block_format = QTextBlockFormat()
+        block_format.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        cursor.insertBlock(block_format)
+        cursor.insertText(ascii_art)
+        self.log_widget.setTextCursor(cursor)
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    if app.styleHints().colorScheme() == Qt.ColorScheme.Dark:
+        with open(r"Resources/dark_theme_utf8.qss", "r") as f:
+            app.setStyleSheet(f.read())
+    else:
+        with open(r"Resources/light_theme_utf8.qss", "r") as f:
+            app.setStyleSheet(f.read())
+    shared_mem = QSharedMemory("PyAnime4K")
+    if not shared_mem.create(1):
+        # Already running
+        msg = QMessageBox()
+        msg.setWindowTitle("PyAnime4K-GUI Error")
+        msg.setWindowIcon(QIcon(r"Resources\anime.ico"))
+        msg.setText("Another instance is already running.")
+        msg.setIcon(QMessageBox.Icon.Warning)
+        msg.exec()
+        sys.exit(0)
+    startup.mark("QApplication")
+    window = MainWindow()
+    startup.mark("MainWindow()")
+    window.show()
+    startup.mark("window.show()")
+    if startup.enabled:
+        QTimer.singleShot(0, lambda: (startup.mark("first event loop pass"), startup.report(), app.quit()))
     app.exec()
\ No newline at end of file
@@ -0,0 +1 @@
+"""Encode engine shared by the PyAnime4K GUI scripts."""
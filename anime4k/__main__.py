@@ -0,0 +1,5 @@
+import sys
+
+from anime4k.cli import main
+
+sys.exit(main())
@@ -0,0 +1,187 @@
+"""Pick a shader per file from a quick look at a few of its frames.
+
+A handful of frames spread over the file are decoded as 8-bit luma and
+measured with vectorised NumPy:
+
+* noise: Immerkær's estimate, the median response of a Laplacian-difference
+  kernel that cancels out smooth shading (the median keeps line art out),
+* detail: high-frequency energy in the top octave against the octave below;
+  a source upscaled from a lower resolution has almost none in the top one,
+* blockiness: small steps between flat neighbours on the 8x8 block grid of
+  MPEG-style codecs against the same steps half a block away, which
+  cancels out line art and patterns that repeat every few pixels.
+
+``choose_shader`` maps these and the scale factor to the cheapest Anime4K
+mode meant for that kind of source: clean sources get Mode C, blurry ones
+Mode A, noisy or blocky ones Mode B, and only degraded low-resolution rips
+get the doubled restore chains. The thresholds are module constants.
+"""
+import subprocess
+from dataclasses import dataclass, replace
+
+from anime4k.command import AUTO_SHADER
+from anime4k.tools import ffmpeg_path, popen_kwargs
+
+SAMPLE_FRAMES = 6
+# Sources this tall or smaller are DVD-class rips
+LOW_RESOLUTION = 576
+# Noise sigma in 8-bit luma steps
+NOISY = 2.0
+VERY_NOISY = 4.0
+# Steps on block edges relative to steps half a block away
+BLOCKY = 1.8
+VERY_BLOCKY = 3.0
+# Top-octave detail relative to the octave below
+SOFT = 0.3
+# Upscale factor from which a soft source needs the larger restore chain
+LARGE_SCALE = 3.0
+
+# noinspection SpellCheckingInspection
+CLEAN_SHADER = "Anime4K_ModeC.glsl"
+BLURRY_SHADER = "Anime4K_ModeA.glsl"
+BLURRY_LARGE_SHADER = "Anime4K_ModeA+A+UL.glsl"
+# noinspection SpellCheckingInspection
+DEGRADED_SHADER = "Anime4k_ModeB.glsl"
+DEGRADED_LOW_RES_SHADER = "Anime4K_ModeB+B.glsl"
+
+
+@dataclass
+class ContentProfile:
+    width: int
+    height: int
+    frames: int
+    noise: float
+    detail: float
+    blockiness: float
+
+    def summary(self):
+        return (f"{self.width}x{self.height}, noise {self.noise:.1f}, detail {self.detail:.2f}, "
+                f"blockiness {self.blockiness:.2f} over {self.frames} frames")
+
+
+@dataclass
+class ShaderChoice:
+    shader: str
+    reason: str
+    profile: ContentProfile
+
+
+def sample_times(duration, count=SAMPLE_FRAMES):
+    """Evenly spaced times that skip the very start and end, where logos and black frames sit."""
+    return [duration * (index + 1) / (count + 1) for index in range(count)]
+
+
+def grab_frames(source, info, count=SAMPLE_FRAMES):
+    """Decode ``count`` frames of ``source`` as luma arrays of the source resolution."""
+    import numpy as np
+
+    frames = []
+    size = info.width * info.height
+    for start in sample_times(info.duration or 0, count) if info.duration else [0]:
+        # Seeking before the input is fast and lands on the nearest frame, which is all a sample needs.
+        result = subprocess.run([ffmpeg_path(), "-loglevel", "error", "-ss", f"{start:.3f}", "-i", str(source),
+                                 "-map", "0:v:0", "-frames:v", "1", "-pix_fmt", "gray", "-f", "rawvideo", "pipe:1"],
+                                stdin=subprocess.DEVNULL, capture_output=True, **popen_kwargs())
+        if result.returncode == 0 and len(result.stdout) == size:
+            frames.append(np.frombuffer(result.stdout, np.uint8).reshape(info.height, info.width))
+    return frames
+
+
+def _noise(luma):
+    import numpy as np
+
+    # [[1, -2, 1], [-2, 4, -2], [1, -2, 1]] as shifted slices; flat and linear shading cancel out.
+    response = (luma[:-2, :-2] - 2 * luma[:-2, 1:-1] + luma[:-2, 2:]
+                - 2 * luma[1:-1, :-2] + 4 * luma[1:-1, 1:-1] - 2 * luma[1:-1, 2:]
+                + luma[2:, :-2] - 2 * luma[2:, 1:-1] + luma[2:, 2:])
+    # The kernel has a gain of 6 on white noise; 0.6745 turns a median absolute value into sigma.
+    return float(np.median(np.abs(response))) / (6 * 0.6745)
+
+
+def _detail(luma):
+    import numpy as np
+
+    # A centred crop is plenty, and keeps the FFT cheap on 4K sources.
+    height, width = min(luma.shape[0], 1024), min(luma.shape[1], 1024)
+    top, left = (luma.shape[0] - height) // 2, (luma.shape[1] - width) // 2
+    crop = luma[top:top + height, left:left + width]
+    window = np.outer(np.hanning(height), np.hanning(width))
+    power = np.abs(np.fft.rfft2((crop - crop.mean()) * window)) ** 2
+    radius = np.hypot(*np.meshgrid(np.fft.fftfreq(height), np.fft.rfftfreq(width), indexing="ij"))
+    # Above a quarter cycle per pixel is the octave a 2x upscale cannot fill.
+    fine = power[radius >= 0.25].sum()
+    coarse = power[(radius >= 0.125) & (radius < 0.25)].sum()
+    return float(fine / coarse) if coarse else 0.0
+
+
+def _isolated_steps(differences):
+    """Small steps between flat neighbours, the signature of a block edge; line art steps are far larger."""
+    step = differences[:, 1:-1]
+    return (step >= 1) & (step <= 8) & (differences[:, :-2] < 1) & (differences[:, 2:] < 1)
+
+
+def _blockiness(luma):
+    import numpy as np
+
+    rates = []
+    for differences in (np.abs(np.diff(luma, axis=1)), np.abs(np.diff(luma, axis=0)).T):
+        steps = _isolated_steps(differences)
+        # Column 6 of the trimmed steps is the step between pixels 7 and 8, the edge of the first block;
+        # column 2 is the middle of the block.
+        rates.append((steps[:, 6::8].mean(), steps[:, 2::8].mean()))
+    edges, middle = np.mean(rates, axis=0)
+    # A little slack keeps clean frames, with almost no such steps anywhere, near 1.
+    return float((edges + 0.001) / (middle + 0.001))
+
+
+def profile_frames(frames):
+    """Measure decoded luma frames; the median over frames keeps one odd scene from deciding."""
+    import numpy as np
+
+    values = []
+    for frame in frames:
+        luma = frame.astype(np.float32)
+        values.append((_noise(luma), _detail(luma), _blockiness(luma)))
+    noise, detail, blockiness = np.median(np.array(values), axis=0)
+    height, width = frames[0].shape
+    return ContentProfile(width, height, len(frames), round(float(noise), 2), round(float(detail), 3),
+                          round(float(blockiness), 3))
+
+
+def analyse(source, info):
+    """Profile ``source``; None when no frame could be decoded."""
+    frames = grab_frames(source, info)
+    return profile_frames(frames) if frames else None
+
+
+def choose_shader(profile, target_height):
+    """The cheapest mode for the profiled source, with the reason it was picked."""
+    scale = target_height / profile.height
+    low_resolution = profile.height <= LOW_RESOLUTION
+    degraded = profile.noise >= NOISY or profile.blockiness >= BLOCKY
+    badly_degraded = profile.noise >= VERY_NOISY or profile.blockiness >= VERY_BLOCKY
+    if badly_degraded and low_resolution:
+        return ShaderChoice(DEGRADED_LOW_RES_SHADER, "heavy noise or compression artefacts in a low resolution rip",
+                            profile)
+    if degraded:
+        return ShaderChoice(DEGRADED_SHADER, "noise or compression artefacts", profile)
+    if profile.detail < SOFT:
+        if scale >= LARGE_SCALE and low_resolution:
+            return ShaderChoice(BLURRY_LARGE_SHADER, f"soft low resolution source upscaled {scale:.1f}x", profile)
+        return ShaderChoice(BLURRY_SHADER, "soft source", profile)
+    return ShaderChoice(CLEAN_SHADER, "clean and sharp source", profile)
+
+
+def resolve_shader(source, info, settings):
+    """``(settings, choice)`` with an ``auto`` shader replaced by the analysis' pick.
+
+    Other shaders are an override and come back unchanged with no choice. A
+    file that cannot be analysed falls back to Mode A."""
+    if settings.shader != AUTO_SHADER:
+        return settings, None
+    profile = analyse(source, info) if info.width and info.height else None
+    if profile is None:
+        choice = ShaderChoice(BLURRY_SHADER, "no frames could be analysed", None)
+    else:
+        choice = choose_shader(profile, settings.height)
+    return replace(settings, shader=choice.shader), choice
@@ -0,0 +1,182 @@
+"""Throughput benchmark over a matrix of shaders, codecs and output sizes.
+
+Every run upscales the same clip (a user file or a ``testsrc2`` clip that is
+generated once) with the command ``build_command`` would give the GUI, and
+records frames per second, wall time, CPU time and peak memory of the
+ffmpeg process. With a CPU codec such as libx264 and a software Vulkan
+device (``--vulkan-device llvmpipe`` for lavapipe) it runs on machines
+without a GPU.
+"""
+import csv
+import itertools
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, fields, replace
+from pathlib import Path
+
+from anime4k.command import EncodeSettings, build_command
+from anime4k.metrics import ProgressParser
+from anime4k.runner import run_quiet
+from anime4k.tools import cache_dir, ffmpeg_path, popen_kwargs
+
+
+@dataclass
+class BenchResult:
+    shader: str
+    codec: str
+    width: int
+    height: int
+    status: str = "ok"
+    frames: int = 0
+    fps: float = None
+    speed: float = None
+    wall_s: float = None
+    cpu_s: float = None
+    peak_rss_mb: float = None
+    output_bytes: int = None
+
+
+def parse_size(text):
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+
+def synthetic_clip(duration=5, size="1280x720", rate=24):
+    """A lossless-looking ``testsrc2`` clip, generated once and kept in the cache folder."""
+    path = cache_dir() / f"bench_testsrc2_{size}_{rate}fps_{duration}s.mkv"
+    if not path.exists():
+        partial = path.with_suffix(".part.mkv")
+        # noinspection SpellCheckingInspection
+        run_quiet([
+            ffmpeg_path(),
+            "-loglevel", "error",
+            "-y",
+            "-f", "lavfi",
+            "-i", f"testsrc2=size={size}:rate={rate}:duration={duration}",
+            "-pix_fmt", "yuv420p",
+            "-c:v", "libx264",
+            "-preset", "ultrafast",
+            "-crf", "10",
+            str(partial),
+        ])
+        os.replace(partial, path)
+    return path
+
+
+class _PeakSampler(threading.Thread):
+    """Polls CPU time and resident memory of a process where ``os.wait4`` is not available."""
+
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        import psutil
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.cpu_s = None
+        self.peak_rss = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        import psutil
+        while not self.stopped.is_set():
+            try:
+                with self.process.oneshot():
+                    times = self.process.cpu_times()
+                    memory = self.process.memory_info()
+            except psutil.Error:
+                return
+            self.cpu_s = times.user + times.system
+            self.peak_rss = max(self.peak_rss, getattr(memory, "peak_wset", memory.rss))
+            self.stopped.wait(self.interval)
+
+
+def run_measured(command, parser):
+    """Run ffmpeg with ``-progress`` on stdout; return ``(returncode, cpu_s, peak_rss_bytes, stderr)``."""
+    command = [command[0], "-progress", "pipe:1", "-nostats"] + command[1:]
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr,
+                                   text=True, errors="replace", **popen_kwargs())
+        sampler = None
+        if not hasattr(os, "wait4"):
+            try:
+                sampler = _PeakSampler(process.pid)
+                sampler.start()
+            except Exception:  # psutil missing or the process already gone
+                sampler = None
+        try:
+            for line in process.stdout:
+                parser.feed(line)
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            cpu_s = usage.ru_utime + usage.ru_stime
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            peak_rss = usage.ru_maxrss if os.uname().sysname == "Darwin" else usage.ru_maxrss * 1024
+        else:
+            process.wait()
+            cpu_s = peak_rss = None
+            if sampler is not None:
+                sampler.stopped.set()
+                sampler.join()
+                cpu_s, peak_rss = sampler.cpu_s, sampler.peak_rss or None
+        stderr.seek(0)
+        tail = stderr.read().decode(errors="replace")[-2000:]
+    return process.returncode, cpu_s, peak_rss, tail
+
+
+def bench_one(clip, settings, vulkan_device=None, work_dir=None, frame_count=None):
+    result = BenchResult(settings.shader, settings.codec, settings.width, settings.height)
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        output = Path(tmp) / "bench.mkv"
+        command = build_command(clip, output, settings, video_only=True, overwrite=True,
+                                vulkan_device=vulkan_device)
+        parser = ProgressParser(total_frames=frame_count)
+        start = time.monotonic()
+        returncode, cpu_s, peak_rss, stderr = run_measured(command, parser)
+        result.wall_s = round(time.monotonic() - start, 3)
+        if returncode != 0:
+            last_line = next((line for line in reversed(stderr.splitlines()) if line.strip()), "")
+            result.status = f"failed: {last_line.strip() or f'exit code {returncode}'}"
+            return result
+        metrics = parser.metrics
+        result.frames = metrics.frame if metrics else 0
+        result.fps = round(result.frames / result.wall_s, 2) if result.wall_s else None
+        result.speed = metrics.speed if metrics else None
+        result.cpu_s = None if cpu_s is None else round(cpu_s, 3)
+        result.peak_rss_mb = None if peak_rss is None else round(peak_rss / 1024 ** 2, 1)
+        result.output_bytes = output.stat().st_size if output.exists() else None
+    return result
+
+
+def benchmark(clip, shaders, codecs, sizes, base=None, vulkan_device=None, work_dir=None, frame_count=None,
+              on_result=None):
+    """Run every shader x codec x size combination one after another, so runs do not compete."""
+    base = base or EncodeSettings()
+    results = []
+    for shader, codec, (width, height) in itertools.product(shaders, codecs, sizes):
+        settings = replace(base, shader=shader, codec=codec, width=width, height=height, hdr=False)
+        result = bench_one(clip, settings, vulkan_device, work_dir, frame_count)
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    return results
+
+
+def write_report(results, base_path, info=None):
+    """Write ``<base_path>.csv`` and ``<base_path>.json``; returns both paths."""
+    csv_path = Path(f"{base_path}.csv")
+    json_path = Path(f"{base_path}.json")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(BenchResult)])
+        writer.writeheader()
+        writer.writerows(asdict(result) for result in results)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"info": info or {}, "results": [asdict(result) for result in results]}, f, indent=2)
+    return csv_path, json_path
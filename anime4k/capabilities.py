@@ -0,0 +1,208 @@
+"""What the installed ffmpeg can actually do, detected once and cached on disk.
+
+Detection lists the compiled-in video encoders, filters and pixel formats,
+checks that a Vulkan device can be created, and runs a one-frame test
+encode for every hardware encoder, because nvenc/amf encoders are listed
+even on machines without the matching GPU or driver. The result is cached
+under the SHA-1 of the ffmpeg binary, so it is only redone after ffmpeg
+is replaced or when a refresh is requested.
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+
+from anime4k.command import CODEC_LABELS, codec_from_label, highest_quality, parse_rendition
+from anime4k.tools import cache_dir, ffmpeg_path, popen_kwargs
+
+# noinspection SpellCheckingInspection
+HARDWARE_SUFFIXES = ("_nvenc", "_amf", "_qsv", "_vaapi", "_videotoolbox")
+
+# noinspection SpellCheckingInspection
+FALLBACKS = {
+    "hevc_nvenc": ["hevc_amf", "libx265", "libx264"],
+    "hevc_amf": ["hevc_nvenc", "libx265", "libx264"],
+    "h264_nvenc": ["h264_amf", "libx264"],
+    "h264_amf": ["h264_nvenc", "libx264"],
+    "av1_nvenc": ["av1_amf", "libaom-av1", "libx265"],
+    "av1_amf": ["av1_nvenc", "libaom-av1", "libx265"],
+    "libx265": ["libx264"],
+    "libaom-av1": ["libx265", "libx264"],
+}
+
+_ENCODER_LINE = re.compile(r"^\s*V[A-Z.]{5}\s+(\S+)\s")
+_FILTER_LINE = re.compile(r"^\s*[T.][S.][C.]\s+(\S+)\s+\S+->\S+")
+_PIX_FMT_LINE = re.compile(r"^[I.][O.][H.][P.][B.]\s+(\S+)\s+\d")
+
+
+class CapabilityError(ValueError):
+    pass
+
+
+@dataclass
+class Capabilities:
+    ffmpeg: str
+    binary_hash: str
+    encoders: list = field(default_factory=list)
+    filters: list = field(default_factory=list)
+    pix_fmts: list = field(default_factory=list)
+    vulkan: bool = False
+    # Hardware encoders that are compiled in but failed a test encode on this machine
+    broken_encoders: list = field(default_factory=list)
+
+    def has_encoder(self, codec):
+        return codec in self.encoders and codec not in self.broken_encoders
+
+    def codec_labels(self):
+        return [label for label in CODEC_LABELS if self.has_encoder(codec_from_label(label))]
+
+    def problems(self, settings):
+        """Reasons ``settings`` cannot work at all, codec aside."""
+        problems = []
+        if "libplacebo" not in self.filters:
+            problems.append("ffmpeg was built without the libplacebo filter")
+        if settings.hdr:
+            if "p010le" not in self.pix_fmts:
+                problems.append("ffmpeg does not support the p010le pixel format needed for HDR")
+        else:
+            if "hwupload" not in self.filters:
+                problems.append("ffmpeg was built without the hwupload filter")
+            if not self.vulkan:
+                problems.append("no Vulkan device could be created")
+        return problems
+
+    def working_codec(self, codec):
+        """``codec`` or its first working fallback; raises ``CapabilityError`` when there is none."""
+        if self.has_encoder(codec):
+            return codec
+        for fallback in FALLBACKS.get(codec, []):
+            if self.has_encoder(fallback):
+                return fallback
+        raise CapabilityError(f"{codec} is not available and no fallback encoder works.")
+
+    def resolve(self, settings):
+        """Return ``(settings, notes)`` with codecs, renditions' included, swapped for working fallbacks.
+
+        A quality level the fallback codecs do not accept is lowered to the
+        highest one they all do. Raises ``CapabilityError`` when no
+        combination can work."""
+        problems = self.problems(settings)
+        if problems:
+            raise CapabilityError("Cannot upscale with this ffmpeg: " + "; ".join(problems) + ".")
+        notes = []
+        codec = self.working_codec(settings.codec)
+        if codec != settings.codec:
+            notes.append(f"{settings.codec} is not available, using {codec} instead.")
+        renditions = []
+        for spec in settings.renditions:
+            rendition = parse_rendition(spec)
+            rendition_codec = self.working_codec(rendition.codec)
+            if rendition_codec != rendition.codec:
+                notes.append(f"{rendition.codec} is not available for the {rendition.width}x{rendition.height} "
+                             f"rendition, using {rendition_codec} instead.")
+                rendition = replace(rendition, codec=rendition_codec)
+            renditions.append(str(rendition))
+        if not notes:
+            return settings, []
+        quality = settings.quality
+        # The level is shared by the main output and every rendition.
+        highest = min(highest_quality(name) for name in [codec] + [parse_rendition(spec).codec for spec in renditions])
+        if quality > highest:
+            notes.append(f"Quality {quality} is out of range for the fallback encoder, using {highest} instead.")
+            quality = highest
+        return replace(settings, codec=codec, renditions=tuple(renditions), quality=quality), notes
+
+    def summary(self):
+        hardware = [name for name in self.encoders if name.endswith(HARDWARE_SUFFIXES)]
+        working = [name for name in hardware if name not in self.broken_encoders]
+        return (f"libplacebo {'yes' if 'libplacebo' in self.filters else 'no'}, "
+                f"vulkan {'yes' if self.vulkan else 'no'}, "
+                f"hardware encoders: {', '.join(working) or 'none'}")
+
+
+def binary_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _list(ffmpeg, option, pattern):
+    result = subprocess.run([ffmpeg, "-hide_banner", option], stdin=subprocess.DEVNULL, capture_output=True,
+                            text=True, errors="replace", **popen_kwargs())
+    return [match.group(1) for match in map(pattern.match, result.stdout.splitlines()) if match]
+
+
+def _succeeds(command):
+    try:
+        result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, timeout=30, **popen_kwargs())
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def _test_encode(ffmpeg, codec):
+    # noinspection SpellCheckingInspection
+    return _succeeds([ffmpeg, "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                      "-i", "color=black:size=256x256:duration=0.1", "-frames:v", "1",
+                      "-pix_fmt", "yuv420p", "-c:v", codec, "-f", "null", "-"])
+
+
+def _test_vulkan(ffmpeg):
+    # noinspection SpellCheckingInspection
+    return _succeeds([ffmpeg, "-hide_banner", "-loglevel", "error", "-init_hw_device", "vulkan",
+                      "-f", "lavfi", "-i", "nullsrc=size=16x16:duration=0.04", "-f", "null", "-"])
+
+
+def detect(ffmpeg=None, digest=None):
+    ffmpeg = ffmpeg or ffmpeg_path()
+    caps = Capabilities(
+        ffmpeg=ffmpeg,
+        binary_hash=digest or binary_hash(ffmpeg),
+        encoders=_list(ffmpeg, "-encoders", _ENCODER_LINE),
+        filters=_list(ffmpeg, "-filters", _FILTER_LINE),
+        pix_fmts=_list(ffmpeg, "-pix_fmts", _PIX_FMT_LINE),
+    )
+    hardware = [name for name in caps.encoders if name.endswith(HARDWARE_SUFFIXES)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        vulkan = pool.submit(_test_vulkan, ffmpeg)
+        working = dict(zip(hardware, pool.map(lambda codec: _test_encode(ffmpeg, codec), hardware)))
+        caps.vulkan = vulkan.result()
+    caps.broken_encoders = [name for name, ok in working.items() if not ok]
+    return caps
+
+
+_lock = threading.Lock()
+
+
+def load_capabilities(refresh=False, path=None):
+    """Cached capabilities of the current ffmpeg, detecting them when the binary changed.
+
+    Raises ``OSError`` when ffmpeg cannot be found or run."""
+    path = path or cache_dir() / "capabilities.json"
+    ffmpeg = ffmpeg_path()
+    digest = binary_hash(ffmpeg)
+    with _lock:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+        if not refresh and digest in cached:
+            try:
+                return Capabilities(**cached[digest])
+            except TypeError:
+                pass
+        caps = detect(ffmpeg, digest)
+        cached[digest] = asdict(caps)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cached, f, indent=1)
+        os.replace(tmp, path)
+        return caps
@@ -0,0 +1,218 @@
+"""Split & parallel mode: upscale keyframe-aligned pieces of one video at once.
+
+The source video stream is cut with the segment muxer (stream copy, so cuts
+land on keyframes), every piece is upscaled as its own ffmpeg job, and the
+encoded pieces are joined with the concat demuxer while the original audio
+and subtitle streams are muxed back in a single pass.
+
+Every split is checkpointed in a journal inside the work directory, so an
+interrupted encode restarted with the same source and settings only encodes
+the segments that had not finished yet.
+"""
+import csv
+import math
+import shutil
+import threading
+from pathlib import Path
+
+from anime4k.command import build_command
+from anime4k.journal import EncodeJournal, fingerprint
+from anime4k.metrics import CombinedMetrics
+from anime4k.runner import run_quiet, run_with_progress
+from anime4k.scheduler import Job, JobCancelled, JobScheduler, JobState
+from anime4k.tools import ffmpeg_path
+
+
+class CombinedProgress:
+    """Duration-weighted progress over several segments."""
+
+    def __init__(self, weights, on_progress=None):
+        total = sum(weights) or len(weights)
+        self._weights = [(weight or 1) / total for weight in weights]
+        self._progress = [0.0] * len(weights)
+        self._lock = threading.Lock()
+        self.on_progress = on_progress
+
+    @property
+    def percent(self):
+        return round(sum(w * p for w, p in zip(self._weights, self._progress)), 2)
+
+    def update(self, index, progress):
+        with self._lock:
+            self._progress[index] = progress
+            if self.on_progress is not None:
+                self.on_progress(self.percent)
+
+
+class Segment:
+    def __init__(self, index, source, start, end, output):
+        self.index = index
+        self.source = source
+        self.start = start
+        self.end = end
+        self.output = output
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+def concat_list_line(path):
+    # The concat demuxer resolves relative entries against the list's folder, not the working directory.
+    escaped = Path(path).absolute().as_posix().replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+
+def concat_segments(outputs, source, output, work_dir, job=None):
+    """Join the encoded video ``outputs`` in order and mux the audio and subtitles of ``source`` back in."""
+    concat_list = Path(work_dir) / "upscaled.txt"
+    with open(concat_list, "w", encoding="utf-8") as f:
+        f.writelines(concat_list_line(path) for path in outputs)
+    # noinspection SpellCheckingInspection
+    command = [
+        ffmpeg_path(),
+        "-loglevel", "error",
+        "-y",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", str(concat_list),
+        "-i", str(source),
+        "-map", "0:v",
+        "-map", "1:s?",
+        "-map", "1:a?",
+        "-c", "copy",
+        "-map_metadata", "1",
+        str(output),
+    ]
+    run_quiet(command, job)
+
+
+class ChunkedEncode:
+    """Encode ``source`` as ``segments`` parallel pieces, or as pieces of
+    ``segment_time`` seconds of which ``segments`` run at once."""
+
+    def __init__(self, source, output, settings, duration, segments=1, segment_time=None, work_dir=None,
+                 on_message=None, total_frames=None, threads=None):
+        self.source = str(source)
+        self.output = Path(output)
+        self.settings = settings
+        self.duration = duration
+        self.segments = max(1, int(segments))
+        self.segment_time = segment_time
+        self.work_dir = Path(work_dir) if work_dir else self.output.parent / f".{self.output.stem}-segments"
+        self.journal = EncodeJournal(self.work_dir / "journal.json")
+        self.on_message = on_message
+        self.total_frames = total_frames
+        # Encoder threads of the whole job, shared by the segments that run at once
+        self.threads = threads and max(1, threads // self.segments)
+
+    def split_times(self):
+        if self.segment_time:
+            count = math.ceil(self.duration / self.segment_time)
+            return [self.segment_time * i for i in range(1, count)]
+        return [self.duration * i / self.segments for i in range(1, self.segments)]
+
+    def prepare(self, job=None):
+        """Reuse the journaled split when it still applies, otherwise split from scratch."""
+        key = fingerprint(self.source, self.settings, split_times=self.split_times())
+        if self.journal.load().matches(key):
+            segments = [Segment(index, Path(entry["source"]), entry["start"], entry["end"], Path(entry["output"]))
+                        for index, entry in enumerate(self.journal.segments)]
+            if all(segment.source.exists() for segment in segments):
+                return segments
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        segments = self.split(job)
+        self.journal.start(key, segments)
+        return segments
+
+    def split(self, job=None):
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        times = self.split_times()
+        if not times:
+            # A file no longer than one segment: the segment muxer rejects an empty list of split points,
+            # and a copy of the whole video would gain nothing over reading the source itself.
+            return [Segment(0, Path(self.source), 0.0, self.duration, self.work_dir / "upscaled_000.mkv")]
+        segment_list = self.work_dir / "source.csv"
+        # noinspection SpellCheckingInspection
+        command = [
+            ffmpeg_path(),
+            "-loglevel", "error",
+            "-y",
+            "-i", self.source,
+            "-map", "0:v:0",
+            "-c", "copy",
+            "-f", "segment",
+            "-segment_times", ",".join(f"{t:.3f}" for t in times),
+            "-segment_list", str(segment_list),
+            "-segment_list_type", "csv",
+            "-reset_timestamps", "1",
+            str(self.work_dir / "source_%03d.mkv"),
+        ]
+        run_quiet(command, job)
+        segments = []
+        with open(segment_list, newline="", encoding="utf-8") as f:
+            for index, (name, start, end) in enumerate(csv.reader(f)):
+                segments.append(Segment(index, self.work_dir / Path(name).name, float(start), float(end),
+                                        self.work_dir / f"upscaled_{index:03d}.mkv"))
+        return segments
+
+    def segment_frames(self, segment):
+        if self.total_frames and self.duration:
+            return round(self.total_frames * segment.duration / self.duration)
+        return None
+
+    def encode_segment(self, segment, progress, segment_job, metrics=None):
+        command = build_command(segment.source, segment.output, self.settings, video_only=True, overwrite=True,
+                                threads=self.threads)
+        parser = metrics and metrics.parser(segment.index, self.segment_frames(segment), segment.duration)
+        try:
+            run_with_progress(command, duration=segment.duration, job=segment_job, parser=parser,
+                              on_progress=lambda p: progress.update(segment.index, p))
+        except JobCancelled:
+            # Finished segments stay for a resume, a cut-short one would only be encoded again.
+            segment.output.unlink(missing_ok=True)
+            raise
+        self.journal.mark_done(segment)
+
+    def encode_segments(self, segments, job=None, on_progress=None, metrics=None):
+        progress = CombinedProgress([segment.duration for segment in segments], on_progress)
+        pending = [segment for segment in segments if not self.journal.is_done(segment)]
+        if metrics is not None and self.total_frames:
+            metrics.total_frames = sum(self.segment_frames(segment) for segment in pending)
+        if len(pending) < len(segments) and self.on_message is not None:
+            self.on_message(f"Resuming, {len(segments) - len(pending)} of {len(segments)} segments already done.")
+        for segment in segments:
+            if segment not in pending:
+                progress.update(segment.index, 100)
+        scheduler = JobScheduler(max_workers=self.segments)
+        for segment in pending:
+            scheduler.submit(Job(
+                f"{self.source} [{segment.index}]",
+                lambda segment_job, s=segment: self.encode_segment(s, progress, segment_job, metrics),
+                source=str(segment.source),
+                output=str(segment.output),
+            ))
+        while not scheduler.wait(0.5):
+            if job is not None and job.cancel_requested:
+                scheduler.cancel()
+        scheduler.wait()
+        if job is not None and job.cancel_requested:
+            raise JobCancelled(job.name)
+        for segment_job in scheduler.jobs:
+            if segment_job.state != JobState.DONE:
+                raise segment_job.error or JobCancelled(segment_job.name)
+
+    def concat(self, segments, job=None):
+        concat_segments([segment.output for segment in segments], self.source, self.output, self.work_dir, job)
+
+    def run(self, job=None, on_progress=None, on_metrics=None):
+        segments = self.prepare(job)
+        metrics = on_metrics and CombinedMetrics(duration=self.duration, on_metrics=on_metrics)
+        # Hold back the last percent until the pieces are stitched together.
+        self.encode_segments(segments, job, on_progress and (lambda p: on_progress(min(p, 99.0))), metrics)
+        self.concat(segments, job)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        if metrics is not None:
+            metrics.finish()
+        if on_progress is not None:
+            on_progress(100)
@@ -0,0 +1,475 @@
+"""Headless batch runner: ``python -m anime4k encode *.mkv -o out``.
+
+Only the engine modules are imported here, never PySide6 or cv2, so the
+runner starts quickly on render nodes without a display.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, replace
+
+from anime4k.capabilities import load_capabilities
+from anime4k.command import ASPECT_POLICIES, AUTO_SHADER, CODEC_LABELS, NATIVE_POLICIES, SHADERS, codec_from_label, \
+    parse_rendition, rate_args
+from anime4k.encoder import Encoder
+from anime4k.jobdb import JobStore, batches
+from anime4k.metrics import MetricsLog
+from anime4k.presets import PRESETS, load_preset
+from anime4k.scheduler import JobScheduler, JobState
+from anime4k.tuner import ConcurrencyTuner
+
+VIDEO_EXTENSIONS = (".mkv", ".mp4")
+
+
+def expand_inputs(patterns):
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(os.path.join(pattern, name) for name in os.listdir(pattern)
+                             if name.lower().endswith(VIDEO_EXTENSIONS))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        files.extend(match for match in matches if match not in files)
+    return files
+
+
+class Reporter:
+    """Prints job events as text lines or, with ``--json``, as JSON lines."""
+
+    def __init__(self, as_json, stream=sys.stdout):
+        self.as_json = as_json
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, event, job, line, **data):
+        with self._lock:
+            if self.as_json:
+                record = {"event": event, "time": round(time.time(), 3), "job": job.id, "file": job.source}
+                record.update(data)
+                self.stream.write(json.dumps(record) + "\n")
+            else:
+                self.stream.write(f"[{os.path.basename(job.source)}] {line}\n")
+            self.stream.flush()
+
+    def state(self, job):
+        data = {"state": job.state}
+        text = job.state
+        if job.state == JobState.FAILED:
+            data["error"] = str(job.error)
+            text = f"{job.state}: {job.error}"
+        elif job.state == JobState.DONE:
+            data["output"] = job.output
+            text = f"{job.state} -> {job.output}"
+        self.emit("state", job, text, **data)
+
+    def progress(self, job, percent):
+        self.emit("progress", job, f"{percent:.1f}%", percent=percent)
+
+    def message(self, job, text):
+        self.emit("message", job, text, text=text)
+
+    def metrics(self, job, metrics):
+        if self.as_json:
+            self.emit("metrics", job, metrics.summary(), **asdict(metrics))
+
+
+def add_encode_arguments(parser):
+    parser.add_argument("--segments", type=int, default=1, help="split each file into this many parallel pieces")
+    parser.add_argument("--checkpoint", type=int, default=0, metavar="SECONDS",
+                        help="encode in resumable segments of this length")
+    parser.add_argument("--pipeline", type=int, default=0, metavar="ENCODERS",
+                        help="upscale in one ffmpeg and encode in this many at once, reports the slower stage")
+    parser.add_argument("--no-reuse", action="store_true",
+                        help="encode again even when the output folder has a matching earlier result")
+
+
+def add_settings_arguments(parser):
+    parser.add_argument("--preset", default="default",
+                        help=f"built-in preset ({', '.join(PRESETS)}) or a JSON file of settings")
+    parser.add_argument("--width", type=int)
+    parser.add_argument("--height", type=int)
+    parser.add_argument("--bitrate", dest="bit_rate")
+    parser.add_argument("--max-bitrate", dest="max_bitrate")
+    parser.add_argument("--buffer-size", dest="buffer_size")
+    parser.add_argument("--codec")
+    parser.add_argument("--shader", choices=SHADERS + [AUTO_SHADER], metavar="SHADER",
+                        help="shader file, or 'auto' to pick one per file from a quick content analysis")
+    parser.add_argument("--hdr", action=argparse.BooleanOptionalAction,
+                        help="upscale in 10-bit HDR, --no-hdr turns off HDR from a preset")
+    parser.add_argument("--quality", type=int, metavar="LEVEL",
+                        help="constant quality (x264/x265/aom CRF, nvenc CQ, amf QP) instead of --bitrate, "
+                             "--max-bitrate still caps peaks; 0 goes back to the bitrate")
+    parser.add_argument("--native", choices=NATIVE_POLICIES,
+                        help="sources already at or above the target size: scale down without a shader "
+                             "(or copy if equal), copy, re-encode, or upscale anyway")
+    parser.add_argument("--aspect", choices=ASPECT_POLICIES,
+                        help="fit the target inside --width x --height keeping the source's aspect ratio, "
+                             "take --height and the width the aspect ratio needs, or stretch to the exact size")
+    parser.add_argument("--rendition", dest="renditions", action="append", metavar="WxH:CODEC:BITRATE",
+                        help="extra output from the same upscale, e.g. 1920x1080:libx264:6M, can be repeated")
+
+
+def settings_from_args(args):
+    settings = load_preset(args.preset)
+    overrides = {name: getattr(args, name) for name in
+                 ("width", "height", "bit_rate", "max_bitrate", "buffer_size", "codec", "shader", "hdr", "quality",
+                  "native", "aspect")
+                 if getattr(args, name) is not None}
+    if args.renditions:
+        for spec in args.renditions:
+            parse_rendition(spec)
+        overrides["renditions"] = tuple(args.renditions)
+    settings = replace(settings, **overrides)
+    # Raises ValueError for a quality level the codec does not accept.
+    rate_args(settings)
+    return settings
+
+
+def resolve_settings(settings):
+    """Swap in a working codec before any job starts; unusable setups raise ``CapabilityError``."""
+    try:
+        capabilities = load_capabilities()
+    except OSError as e:
+        print(f"Could not check ffmpeg capabilities: {e}", file=sys.stderr)
+        return settings
+    settings, notes = capabilities.resolve(settings)
+    for note in notes:
+        print(note, file=sys.stderr)
+    return settings
+
+
+def encode_options(args):
+    return {"segments": args.segments, "segment_time": args.checkpoint, "pipeline": args.pipeline,
+            "reuse": not args.no_reuse}
+
+
+def run_jobs(store, stored, jobs=1, as_json=False, metrics=None):
+    """Encode queued ``StoredJob``s, one ``Encoder`` per group of equal settings, recording states in ``store``."""
+    reporter = Reporter(as_json)
+
+    def on_state_change(job):
+        store.update(job)
+        reporter.state(job)
+
+    scheduler = JobScheduler(max_workers=jobs or 1, on_state_change=on_state_change)
+    groups = batches(stored)
+    tuner = None
+    if jobs == 0:
+        tuner = ConcurrencyTuner(scheduler, [settings.codec for settings, _, _ in groups],
+                                 on_decision=lambda text: print(f"tuner: {text}", file=sys.stderr)).start()
+    for settings, options, group in groups:
+        metrics_log = MetricsLog(metrics, settings) if metrics else None
+
+        def on_metrics(job, values, metrics_log=metrics_log):
+            reporter.metrics(job, values)
+            if metrics_log is not None:
+                metrics_log.write(job, values)
+
+        encoder = Encoder(settings, on_progress=reporter.progress, on_message=reporter.message,
+                          on_metrics=on_metrics, tuner=tuner, **options)
+        group, geometries = encoder.by_geometry(group)
+        for line in geometries:
+            print(f"geometry: {line}", file=sys.stderr)
+        for record in group:
+            job = encoder.job(record.source, os.path.dirname(record.output))
+            job.record_id = record.id
+            scheduler.submit(job)
+    try:
+        while not scheduler.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        scheduler.cancel()
+        scheduler.wait()
+        return 130
+    finally:
+        if tuner is not None:
+            tuner.stop()
+    return 0 if all(job.state == JobState.DONE for job in scheduler.jobs) else 1
+
+
+def cmd_encode(args):
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("No input files matched.", file=sys.stderr)
+        return 2
+    settings = resolve_settings(settings_from_args(args))
+    os.makedirs(args.output_dir, exist_ok=True)
+    store = JobStore(args.db)
+    try:
+        stored = store.enqueue(files, args.output_dir, settings, **encode_options(args))
+        return run_jobs(store, stored, args.jobs, args.json, args.metrics)
+    finally:
+        store.close()
+
+
+def cmd_queue(args):
+    store = JobStore(args.db)
+    try:
+        if args.action == "add":
+            files = expand_inputs(args.inputs)
+            if not files:
+                print("No input files matched.", file=sys.stderr)
+                return 2
+            settings = resolve_settings(settings_from_args(args))
+            os.makedirs(args.output_dir, exist_ok=True)
+            stored = store.enqueue(files, args.output_dir, settings, **encode_options(args))
+            print(f"{len(stored)} file{'s' if len(stored) != 1 else ''} queued, "
+                  f"{store.counts().get(JobState.QUEUED, 0)} waiting in {store.path}")
+        elif args.action == "run":
+            recovered = store.recover()
+            if recovered:
+                print(f"{recovered} interrupted job{'s' if recovered > 1 else ''} queued again", file=sys.stderr)
+            stored = store.pending()
+            if not stored:
+                print("The queue is empty.", file=sys.stderr)
+                return 0
+            return run_jobs(store, stored, args.jobs, args.json, args.metrics)
+        elif args.action == "list":
+            jobs = store.history(args.limit, args.state, args.source)
+            for job in jobs:
+                if args.json:
+                    print(json.dumps({**asdict(job), "elapsed": job.elapsed}))
+                else:
+                    print(job.summary())
+            if not args.json:
+                counts = store.counts()
+                print(", ".join(f"{count} {state}" for state, count in sorted(counts.items())) or "No jobs.")
+        elif args.action == "retry":
+            print(f"{store.requeue()} failed or cancelled jobs queued again")
+        elif args.action == "clear":
+            print(f"{store.clear()} finished jobs removed from the history")
+    finally:
+        store.close()
+    return 0
+
+
+def split_list(text, choices=None):
+    items = [item.strip() for item in text.split(",") if item.strip()]
+    if choices is not None and items == ["all"]:
+        return list(choices)
+    return items
+
+
+def cmd_bench(args):
+    from anime4k.bench import benchmark, parse_size, synthetic_clip, write_report
+    from anime4k.probe import ProbeError, ProbeService
+
+    clip = args.clip or synthetic_clip(args.duration, args.clip_size)
+    try:
+        info = ProbeService().probe(clip)
+    except (ProbeError, OSError) as e:
+        print(f"Could not probe {clip}, frame totals will be missing: {e}", file=sys.stderr)
+        info = None
+    shaders = split_list(args.shaders, SHADERS)
+    codecs = split_list(args.codecs, [codec_from_label(label) for label in CODEC_LABELS])
+    sizes = [parse_size(size) for size in split_list(args.sizes)]
+    unknown = set(shaders) - set(SHADERS)
+    if unknown:
+        raise ValueError(f"Unknown shaders: {', '.join(sorted(unknown))}")
+
+    def on_result(result):
+        if result.status == "ok":
+            print(f"{result.shader:<28} {result.codec:<12} {result.width}x{result.height:<6} "
+                  f"{result.fps:>7.2f} fps  {result.wall_s:>7.1f}s wall  "
+                  f"{result.cpu_s or 0:>7.1f}s cpu  {result.peak_rss_mb or 0:>7.1f} MiB", flush=True)
+        else:
+            print(f"{result.shader:<28} {result.codec:<12} {result.width}x{result.height:<6} {result.status}",
+                  flush=True)
+
+    try:
+        results = benchmark(clip, shaders, codecs, sizes, base=settings_from_args(args),
+                            vulkan_device=args.vulkan_device, frame_count=info and info.frame_count,
+                            on_result=on_result)
+    except KeyboardInterrupt:
+        return 130
+    report = args.report or f"bench-{time.strftime('%Y%m%d-%H%M%S')}"
+    paths = write_report(results, report, info={
+        "clip": str(clip),
+        "clip_resolution": info and info.resolution,
+        "clip_frames": info and info.frame_count,
+        "vulkan_device": args.vulkan_device,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    print(f"Report written to {paths[0]} and {paths[1]}")
+    return 0 if all(result.status == "ok" for result in results) else 1
+
+
+def cmd_measure(args):
+    from anime4k.measure import format_summary, measure_files
+
+    summary, paths = measure_files(args.reference, args.upscaled, every=args.every, shards=args.shards,
+                                   vmaf=False if args.no_vmaf else None, report=args.report)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(format_summary(summary))
+        print(f"Report written to {paths[0]} and {paths[1]}")
+    return 0
+
+
+def cmd_preview(args):
+    from anime4k.metrics import format_seconds
+    from anime4k.preview import render_preview
+    from anime4k.probe import ProbeService
+
+    settings = resolve_settings(settings_from_args(args))
+    info = ProbeService().probe(args.input)
+    result = render_preview(args.input, info, settings, count=args.clips, length=args.length,
+                            work_dir=args.work_dir, on_message=print)
+    if args.json:
+        print(json.dumps({key: str(value) if key in ("source", "upscaled") else value
+                          for key, value in asdict(result).items()}, indent=2))
+    else:
+        estimate = format_seconds(result.estimate_s) if result.estimate_s else "unknown"
+        print(f"{result.fps:g} fps per clip, {result.parallel_fps:g} fps over {result.clips} clips, "
+              f"full upscale estimated at {estimate}")
+        print(f"Preview written to {result.source} and {result.upscaled}")
+    if args.view:
+        from anime4k.compare import CompareViewer
+
+        CompareViewer(str(result.source), str(result.upscaled), result.width, result.height).run()
+    return 0
+
+
+def cmd_analyse(args):
+    from anime4k.analysis import analyse, choose_shader
+    from anime4k.probe import ProbeError, ProbeService
+
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("No input files matched.", file=sys.stderr)
+        return 2
+    probe_service = ProbeService()
+    status = 0
+    for file in files:
+        try:
+            profile = analyse(file, probe_service.probe(file))
+        except (ProbeError, OSError) as e:
+            print(f"{file}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        if profile is None:
+            print(f"{file}: no frames could be decoded", file=sys.stderr)
+            status = 1
+            continue
+        choice = choose_shader(profile, args.height)
+        if args.json:
+            print(json.dumps({"file": file, "shader": choice.shader, "reason": choice.reason, **asdict(profile)}))
+        else:
+            print(f"{os.path.basename(file)}: {choice.shader} ({choice.reason}) - {profile.summary()}")
+    return status
+
+
+def cmd_caps(args):
+    capabilities = load_capabilities(refresh=args.refresh)
+    if args.json:
+        print(json.dumps(asdict(capabilities), indent=2))
+        return 0
+    print(f"ffmpeg: {capabilities.ffmpeg}")
+    print(capabilities.summary())
+    print("codecs: " + ", ".join(capabilities.codec_labels()))
+    for problem in capabilities.problems(settings_from_args(args)):
+        print(f"warning: {problem}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pyanime4k", description="Headless Anime4K batch upscaler.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    encode = commands.add_parser("encode", help="upscale files or globs into an output directory")
+    encode.add_argument("inputs", nargs="+", help="video files, globs or directories")
+    encode.add_argument("-o", "--output-dir", required=True)
+    encode.add_argument("-j", "--jobs", type=int, default=1,
+                        help="files encoded at the same time, 0 tunes it from CPU, memory and fps")
+    add_encode_arguments(encode)
+    encode.add_argument("--json", action="store_true", help="print progress and metrics as JSON lines")
+    encode.add_argument("--metrics", metavar="FILE", help="append per-job fps, speed and ETA samples as JSON lines")
+    encode.add_argument("--db", metavar="PATH", help="job queue database, default queue.db in the cache folder")
+    add_settings_arguments(encode)
+    encode.set_defaults(func=cmd_encode)
+
+    queue = commands.add_parser("queue", help="persistent job queue: add files now, run or resume them later")
+    queue.add_argument("--db", metavar="PATH", help="job queue database, default queue.db in the cache folder")
+    actions = queue.add_subparsers(dest="action", required=True)
+    add = actions.add_parser("add", help="queue files, globs or directories")
+    add.add_argument("inputs", nargs="+", help="video files, globs or directories")
+    add.add_argument("-o", "--output-dir", required=True)
+    add_encode_arguments(add)
+    add_settings_arguments(add)
+    run = actions.add_parser("run", help="encode everything queued, including jobs interrupted by a crash")
+    run.add_argument("-j", "--jobs", type=int, default=1,
+                     help="files encoded at the same time, 0 tunes it from CPU, memory and fps")
+    run.add_argument("--json", action="store_true", help="print progress and metrics as JSON lines")
+    run.add_argument("--metrics", metavar="FILE", help="append per-job fps, speed and ETA samples as JSON lines")
+    history = actions.add_parser("list", help="newest jobs first with state, time taken and error")
+    history.add_argument("--state", choices=(JobState.QUEUED, JobState.RUNNING, *JobState.FINISHED))
+    history.add_argument("--source", help="only this source file or the files in this folder")
+    history.add_argument("--limit", type=int, default=50)
+    history.add_argument("--json", action="store_true", help="print one JSON object per job")
+    actions.add_parser("retry", help="queue failed and cancelled jobs again")
+    actions.add_parser("clear", help="remove finished jobs from the history")
+    queue.set_defaults(func=cmd_queue)
+
+    bench = commands.add_parser("bench", help="measure upscale throughput for shaders x codecs x sizes")
+    bench.add_argument("--clip", help="video to upscale, default is a generated testsrc2 clip")
+    bench.add_argument("--duration", type=int, default=5, help="length of the generated clip in seconds")
+    bench.add_argument("--clip-size", default="1280x720", help="resolution of the generated clip")
+    bench.add_argument("--shaders", default=SHADERS[0], help="comma separated shader files or 'all'")
+    bench.add_argument("--codecs", default="libx264", help="comma separated encoders or 'all'")
+    bench.add_argument("--sizes", default="1920x1080,3840x2160", help="comma separated WIDTHxHEIGHT targets")
+    bench.add_argument("--vulkan-device", help="Vulkan device index or name, e.g. llvmpipe for lavapipe")
+    bench.add_argument("--report", metavar="PATH", help="report base name, .csv and .json are added")
+    add_settings_arguments(bench)
+    bench.set_defaults(func=cmd_bench)
+
+    measure = commands.add_parser("measure", help="PSNR, SSIM and VMAF of an upscale against its source")
+    measure.add_argument("reference", help="the source video")
+    measure.add_argument("upscaled", help="the upscaled video")
+    measure.add_argument("--every", type=int, default=1,
+                         help="compare every Nth frame only, VMAF motion scores are approximate then")
+    measure.add_argument("--shards", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                         help="time ranges measured in parallel")
+    measure.add_argument("--no-vmaf", action="store_true", help="skip VMAF even if ffmpeg has libvmaf")
+    measure.add_argument("--report", metavar="PATH",
+                         help="report base name, default <upscaled>-quality next to the upscaled file")
+    measure.add_argument("--json", action="store_true", help="print the summary as JSON")
+    measure.set_defaults(func=cmd_measure)
+
+    preview = commands.add_parser("preview", help="upscale a few short clips of a file to check settings and speed")
+    preview.add_argument("input", help="the video to sample")
+    preview.add_argument("--clips", type=int, default=5, help="number of clips spread over the video")
+    preview.add_argument("--length", type=float, default=3.0, help="length of each clip in seconds")
+    preview.add_argument("--work-dir", metavar="DIR", help="where clips are written, default is the cache folder")
+    preview.add_argument("--view", action="store_true", help="open the result in the compare viewer")
+    preview.add_argument("--json", action="store_true", help="print the result as JSON")
+    add_settings_arguments(preview)
+    preview.set_defaults(func=cmd_preview)
+
+    analyse_files = commands.add_parser("analyse", help="show the shader --shader auto would pick for each file")
+    analyse_files.add_argument("inputs", nargs="+", help="video files, globs or directories")
+    analyse_files.add_argument("--height", type=int, default=2160, help="output height the pick is made for")
+    analyse_files.add_argument("--json", action="store_true", help="print one JSON object per file")
+    analyse_files.set_defaults(func=cmd_analyse)
+
+    caps = commands.add_parser("caps", help="show which encoders, filters and devices this ffmpeg supports")
+    caps.add_argument("--refresh", action="store_true", help="detect again instead of using the cache")
+    caps.add_argument("--json", action="store_true", help="print the full capability record")
+    add_settings_arguments(caps)
+    caps.set_defaults(func=cmd_caps)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
@@ -0,0 +1,305 @@
+"""ffmpeg command lines for libplacebo upscaling, shared by every encode mode."""
+import re
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+from anime4k.tools import SHADER_DIR, ffmpeg_path
+
+
+# noinspection SpellCheckingInspection
+CODEC_LABELS = [
+    "hevc_amf (AMD)",
+    "hevc_nvenc (Nvidia)",
+    "h264_amf (AMD)",
+    "h264_nvenc (Nvidia)",
+    "av1_amf (AMD)",
+    "av1_nvenc (Nvidia)",
+    "libx265 (CPU)",
+    "libx264 (CPU)",
+    "libaom-av1 (CPU)",
+]
+
+# noinspection SpellCheckingInspection
+SHADERS = [
+    "Anime4K_ModeA.glsl",
+    "Anime4K_ModeA+A+UL.glsl",
+    "Anime4k_ModeB.glsl",
+    "Anime4K_ModeB+B.glsl",
+    "Anime4K_ModeC.glsl",
+    "Anime4K_ModeC+A.glsl",
+    "Anime4k-ModeA-UL.glsl",
+    "Anime4K_ModeA+FSR.glsl",
+    "FSRCNNX_x2_16-0-4-1.glsl",
+]
+# Shader setting that lets anime4k.analysis pick one of SHADERS per file
+AUTO_SHADER = "auto"
+
+# What happens to a source already at or above the target size, see native_plan
+NATIVE_POLICIES = ("scale", "copy", "encode", "upscale")
+
+# How a source's aspect ratio maps onto the target size, see fitted_size
+ASPECT_POLICIES = ("keep", "height", "stretch")
+# Sources this close to the target's aspect ratio (e.g. 1920x1088) still get the exact target size
+ASPECT_TOLERANCE = 0.01
+
+
+def codec_from_label(label):
+    """Encoder name for a codec combo entry such as ``"hevc_nvenc (Nvidia)"``."""
+    return label.split(" ", 1)[0] if label else "libx264"
+
+
+@dataclass
+class EncodeSettings:
+    width: int = 3840
+    height: int = 2160
+    bit_rate: str = "10M"
+    max_bitrate: str = "20M"
+    buffer_size: str = "40M"
+    codec: str = "libx264"
+    shader: str = "Anime4K_ModeA.glsl"
+    hdr: bool = False
+    # Constant quality level (CRF, CQ or QP of the codec), 0 encodes at bit_rate instead
+    quality: int = 0
+    # One of NATIVE_POLICIES
+    native: str = "scale"
+    # Extra outputs encoded from the same upscale, as parse_rendition specs
+    renditions: tuple = ()
+    # One of ASPECT_POLICIES
+    aspect: str = "keep"
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """An extra output of a job, e.g. a 1080p H.264 copy next to a 4K HEVC master."""
+    width: int
+    height: int
+    codec: str
+    bit_rate: str
+    max_bitrate: str
+    buffer_size: str
+
+    def __str__(self):
+        return f"{self.width}x{self.height}:{self.codec}:{self.bit_rate}:{self.max_bitrate}:{self.buffer_size}"
+
+
+def _scale_rate(rate, factor):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmM]?)", rate)
+    if match is None:
+        raise ValueError(f"Invalid bitrate {rate!r}")
+    return f"{float(match.group(1)) * factor:g}{match.group(2)}"
+
+
+def parse_rendition(spec):
+    """``WIDTHxHEIGHT:CODEC:BITRATE[:MAXRATE[:BUFSIZE]]``, e.g. ``1920x1080:libx264:6M``.
+
+    Max rate and buffer size default to twice and four times the bitrate, like the built-in presets."""
+    parts = spec.strip().split(":")
+    size = re.fullmatch(r"(\d+)x(\d+)", parts[0])
+    if size is None or not 3 <= len(parts) <= 5:
+        raise ValueError(f"Invalid rendition {spec!r}, expected WIDTHxHEIGHT:CODEC:BITRATE[:MAXRATE[:BUFSIZE]]")
+    bit_rate = parts[2]
+    max_bitrate = parts[3] if len(parts) > 3 else _scale_rate(bit_rate, 2)
+    buffer_size = parts[4] if len(parts) > 4 else _scale_rate(bit_rate, 4)
+    return Rendition(int(size.group(1)), int(size.group(2)), parts[1], bit_rate, max_bitrate, buffer_size)
+
+
+def rendition_settings(settings, rendition):
+    return replace(settings, width=rendition.width, height=rendition.height, codec=rendition.codec,
+                   bit_rate=rendition.bit_rate, max_bitrate=rendition.max_bitrate,
+                   buffer_size=rendition.buffer_size, renditions=())
+
+
+def display_aspect(info):
+    """Width over height of the picture as it is shown, with the source's sample aspect ratio applied."""
+    sar = re.fullmatch(r"(\d+):(\d+)", info.sample_aspect_ratio or "")
+    if sar is None or not int(sar.group(1)) or not int(sar.group(2)):
+        return info.width / info.height
+    return info.width * int(sar.group(1)) / (info.height * int(sar.group(2)))
+
+
+def _even(value):
+    return max(2, 2 * round(value / 2))
+
+
+def fitted_size(info, width, height, aspect="keep"):
+    """Output size for a source (probed as ``info``) and a ``width`` x ``height`` target.
+
+    ``keep`` fits the picture inside the target with its display aspect
+    ratio, so a 4:3 source gets 2880x2160 rather than 3840x2160.
+    ``height`` takes the target height and the width the aspect ratio
+    needs, even when that is wider than the target. ``stretch`` always
+    returns the target. Sizes are even, as 4:2:0 encoders require."""
+    if aspect not in ASPECT_POLICIES:
+        raise ValueError(f"Unknown aspect policy {aspect!r}, use one of {', '.join(ASPECT_POLICIES)}")
+    if aspect == "stretch" or not info.width or not info.height:
+        return width, height
+    ratio = display_aspect(info)
+    target = width / height
+    if aspect == "keep" and abs(ratio / target - 1) < ASPECT_TOLERANCE:
+        return width, height
+    if aspect == "keep" and ratio > target:
+        return width, _even(width / ratio)
+    return _even(height * ratio), height
+
+
+def fit_settings(info, settings):
+    """``settings`` with the target size and every rendition's size fitted to the source, see ``fitted_size``."""
+    width, height = fitted_size(info, settings.width, settings.height, settings.aspect)
+    renditions = []
+    for spec in settings.renditions:
+        rendition = parse_rendition(spec)
+        size = fitted_size(info, rendition.width, rendition.height, settings.aspect)
+        if size != (rendition.width, rendition.height):
+            spec = str(replace(rendition, width=size[0], height=size[1]))
+        renditions.append(spec)
+    return replace(settings, width=width, height=height, renditions=tuple(renditions))
+
+
+def output_path(source, output_dir):
+    return Path(output_dir) / f"{Path(source).stem}-upscaled.mkv"
+
+
+def rendition_output(output, rendition):
+    """``name-upscaled.mkv`` becomes ``name-upscaled-1920x1080-libx264.mkv``."""
+    output = Path(output)
+    return output.with_name(f"{output.stem}-{rendition.width}x{rendition.height}-{rendition.codec}{output.suffix}")
+
+
+def filter_path(path):
+    """Quote ``path`` for use as a filter option value (Windows drive colons included)."""
+    return "'" + Path(path).as_posix().replace(":", "\\:") + "'"
+
+
+def video_filter(settings):
+    shader_path = filter_path(SHADER_DIR / settings.shader)
+    libplacebo = (f"libplacebo=w={settings.width}:h={settings.height}:upscaler=ewa_lanczos:"
+                  f"custom_shader_path={shader_path}")
+    if settings.hdr:
+        return f"format=p010le,{libplacebo}"
+    return f"format=yuv420p,hwupload,{libplacebo}"
+
+
+def highest_quality(codec):
+    """Largest quality level ``codec`` accepts; levels start at 1."""
+    return 63 if codec == "libaom-av1" else 51
+
+
+def quality_args(codec, quality, max_bitrate, buffer_size):
+    """Constant quality options for ``codec``; the max bitrate still caps peaks where the encoder supports it."""
+    highest = highest_quality(codec)
+    if not 1 <= quality <= highest:
+        raise ValueError(f"Quality {quality} is out of range for {codec}, use 1 to {highest}")
+    level = str(quality)
+    cap = ["-maxrate", str(max_bitrate), "-bufsize", str(buffer_size)]
+    # noinspection SpellCheckingInspection
+    if codec in ("libx264", "libx265"):
+        return ["-crf", level] + cap
+    if codec == "libaom-av1":
+        return ["-crf", level, "-b:v", "0"]
+    if codec.endswith("_nvenc"):
+        return ["-rc", "vbr", "-cq", level, "-b:v", "0"] + cap
+    if codec.endswith("_amf"):
+        args = ["-rc", "cqp", "-qp_i", level, "-qp_p", level]
+        return args + ["-qp_b", level] if codec == "h264_amf" else args
+    return ["-global_quality", level]
+
+
+def rate_args(settings):
+    if settings.quality:
+        rate = quality_args(settings.codec, settings.quality, settings.max_bitrate, settings.buffer_size)
+    else:
+        rate = ["-b:v", str(settings.bit_rate), "-maxrate", str(settings.max_bitrate),
+                "-bufsize", str(settings.buffer_size)]
+    return rate + ["-c:v", str(settings.codec)]
+
+
+def rate_summary(settings):
+    """How the rate is chosen, e.g. ``CRF 20 capped at 20M`` or ``10M, max 20M``."""
+    if not settings.quality:
+        return f"{settings.bit_rate}, max {settings.max_bitrate}"
+    # noinspection SpellCheckingInspection
+    if settings.codec in ("libx264", "libx265"):
+        return f"CRF {settings.quality} capped at {settings.max_bitrate}"
+    if settings.codec == "libaom-av1":
+        return f"CRF {settings.quality}"
+    if settings.codec.endswith("_nvenc"):
+        return f"CQ {settings.quality} capped at {settings.max_bitrate}"
+    return f"QP {settings.quality}"
+
+
+def thread_args(codec, threads):
+    """Limit a CPU encoder to ``threads`` threads; hardware encoders and None are left alone."""
+    if not threads:
+        return []
+    # noinspection SpellCheckingInspection
+    if codec == "libx265":
+        return ["-x265-params", f"pools={threads}"]
+    if codec in ("libx264", "libaom-av1"):
+        return ["-threads", str(threads)]
+    return []
+
+
+def build_command(source, output, settings, video_only=False, overwrite=False, vulkan_device=None, threads=None):
+    """Upscale ``source`` into ``output``.
+
+    With ``video_only`` only the first video stream is written, which is
+    what segment encodes need before their outputs are concatenated.
+    ``vulkan_device`` picks a Vulkan device by index or name (e.g. ``llvmpipe``).
+    ``threads`` caps a CPU encoder's threads, see ``thread_args``."""
+    # noinspection SpellCheckingInspection
+    command = [
+        ffmpeg_path(),
+        "-loglevel", "info",
+    ]
+    if overwrite:
+        command.append("-y")
+    command += ["-i", str(source)]
+    if video_only:
+        command += ["-map", "0:v:0"]
+    else:
+        command += ["-map", "0:v", "-map", "0:s?", "-map", "0:a?"]
+    if not settings.hdr:
+        command += ["-init_hw_device", f"vulkan:{vulkan_device}" if vulkan_device else "vulkan"]
+    command += ["-vf", video_filter(settings)]
+    if not video_only:
+        command += ["-c:s", "copy", "-c:a", "copy", "-c:d", "copy"]
+    command += rate_args(settings) + thread_args(settings.codec, threads)
+    if settings.hdr:
+        command += ["-map_metadata", "0"]
+    command.append(str(output))
+    return command
+
+
+def native_plan(info, settings):
+    """What to do with a source (probed as ``info``) that needs no upscale, or None to upscale it.
+
+    A source at least as wide and as tall as the target is stream copied
+    (``"copy"``), scaled down without a shader (``"scale"``) or re-encoded
+    at its own size (``"encode"``). The ``scale`` policy copies sources that
+    already match the target exactly, and ``upscale`` always runs the shader."""
+    if settings.native not in NATIVE_POLICIES:
+        raise ValueError(f"Unknown policy {settings.native!r} for sources at the target size, "
+                         f"use one of {', '.join(NATIVE_POLICIES)}")
+    if settings.native == "upscale" or not info.width or not info.height:
+        return None
+    if info.width < settings.width or info.height < settings.height:
+        return None
+    if settings.native == "scale" and (info.width, info.height) == (settings.width, settings.height):
+        return "copy"
+    return settings.native
+
+
+def native_command(source, output, settings, plan, threads=None):
+    """Write ``source`` to ``output`` without a shader pass, following a ``native_plan``."""
+    # noinspection SpellCheckingInspection
+    command = [ffmpeg_path(), "-loglevel", "info", "-i", str(source), "-map", "0:v", "-map", "0:s?", "-map", "0:a?"]
+    if plan == "copy":
+        return command + ["-c", "copy", str(output)]
+    if plan == "scale":
+        command += ["-vf", f"scale={settings.width}:{settings.height}:flags=bicubic"]
+    command += ["-c:s", "copy", "-c:a", "copy", "-c:d", "copy"]
+    command += rate_args(settings) + thread_args(settings.codec, threads)
+    if settings.hdr:
+        command += ["-map_metadata", "0"]
+    command.append(str(output))
+    return command
@@ -0,0 +1,384 @@
+"""Side-by-side compare window: the left part of one video, the right part of another.
+
+Frames are composited into one preallocated canvas. Only the columns that
+end up on screen are resized, and frames that already have the display
+size are copied without resizing. Playback is paced by the first video's
+timestamps instead of a fixed frame rate.
+
+Each video is decoded ahead on its own thread into a bounded queue, and
+the two streams are paired by timestamp rather than by read order, so a
+heavy GOP in one file does not stall the other or the display.
+
+Both videos seek together from the timeline trackbar or the keyboard:
+
+    space       pause / play
+    , .         one frame back / forward
+    j l or <- ->  10 seconds back / forward
+    g 1 2 3 0 Enter  go to 12:30 (digits are read as [[h]m]mss, ":" also works)
+    Esc         close
+
+A seek starts decoding at the nearest keyframe before the target, taken
+from a per-file keyframe index that is cached on disk.
+"""
+import math
+import os
+import queue
+import threading
+import time
+
+from anime4k.keyframes import load_keyframes
+
+WINDOW_NAME = "Video Comparison"
+# waitKeyEx codes of the arrow keys on Windows, GTK and Cocoa builds of OpenCV
+LEFT_KEYS = (2424832, 65361, 63234)
+RIGHT_KEYS = (2555904, 65363, 63235)
+SEEK_STEP = 10
+
+
+class SplitCompositor:
+    def __init__(self, width, height):
+        import cv2
+        import numpy as np
+
+        self.cv2 = cv2
+        self.width = width
+        self.height = height
+        self.canvas = np.zeros((height, width, 3), np.uint8)
+        # One scratch canvas per side, only needed when a frame has to be resized.
+        self.scratch = [np.empty_like(self.canvas), np.empty_like(self.canvas)]
+
+    def _draw(self, side, frame, x0, x1):
+        """Paint display columns ``x0:x1`` of the canvas from the matching columns of ``frame``."""
+        if x1 <= x0:
+            return
+        source_height, source_width = frame.shape[:2]
+        if (source_width, source_height) == (self.width, self.height):
+            self.canvas[:, x0:x1] = frame[:, x0:x1]
+            return
+        # Widen the span to display columns that start on whole source pixels, so resizing just
+        # that span samples exactly like resizing the whole frame would.
+        step = self.width // math.gcd(self.width, source_width)
+        start = x0 // step * step
+        end = min(self.width, -(-x1 // step) * step)
+        s0 = start * source_width // self.width
+        s1 = end * source_width // self.width
+        scratch = self.scratch[side][:, start:end]
+        resized = self.cv2.resize(frame[:, s0:s1], (end - start, self.height), dst=scratch,
+                                  interpolation=self.cv2.INTER_LINEAR)
+        if resized is not scratch:
+            # OpenCV could not write through the view and returned a new array instead.
+            scratch = resized
+        self.canvas[:, x0:x1] = scratch[:, x0 - start:x1 - start]
+
+    def compose(self, left, right, split):
+        split = max(0, min(split, self.width))
+        self._draw(0, left, 0, split)
+        self._draw(1, right, split, self.width)
+        self.cv2.line(self.canvas, (split, 0), (split, self.height), (0, 255, 0), 2)
+        return self.canvas
+
+
+class FrameClock:
+    """Turns frame timestamps into waitKey delays so playback runs in real time."""
+
+    def __init__(self, max_lag=0.25):
+        self.max_lag = max_lag
+        self.origin = None
+
+    def reset(self):
+        self.origin = None
+
+    def delay_ms(self, pts):
+        now = time.monotonic()
+        if self.origin is None or now - (self.origin + pts) > self.max_lag:
+            # Start, resume after pause, or too far behind: re-anchor instead of rushing to catch up.
+            self.origin = now - pts
+        return max(1, int((self.origin + pts - now) * 1000))
+
+
+def frame_time(capture, index, fps):
+    """Timestamp in seconds of the frame ``capture`` returned last."""
+    import cv2
+
+    msec = capture.get(cv2.CAP_PROP_POS_MSEC)
+    if msec > 0 or index == 0:
+        return msec / 1000
+    return index / fps
+
+
+class FrameReader:
+    """Decodes one video on its own thread into a bounded queue of ``(timestamp, frame)``.
+
+    Frames are decoded into a small ring of reused arrays. The ring is a few
+    slots longer than the queue and only advances for frames that were queued;
+    the slot of the frame the viewer last received is skipped, so it is never
+    overwritten while on screen. A ``seek`` bumps a generation counter, so
+    frames decoded before it are dropped instead of shown."""
+
+    def __init__(self, capture, path, depth=8):
+        import cv2
+
+        self.cv2 = cv2
+        self.capture = capture
+        self.path = path
+        self.fps = capture.get(cv2.CAP_PROP_FPS) or 24
+        self.duration = capture.get(cv2.CAP_PROP_FRAME_COUNT) / self.fps
+        self.queue = queue.Queue(depth)
+        self.buffers = [None] * (depth + 3)
+        self.keyframes = None
+        self.generation = 0
+        self._ended = None
+        self._held = None
+        self._seek_to = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        threading.Thread(target=self._load_keyframes, daemon=True).start()
+        return self
+
+    def _load_keyframes(self):
+        try:
+            self.keyframes = load_keyframes(self.path)
+        except Exception:  # without an index OpenCV still seeks, just slower
+            self.keyframes = None
+
+    def _run(self):
+        count = index = 0
+        at_end = False
+        while not self.stopped.is_set():
+            with self._lock:
+                generation, target, self._seek_to = self.generation, self._seek_to, None
+            slot = count % len(self.buffers)
+            if slot == self._held:
+                # Only possible after a seek drained the queue: the viewer still shows this slot.
+                count += 1
+                slot = count % len(self.buffers)
+            buffer = self.buffers[slot]
+            if target is not None:
+                pts, frame = self._seek(target, buffer)
+                at_end = frame is None
+                index = round(pts * self.fps) if pts is not None else 0
+            elif at_end:
+                self._wake.wait(0.1)
+                self._wake.clear()
+                continue
+            else:
+                ok, frame = self.capture.read(buffer)
+                at_end = not ok
+                pts = frame_time(self.capture, index, self.fps) if ok else None
+            if at_end:
+                self._put(generation, (generation, None, None, None))
+                continue
+            self.buffers[slot] = frame
+            # A frame dropped by a seek leaves its slot free for the next one.
+            if self._put(generation, (generation, pts, frame, slot)):
+                count += 1
+                index += 1
+
+    def _seek(self, target, buffer):
+        """Position the capture on the frame shown at ``target`` seconds and return it."""
+        cv2 = self.cv2
+        start = self.keyframes.before(target) if self.keyframes is not None else target
+        self.capture.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+        while self.capture.grab():
+            # grab() decodes without the colour conversion, so stepping from the keyframe is cheap.
+            pts = self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if pts >= target - 0.5 / self.fps:
+                ok, frame = self.capture.retrieve(buffer)
+                return pts, frame if ok else None
+        return None, None
+
+    def _put(self, generation, item):
+        """Queue ``item`` unless a seek or stop overtakes it; True when it was queued."""
+        while not self.stopped.is_set() and generation == self.generation:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def seek(self, seconds):
+        with self._lock:
+            self.generation += 1
+            self._seek_to = max(0.0, min(seconds, self.duration))
+        # Drop queued frames so a producer blocked on a full queue notices the seek.
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self._wake.set()
+
+    def get(self):
+        """Next ``(timestamp, frame)``, or None at the end of the video."""
+        while self._ended != self.generation:
+            generation, pts, frame, slot = self.queue.get()
+            if generation != self.generation:
+                continue
+            if frame is None:
+                self._ended = generation
+                break
+            self._held = slot
+            return pts, frame
+        return None
+
+    def stop(self):
+        self.stopped.set()
+        self._wake.set()
+        self.thread.join()
+
+
+def next_pair(first, second, tolerance):
+    """Next frames of both readers whose timestamps are within ``tolerance`` seconds.
+
+    Frames of the stream that is behind are skipped until the two line up;
+    None when either video has ended."""
+    a, b = first.get(), second.get()
+    while a is not None and b is not None and abs(a[0] - b[0]) > tolerance:
+        if a[0] < b[0]:
+            a = first.get()
+        else:
+            b = second.get()
+    if a is None or b is None:
+        return None
+    return a, b
+
+
+def parse_timestamp(text):
+    """Seconds for ``"12:30"``, ``"1:02:03"`` or bare digits read as ``[[h]m]mss``."""
+    if ":" not in text:
+        text = text.zfill(6)
+        text = f"{text[:-4]}:{text[-4:-2]}:{text[-2:]}"
+    seconds = 0.0
+    for part in text.split(":"):
+        seconds = seconds * 60 + float(part or 0)
+    return seconds
+
+
+class CompareViewer:
+    def __init__(self, first, second, width, height):
+        self.paths = (first, second)
+        self.width = width
+        self.height = height
+        self.split = width // 2
+        self.paused = False
+        self.position = 0.0
+        self.readers = []
+        self._timeline_value = 0
+
+    def run(self):
+        import cv2
+
+        captures = [cv2.VideoCapture(path) for path in self.paths]
+        try:
+            for capture, path in zip(captures, self.paths):
+                if not capture.isOpened():
+                    raise RuntimeError(f"Could not open {path}")
+            self._loop(cv2, *captures)
+        finally:
+            for capture in captures:
+                capture.release()
+            cv2.destroyAllWindows()
+
+    def seek(self, seconds):
+        for reader in self.readers:
+            reader.seek(seconds)
+
+    def _loop(self, cv2, cap1, cap2):
+        compositor = SplitCompositor(self.width, self.height)
+        clock = FrameClock()
+        self.readers = [FrameReader(cap, path).start() for cap, path in zip((cap1, cap2), self.paths)]
+        fps = min(reader.fps for reader in self.readers)
+        tolerance = 0.5 / fps
+        duration = min(reader.duration for reader in self.readers)
+        frame1 = frame2 = None
+        typed = None
+        step = False
+
+        def update_split(value):
+            self.split = value
+            if self.paused and frame1 is not None:
+                compositor.compose(frame1, frame2, self.split)
+
+        def update_timeline(value):
+            nonlocal step
+            # setTrackbarPos during playback calls this too; only a moved slider is a seek.
+            if value != self._timeline_value:
+                self._timeline_value = value
+                self.seek(value)
+                step = True
+                clock.reset()
+
+        cv2.namedWindow(WINDOW_NAME)
+        cv2.setNumThreads(os.cpu_count())
+        cv2.createTrackbar("Split", WINDOW_NAME, self.split, self.width, update_split)
+        cv2.createTrackbar("Seconds", WINDOW_NAME, 0, max(1, int(duration)), update_timeline)
+
+        try:
+            while True:
+                delay = 30
+                if not self.paused or step:
+                    pair = next_pair(*self.readers, tolerance)
+                    step = False
+                    if pair is None:
+                        # Stay open at the end so the timeline can still be used.
+                        self.paused = True
+                    else:
+                        (self.position, frame1), (_, frame2) = pair
+                        compositor.compose(frame1, frame2, self.split)
+                        if not self.paused:
+                            delay = clock.delay_ms(self.position)
+                        if int(self.position) != self._timeline_value:
+                            self._timeline_value = int(self.position)
+                            cv2.setTrackbarPos("Seconds", WINDOW_NAME, self._timeline_value)
+
+                cv2.imshow(WINDOW_NAME, compositor.canvas)
+                key = cv2.waitKeyEx(delay)
+                if key == 27 or cv2.getWindowProperty(WINDOW_NAME, cv2.WND_PROP_VISIBLE) < 1:
+                    break
+                if key == -1:
+                    continue
+                char = chr(key & 0xFF)
+                if typed is not None:
+                    if char in "0123456789:":
+                        typed += char
+                    elif char in "\r\n":
+                        if typed:
+                            self.seek(parse_timestamp(typed))
+                            step = True
+                            clock.reset()
+                        typed = None
+                    elif char == "\b":
+                        typed = typed[:-1]
+                    else:
+                        typed = None
+                    title = WINDOW_NAME if typed is None else f"{WINDOW_NAME} - go to {typed}_"
+                    cv2.setWindowTitle(WINDOW_NAME, title)
+                    continue
+                if char == " ":
+                    self.paused = not self.paused
+                    clock.reset()
+                elif char == "g":
+                    typed = ""
+                    cv2.setWindowTitle(WINDOW_NAME, f"{WINDOW_NAME} - go to _")
+                elif char == ".":
+                    self.paused = step = True
+                elif char == ",":
+                    self.paused = step = True
+                    self.seek(self.position - 1 / fps)
+                elif char == "j" or key in LEFT_KEYS:
+                    self.seek(self.position - SEEK_STEP)
+                    step = True
+                    clock.reset()
+                elif char == "l" or key in RIGHT_KEYS:
+                    self.seek(self.position + SEEK_STEP)
+                    step = True
+                    clock.reset()
+        finally:
+            for reader in self.readers:
+                reader.stop()
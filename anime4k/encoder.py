@@ -0,0 +1,213 @@
+"""Run upscale jobs: probe, pick plain, segmented, pipelined or multi-output encoding, report progress."""
+import os
+import threading
+
+from anime4k.analysis import resolve_shader
+from anime4k.chunked import ChunkedEncode
+from anime4k.command import AUTO_SHADER, build_command, fit_settings, native_command, native_plan, output_path, \
+    rate_summary
+from anime4k.metrics import ProgressParser
+from anime4k.pipeline import PipelineEncode
+from anime4k.probe import ProbeService
+from anime4k.renditions import RenditionEncode, rendition_outputs, targets
+from anime4k.reuse import OutputIndex, job_key
+from anime4k.runner import run_with_progress
+from anime4k.scheduler import Job, JobCancelled
+
+
+class Encoder:
+    """Turns source files into scheduler jobs that upscale them with one set of settings.
+
+    ``on_progress(job, percent)``, ``on_message(job, text)`` and
+    ``on_metrics(job, EncodeMetrics)`` are called from the worker threads.
+
+    With ``reuse`` a job whose source and settings already have an intact
+    output in the output folder's index is finished without encoding.
+    ``pipeline`` > 0 upscales in one process and encodes in that many
+    processes at once (see ``anime4k.pipeline``). Settings with
+    ``renditions`` encode all outputs in one process from a single shader
+    pass (see ``anime4k.renditions``). The target size is fitted to every
+    source's aspect ratio as the settings' ``aspect`` policy says, and
+    ``by_geometry`` orders a batch so files of the same geometry run back
+    to back. An ``auto`` shader is picked per file by ``anime4k.analysis``.
+    Sources already at the target size skip the shader as their
+    ``native_plan`` says. A ``ConcurrencyTuner`` as
+    ``tuner`` is fed every job's metrics and sizes encoder threads."""
+
+    def __init__(self, settings, probe_service=None, segments=1, segment_time=0, on_progress=None,
+                 on_message=None, on_metrics=None, reuse=True, pipeline=0,
+                 tuner=None):
+        self.settings = settings
+        self.probe_service = probe_service or ProbeService()
+        self.segments = segments
+        self.segment_time = segment_time
+        self.on_progress = on_progress
+        self.on_message = on_message
+        self.on_metrics = on_metrics
+        self.reuse = reuse
+        self.pipeline = pipeline
+        self.tuner = tuner
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def job(self, source, output_dir):
+        return Job(source, self.encode, source=source, output=str(output_path(source, output_dir)))
+
+    def message(self, job, text):
+        if self.on_message is not None:
+            self.on_message(job, text)
+
+    def progress(self, job, percent):
+        if self.on_progress is not None:
+            self.on_progress(job, percent)
+
+    def metrics(self, job, metrics):
+        if self.tuner is not None:
+            self.tuner.record(job, metrics)
+        if self.on_metrics is not None:
+            self.on_metrics(job, metrics)
+
+    def media_info(self, job):
+        info = self.probe_service.cached(job.source)
+        if info is None:
+            # noinspection SpellCheckingInspection
+            self.message(job, "Calculating Video Duration With FFprobe...")
+            info = self.probe_service.probe(job.source)
+        self.message(job, f"Video Duration is {info.duration} Seconds.")
+        return info
+
+    def job_settings(self, job):
+        """The settings of one job: the target fitted to its source, and an ``auto`` shader replaced by the
+        one its content needs."""
+        info = self.probe_service.cached(job.source) or self.probe_service.probe(job.source)
+        settings = fit_settings(info, self.settings)
+        if (settings.width, settings.height) != (self.settings.width, self.settings.height):
+            self.message(job, f"Target {settings.width}x{settings.height} keeps the aspect ratio of the "
+                              f"{geometry(info)} source.")
+        if settings.shader != AUTO_SHADER or self.native_plan(info, settings) is not None:
+            return settings
+        settings, choice = resolve_shader(job.source, info, settings)
+        profile = f" - {choice.profile.summary()}" if choice.profile is not None else ""
+        self.message(job, f"Shader: {choice.shader}, {choice.reason}{profile}")
+        return settings
+
+    def by_geometry(self, records):
+        """Queued ``records`` reordered so files with the same source geometry run one after another.
+
+        Consecutive jobs then share their target size, filter graph and
+        encoder settings. Groups keep the order of their first file; files
+        that cannot be probed come last and fail when they run. Returns the
+        records and a summary line per group."""
+        results = self.probe_service.probe_many([record.source for record in records])
+        groups = {}
+        for record in records:
+            info = results[record.source]
+            key = None if isinstance(info, Exception) else (info.width, info.height, info.sample_aspect_ratio)
+            groups.setdefault(key, (info, []))[1].append(record)
+        ordered, lines = [], []
+        for key, (info, group) in sorted(groups.items(), key=lambda item: item[0] is None):
+            ordered += group
+            files = f"{len(group)} file{'s' if len(group) > 1 else ''}"
+            if key is None:
+                lines.append(f"{files} could not be probed")
+            else:
+                settings = fit_settings(info, self.settings)
+                lines.append(f"{files} at {geometry(info)} -> {settings.width}x{settings.height}")
+        return ordered, lines
+
+    def output_index(self, job):
+        output_dir = os.path.dirname(os.path.abspath(job.output))
+        with self._lock:
+            if output_dir not in self._indexes:
+                self._indexes[output_dir] = OutputIndex(output_dir)
+            return self._indexes[output_dir]
+
+    def encode(self, job):
+        key = None
+        settings = job.settings = self.job_settings(job)
+        outputs = rendition_outputs(job.output, settings)
+        if self.reuse:
+            key = job_key(job.source, settings)
+            index = self.output_index(job)
+            # Only the main output is indexed, so renditions are reused only while they are all still there.
+            if all(os.path.exists(path) for path in outputs[1:]) and index.reuse(key, job.output):
+                index.record(key, job.output, job.source)
+                self.message(job, "Already upscaled with these settings, reusing the existing output.")
+                self.progress(job, 100)
+                return
+            if os.path.exists(job.output) and os.stat(job.output).st_nlink > 1:
+                # A hard link to another output; writing through it would change that file too.
+                os.remove(job.output)
+        existed = [os.path.exists(path) for path in outputs]
+        try:
+            info = self.upscale(job, settings)
+        except JobCancelled:
+            # A cut-short output would look finished to players and to the next batch.
+            for path, was_there in zip(outputs, existed):
+                if not was_there and os.path.exists(path):
+                    os.remove(path)
+                    self.message(job, f"Removed the partial output {os.path.basename(path)}.")
+            raise
+        self.report_outputs(job, outputs, settings, info)
+        if key is not None and not job.cancel_requested:
+            self.output_index(job).record(key, job.output, job.source)
+
+    def report_outputs(self, job, outputs, settings, info):
+        """Log how the rate was chosen and the resulting size of every output."""
+        copied = self.native_plan(info, settings) == "copy"
+        for path, target in zip(outputs, targets(settings)):
+            size = os.path.getsize(path)
+            rate = "stream copy" if copied else rate_summary(target)
+            average = f", {size * 8 / info.duration / 1e6:.1f} Mbit/s average" if info.duration else ""
+            self.message(job, f"{os.path.basename(path)}: {rate}, {size / 1e6:.1f} MB{average}")
+
+    @staticmethod
+    def native_plan(info, settings):
+        # Renditions share one shader pass, so a job with renditions always upscales.
+        return None if settings.renditions else native_plan(info, settings)
+
+    def upscale(self, job, settings=None):
+        settings = settings or self.settings
+        info = self.media_info(job)
+        threads = self.tuner.threads(settings.codec) if self.tuner is not None else None
+        plan = self.native_plan(info, settings)
+        if plan is not None:
+            action = {"copy": "copying the streams", "scale": "scaling down without a shader",
+                      "encode": "re-encoding without a shader"}[plan]
+            self.message(job, f"Source is {info.resolution}, already at or above the "
+                              f"{settings.width}x{settings.height} target: {action}.")
+            command = native_command(job.source, job.output, settings, plan, threads=threads)
+            parser = ProgressParser(info.frame_count, info.duration, lambda metrics: self.metrics(job, metrics))
+            run_with_progress(command, duration=info.duration, job=job, parser=parser,
+                              on_progress=lambda percent: self.progress(job, percent))
+        elif settings.renditions:
+            if self.pipeline or self.segments > 1 or self.segment_time:
+                self.message(job, "Renditions are encoded in a single process, "
+                                  "split segments and pipeline mode are not used.")
+            renditions = RenditionEncode(job.source, job.output, settings, info,
+                                         on_message=lambda text: self.message(job, text), threads=threads)
+            renditions.run(job, on_progress=lambda percent: self.progress(job, percent),
+                           on_metrics=lambda metrics: self.metrics(job, metrics))
+        elif self.pipeline:
+            pipeline = PipelineEncode(job.source, job.output, settings, info, self.pipeline,
+                                      on_message=lambda text: self.message(job, text), threads=threads)
+            pipeline.run(job, on_progress=lambda percent: self.progress(job, percent),
+                         on_metrics=lambda metrics: self.metrics(job, metrics))
+        elif (self.segments > 1 or self.segment_time) and info.duration:
+            chunked = ChunkedEncode(job.source, job.output, settings, info.duration, self.segments,
+                                    self.segment_time, on_message=lambda text: self.message(job, text),
+                                    total_frames=info.frame_count, threads=threads)
+            chunked.run(job, on_progress=lambda percent: self.progress(job, percent),
+                        on_metrics=lambda metrics: self.metrics(job, metrics))
+        else:
+            command = build_command(job.source, job.output, settings, threads=threads)
+            parser = ProgressParser(info.frame_count, info.duration, lambda metrics: self.metrics(job, metrics))
+            run_with_progress(command, duration=info.duration, job=job, parser=parser,
+                              on_progress=lambda percent: self.progress(job, percent))
+        return info
+
+
+def geometry(info):
+    """``1920x1080``, with the sample aspect ratio of anamorphic sources, e.g. ``720x480 SAR 8:9``."""
+    sar = info.sample_aspect_ratio
+    return info.resolution if sar in (None, "", "1:1", "0:1") else f"{info.resolution} SAR {sar}"
@@ -0,0 +1,260 @@
+"""Persistent job queue and history in a small SQLite database.
+
+Every queued file is stored with a snapshot of the settings it was queued
+with, its state, timings, output path and error text. After a crash the
+jobs that were running are put back in the queue, and the queue can be
+resumed by the GUI or ``python -m anime4k queue run``.
+
+The GUI and the command line share the database, so a running job records
+the pid of the process that owns it, which refreshes a heartbeat while
+the job runs. Only jobs whose owner has stopped beating are recovered.
+"""
+import importlib.util
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+from anime4k.command import EncodeSettings, output_path
+from anime4k.scheduler import JobState
+from anime4k.tools import cache_dir
+
+# noinspection SqlNoDataSourceInspection
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    output TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    options TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    added REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    owner INTEGER,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE INDEX IF NOT EXISTS jobs_source ON jobs (source);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished);
+"""
+
+# Columns added after the first release, with their types, for older databases
+ADDED_COLUMNS = (("owner", "INTEGER"), ("heartbeat", "REAL"))
+
+UNFINISHED = (JobState.QUEUED, JobState.RUNNING)
+# Seconds between heartbeats of a process with running jobs
+HEARTBEAT_INTERVAL = 30
+# A running job whose heartbeat is older than this has lost its owner
+STALE_AFTER = 3 * HEARTBEAT_INTERVAL
+
+
+def _owner_alive(pid):
+    """False only when the owner is known to be gone; without psutil the heartbeat decides alone."""
+    if pid is None or importlib.util.find_spec("psutil") is None:
+        return True
+    import psutil
+
+    return psutil.pid_exists(pid)
+
+
+@dataclass
+class StoredJob:
+    id: int
+    source: str
+    output: str
+    settings: EncodeSettings
+    # Encoder options besides the settings: segments, segment_time, pipeline, reuse
+    options: dict = field(default_factory=dict)
+    state: str = JobState.QUEUED
+    error: str = None
+    added: float = None
+    started: float = None
+    finished: float = None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def summary(self):
+        elapsed = f" in {self.elapsed:.0f}s" if self.finished and self.started else ""
+        error = f": {self.error}" if self.error else ""
+        return f"#{self.id} {self.state}{elapsed} {os.path.basename(self.source)}{error}"
+
+
+def _from_row(row):
+    return StoredJob(
+        id=row["id"],
+        source=row["source"],
+        output=row["output"],
+        settings=EncodeSettings(**json.loads(row["settings"])),
+        options=json.loads(row["options"]),
+        state=row["state"],
+        error=row["error"],
+        added=row["added"],
+        started=row["started"],
+        finished=row["finished"],
+    )
+
+
+def batches(jobs):
+    """Group stored jobs by settings and options, in queue order: ``[(settings, options, jobs), ...]``."""
+    groups = {}
+    for job in jobs:
+        key = (json.dumps(asdict(job.settings), sort_keys=True), json.dumps(job.options, sort_keys=True))
+        groups.setdefault(key, (job.settings, job.options, []))[2].append(job)
+    return list(groups.values())
+
+
+class JobStore:
+    """The queue database. One connection shared by all threads, serialised by a lock."""
+
+    def __init__(self, path=None):
+        self.path = str(path or cache_dir() / "queue.db")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            # WAL keeps every state change durable without a full sync per update.
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            for name, kind in ADDED_COLUMNS:
+                if name not in columns:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+        self._stopped = threading.Event()
+        self._heart = None
+
+    def close(self):
+        self._stopped.set()
+        if self._heart is not None:
+            self._heart.join()
+        with self._lock:
+            self._db.close()
+
+    def _beat(self):
+        while not self._stopped.wait(HEARTBEAT_INTERVAL):
+            with self._lock, self._db:
+                self._db.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND state = ?",
+                                 (time.time(), os.getpid(), JobState.RUNNING))
+
+    def enqueue(self, sources, output_dir, settings, **options):
+        """Add ``sources`` to the queue and return their jobs.
+
+        A file already waiting for the same output is not added twice; it takes the new settings instead."""
+        now = time.time()
+        settings_json = json.dumps(asdict(settings))
+        options_json = json.dumps(options)
+        ids = []
+        with self._lock, self._db:
+            for source in sources:
+                source = os.path.abspath(source)
+                output = str(output_path(source, output_dir))
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE source = ? AND output = ? AND state IN (?, ?)",
+                    (source, output, *UNFINISHED)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET settings = ?, options = ? WHERE id = ?",
+                                     (settings_json, options_json, row["id"]))
+                    ids.append(row["id"])
+                    continue
+                cursor = self._db.execute(
+                    "INSERT INTO jobs (source, output, settings, options, state, added) VALUES (?, ?, ?, ?, ?, ?)",
+                    (source, output, settings_json, options_json, JobState.QUEUED, now))
+                ids.append(cursor.lastrowid)
+        return self.get(ids)
+
+    def get(self, ids):
+        found = {}
+        with self._lock:
+            # Batched so thousands of ids stay under SQLite's variable limit.
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self._db.execute(f"SELECT * FROM jobs WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                found.update((row["id"], _from_row(row)) for row in rows)
+        return [found[job_id] for job_id in ids if job_id in found]
+
+    def recover(self):
+        """Put jobs whose process stopped while they ran back in the queue; returns how many.
+
+        Jobs of another GUI or command line still beating are left alone."""
+        stale = time.time() - STALE_AFTER
+        with self._lock, self._db:
+            rows = self._db.execute("SELECT id, owner, heartbeat FROM jobs WHERE state = ?", (JobState.RUNNING,))
+            lost = [row["id"] for row in rows
+                    if row["heartbeat"] is None or row["heartbeat"] < stale or not _owner_alive(row["owner"])]
+            for job_id in lost:
+                self._db.execute("UPDATE jobs SET state = ?, started = NULL, owner = NULL, heartbeat = NULL "
+                                 "WHERE id = ?", (JobState.QUEUED, job_id))
+            return len(lost)
+
+    def pending(self):
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM jobs WHERE state = ? ORDER BY id", (JobState.QUEUED,))
+            return [_from_row(row) for row in rows]
+
+    def update(self, job):
+        """Store the state of a scheduler ``Job`` that has a ``record_id``."""
+        if job.record_id is None:
+            return
+        now = time.time()
+        error = str(job.error) if job.error is not None else None
+        with self._lock, self._db:
+            if job.state == JobState.RUNNING:
+                self._db.execute("UPDATE jobs SET state = ?, started = ?, finished = NULL, error = NULL, owner = ?, "
+                                 "heartbeat = ? WHERE id = ?", (job.state, now, os.getpid(), now, job.record_id))
+                if self._heart is None:
+                    self._heart = threading.Thread(target=self._beat, daemon=True)
+                    self._heart.start()
+            elif job.state in JobState.FINISHED:
+                self._db.execute("UPDATE jobs SET state = ?, finished = ?, error = ? WHERE id = ?",
+                                 (job.state, now, error, job.record_id))
+            else:
+                self._db.execute("UPDATE jobs SET state = ? WHERE id = ?", (job.state, job.record_id))
+
+    def requeue(self, states=(JobState.FAILED, JobState.CANCELLED)):
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET state = ?, error = NULL, started = NULL, finished = NULL "
+                f"WHERE state IN ({','.join('?' * len(states))})", (JobState.QUEUED, *states))
+            return cursor.rowcount
+
+    def history(self, limit=50, state=None, source=None):
+        """Newest jobs first, optionally only one state or one source file or folder.
+
+        ``source`` matches as a path prefix, a range on the ``jobs_source`` index."""
+        query, params = "SELECT * FROM jobs", []
+        conditions = []
+        if state:
+            conditions.append("state = ?")
+            params.append(state)
+        if source:
+            prefix = os.path.abspath(source)
+            if os.path.isdir(prefix):
+                # A trailing separator keeps D:\Anime from matching D:\Anime2.
+                prefix = os.path.join(prefix, "")
+            conditions.append("source >= ? AND source < ?")
+            # Every string starting with ``prefix`` sorts below the prefix with its last character bumped.
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [_from_row(row) for row in self._db.execute(query, params)]
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def clear(self, states=JobState.FINISHED):
+        """Delete finished jobs from the history; returns how many."""
+        with self._lock, self._db:
+            cursor = self._db.execute(f"DELETE FROM jobs WHERE state IN ({','.join('?' * len(states))})", states)
+            return cursor.rowcount
@@ -0,0 +1,73 @@
+"""On-disk checkpoint journal for segmented encodes."""
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict
+
+
+def fingerprint(source, settings, **layout):
+    stat = os.stat(source)
+    data = {
+        "source": os.path.abspath(source),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "settings": asdict(settings),
+        "layout": layout,
+    }
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class EncodeJournal:
+    """Records the segment split and every finished segment of one encode.
+
+    A journal only applies to the exact source file and settings it was
+    written for; anything else makes ``matches`` return False."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+        return self
+
+    def matches(self, fingerprint_value):
+        return self._data.get("fingerprint") == fingerprint_value and bool(self._data.get("segments"))
+
+    def start(self, fingerprint_value, segments):
+        with self._lock:
+            self._data = {
+                "fingerprint": fingerprint_value,
+                "segments": [{"source": str(s.source), "start": s.start, "end": s.end, "output": str(s.output)}
+                             for s in segments],
+                "done": {},
+            }
+            self._save()
+
+    @property
+    def segments(self):
+        return self._data.get("segments", [])
+
+    def is_done(self, segment):
+        entry = self._data.get("done", {}).get(str(segment.index))
+        try:
+            return entry is not None and os.path.getsize(segment.output) == entry["size"]
+        except OSError:
+            return False
+
+    def mark_done(self, segment):
+        with self._lock:
+            self._data.setdefault("done", {})[str(segment.index)] = {"size": os.path.getsize(segment.output)}
+            self._save()
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,64 @@
+"""Keyframe timestamps of a video, read once from packet flags and cached on disk."""
+import bisect
+import hashlib
+import json
+import os
+import subprocess
+
+from anime4k.probe import ProbeError
+from anime4k.tools import cache_dir, ffprobe_path, popen_kwargs
+
+
+class KeyframeIndex:
+    """Sorted keyframe times in seconds from the start of the video stream."""
+
+    def __init__(self, times):
+        self.times = sorted(times)
+
+    def before(self, seconds):
+        """The last keyframe at or before ``seconds``, where decoding has to start to reach it."""
+        index = bisect.bisect_right(self.times, seconds + 1e-6) - 1
+        return self.times[index] if index >= 0 else 0.0
+
+
+def read_keyframes(path):
+    # Packet flags come from the demuxer, so nothing has to be decoded.
+    # noinspection SpellCheckingInspection
+    result = subprocess.run(
+        [ffprobe_path(), "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags",
+         "-of", "csv=p=0", str(path)],
+        stdin=subprocess.DEVNULL, capture_output=True, text=True, errors="replace", **popen_kwargs())
+    if result.returncode != 0:
+        raise ProbeError(f"ffprobe failed for {path}: {result.stderr.strip()}")
+    times, keyframes = [], []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        try:
+            pts = float(pts)
+        except ValueError:
+            continue
+        times.append(pts)
+        if "K" in flags:
+            keyframes.append(pts)
+    # Player timestamps start at zero, ffprobe reports them including the stream start time.
+    start = min(times, default=0.0)
+    return [round(time - start, 6) for time in keyframes]
+
+
+def load_keyframes(path):
+    stat = os.stat(path)
+    key = hashlib.sha1(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()
+    cache = cache_dir() / "keyframes"
+    cache.mkdir(exist_ok=True)
+    cached = cache / f"{key}.json"
+    try:
+        with open(cached, "r", encoding="utf-8") as f:
+            return KeyframeIndex(json.load(f))
+    except (OSError, ValueError):
+        pass
+    times = read_keyframes(path)
+    tmp = f"{cached}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(times, f)
+    os.replace(tmp, cached)
+    return KeyframeIndex(times)
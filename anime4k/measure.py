@@ -0,0 +1,189 @@
+"""Objective quality of an upscale against its source: PSNR, SSIM and VMAF.
+
+The work is done by ffmpeg's psnr, ssim and libvmaf filters in one filter
+graph per shard. The reference is scaled to the upscale's size. The
+timeline is cut on frame numbers into shards that run in parallel, so no
+frame is measured twice, and every ``every``-th frame can be sampled
+instead of comparing all of them. Per-frame values
+come from the filters' stats files and are merged into one CSV and a JSON
+summary.
+"""
+import csv
+import json
+import math
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from anime4k.capabilities import load_capabilities
+from anime4k.command import filter_path
+from anime4k.probe import ProbeService
+from anime4k.runner import run_quiet
+from anime4k.tools import ffmpeg_path
+
+_PSNR_LINE = re.compile(r"n:(\d+) .*psnr_avg:(\S+) psnr_y:(\S+)")
+_SSIM_LINE = re.compile(r"n:(\d+) Y:(\S+) .*All:(\S+)")
+
+FIELDS = ["frame", "time", "psnr_y", "psnr_avg", "ssim_y", "ssim_all", "vmaf"]
+# Identical frames have infinite PSNR; count them as this so averages stay finite.
+PSNR_CAP = 100.0
+
+
+def _float(value):
+    try:
+        return min(float(value), PSNR_CAP)
+    except ValueError:
+        return PSNR_CAP if value == "inf" else None
+
+
+def quality_graph(width, height, every, stats_dir, vmaf, frames=None):
+    """Filter graph comparing input 1 (upscale) against input 0 (reference) scaled to its size.
+
+    ``frames`` limits both inputs to that many frames."""
+    sample = f",select='not(mod(n\\,{every}))'" if every > 1 else ""
+    trim = f"trim=end_frame={frames}," if frames else ""
+    count = 3 if vmaf else 2
+    ref_labels = "".join(f"[r{i}]" for i in range(count))
+    dist_labels = "".join(f"[d{i}]" for i in range(count))
+    # noinspection SpellCheckingInspection
+    graph = [
+        f"[0:v]{trim}scale={width}:{height}:flags=bicubic,format=yuv420p,setpts=PTS-STARTPTS{sample},"
+        f"split={count}{ref_labels}",
+        f"[1:v]{trim}format=yuv420p,setpts=PTS-STARTPTS{sample},split={count}{dist_labels}",
+        f"[d0][r0]psnr=stats_file={filter_path(stats_dir / 'psnr.log')}",
+        f"[d1][r1]ssim=stats_file={filter_path(stats_dir / 'ssim.log')}",
+    ]
+    if vmaf:
+        graph.append(f"[d2][r2]libvmaf=log_fmt=csv:log_path={filter_path(stats_dir / 'vmaf.csv')}:n_threads=1")
+    return ";".join(graph)
+
+
+def read_stats(stats_dir, vmaf):
+    """Per-frame rows keyed by the filters' 1-based frame number."""
+    rows = {}
+    with open(stats_dir / "psnr.log", encoding="utf-8") as f:
+        for match in filter(None, map(_PSNR_LINE.search, f)):
+            rows.setdefault(int(match[1]), {}).update(psnr_avg=_float(match[2]), psnr_y=_float(match[3]))
+    with open(stats_dir / "ssim.log", encoding="utf-8") as f:
+        for match in filter(None, map(_SSIM_LINE.search, f)):
+            rows.setdefault(int(match[1]), {}).update(ssim_y=float(match[2]), ssim_all=float(match[3]))
+    if vmaf:
+        with open(stats_dir / "vmaf.csv", newline="", encoding="utf-8") as f:
+            for record in csv.DictReader(f):
+                # libvmaf numbers frames from 0, psnr and ssim from 1
+                rows.setdefault(int(record["Frame"]) + 1, {})["vmaf"] = float(record["vmaf"])
+    return rows
+
+
+def measure_shard(reference, distorted, first, count, width, height, fps, every, vmaf, work_dir):
+    """Measure ``count`` frames from frame number ``first``; a ``count`` of None runs to the end."""
+    stats_dir = Path(tempfile.mkdtemp(prefix="shard-", dir=work_dir))
+    # Seeking half a frame early makes frame ``first`` the first one decoded, not its neighbour.
+    seek = ["-ss", f"{(first - 0.5) / fps:.6f}"] if first else []
+    # noinspection SpellCheckingInspection
+    command = [
+        ffmpeg_path(),
+        "-loglevel", "error",
+        *seek, "-i", str(reference),
+        *seek, "-i", str(distorted),
+        "-filter_complex", quality_graph(width, height, every, stats_dir, vmaf, count),
+        "-f", "null", "-",
+    ]
+    run_quiet(command)
+    frames = []
+    for number, values in sorted(read_stats(stats_dir, vmaf).items()):
+        frame = first + (number - 1) * every
+        frames.append({"frame": frame, "time": round(frame / fps, 3), **values})
+    return frames
+
+
+def summarize(frames, vmaf):
+    summary = {"frames": len(frames)}
+    for key in ("psnr_y", "psnr_avg", "ssim_y", "ssim_all") + (("vmaf",) if vmaf else ()):
+        values = sorted(row[key] for row in frames if row.get(key) is not None)
+        if not values:
+            continue
+        summary[key] = {
+            "mean": round(sum(values) / len(values), 4),
+            "min": round(values[0], 4),
+            # 5th percentile shows how bad the worst stretches get, which the mean hides.
+            "p5": round(values[int(len(values) * 0.05)], 4),
+        }
+    return summary
+
+
+def measure(reference, distorted, reference_info, distorted_info, every=1, shards=4, vmaf=False,
+            on_progress=None):
+    """Compare ``distorted`` (the upscale) with ``reference`` (its source); returns ``(frames, summary)``.
+
+    ``reference_info`` and ``distorted_info`` are ``MediaInfo`` from the probe service."""
+    duration = min(reference_info.duration or 0, distorted_info.duration or 0)
+    if not duration:
+        raise ValueError("Cannot measure videos of unknown duration.")
+    fps = distorted_info.fps or reference_info.fps or 24
+    shards = max(1, min(shards, math.ceil(duration)))
+    total = round(duration * fps)
+    # Shards start on multiples of ``every`` so sampling keeps one grid over the whole video.
+    starts = sorted({round(total * index / shards / every) * every for index in range(shards)})
+    # The last shard runs to the end, whatever the frame count estimate missed.
+    counts = [end - start for start, end in zip(starts, starts[1:])] + [None]
+    shards = len(starts)
+    work_dir = Path(tempfile.mkdtemp(prefix="anime4k-measure-"))
+    try:
+        with ThreadPoolExecutor(max_workers=shards) as pool:
+            futures = [pool.submit(measure_shard, reference, distorted, start, count,
+                                   distorted_info.width, distorted_info.height, fps, every, vmaf, work_dir)
+                       for start, count in zip(starts, counts)]
+            frames = []
+            for done, future in enumerate(futures, 1):
+                frames.extend(future.result())
+                if on_progress is not None:
+                    on_progress(done / shards * 100)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    summary = summarize(frames, vmaf)
+    summary.update(reference=str(reference), distorted=str(distorted), every=every,
+                   resolution=distorted_info.resolution)
+    return frames, summary
+
+
+def write_report(frames, summary, base_path):
+    """Write ``<base_path>.csv`` with one row per frame and ``<base_path>.json`` with the summary."""
+    csv_path = Path(f"{base_path}.csv")
+    json_path = Path(f"{base_path}.json")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(frames)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return csv_path, json_path
+
+
+def format_summary(summary):
+    parts = [f"{summary['frames']} frames"]
+    for key, label in (("psnr_avg", "PSNR"), ("ssim_all", "SSIM"), ("vmaf", "VMAF")):
+        if key in summary:
+            parts.append(f"{label} {summary[key]['mean']:.4g} (min {summary[key]['min']:.4g})")
+    return ", ".join(parts)
+
+
+def measure_files(reference, distorted, probe_service=None, every=1, shards=4, vmaf=None, report=None,
+                  on_progress=None):
+    """Probe both files, measure and write the report next to ``distorted`` unless ``report`` is given.
+
+    VMAF is included when ``vmaf`` is None and ffmpeg has libvmaf. Returns ``(summary, report paths)``."""
+    probe_service = probe_service or ProbeService()
+    reference_info = probe_service.probe(reference)
+    distorted_info = probe_service.probe(distorted)
+    if vmaf is None:
+        try:
+            vmaf = "libvmaf" in load_capabilities().filters
+        except OSError:
+            vmaf = False
+    frames, summary = measure(reference, distorted, reference_info, distorted_info, every, shards, vmaf,
+                              on_progress)
+    report = report or Path(distorted).with_name(f"{Path(distorted).stem}-quality")
+    return summary, write_report(frames, summary, report)
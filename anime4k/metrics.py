@@ -0,0 +1,219 @@
+"""Typed encode metrics parsed from ffmpeg's ``-progress`` key=value blocks."""
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+# noinspection SpellCheckingInspection
+PROGRESS_KEYS = ("frame", "fps", "bitrate", "total_size", "out_time_us", "speed", "progress")
+
+
+@dataclass
+class EncodeMetrics:
+    frame: int = 0
+    total_frames: int = None
+    fps: float = 0.0
+    avg_fps: float = 0.0
+    speed: float = None
+    bitrate_kbps: float = None
+    total_size: int = 0
+    out_time: float = 0.0
+    elapsed: float = 0.0
+    eta: float = None
+    percent: float = None
+    finished: bool = False
+
+    def summary(self):
+        frames = f"{self.frame}/{self.total_frames}" if self.total_frames else str(self.frame)
+        parts = [f"{self.percent:5.1f}%" if self.percent is not None else "?",
+                 f"frame {frames}",
+                 f"{self.fps:.1f} fps (avg {self.avg_fps:.1f})"]
+        if self.speed is not None:
+            parts.append(f"{self.speed:.2f}x")
+        if self.bitrate_kbps is not None:
+            parts.append(f"{self.bitrate_kbps / 1000:.1f} Mbit/s")
+        parts.append(f"{self.total_size / 1024 ** 2:.1f} MiB")
+        parts.append(f"ETA {format_seconds(self.eta)}")
+        return " | ".join(parts)
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def _number(value, kind=float, suffix=""):
+    try:
+        return kind(value.strip().removesuffix(suffix))
+    except (AttributeError, ValueError):
+        return None
+
+
+def eta(metrics, duration=None):
+    if metrics.finished:
+        return 0.0
+    if metrics.total_frames and metrics.avg_fps:
+        return max(metrics.total_frames - metrics.frame, 0) / metrics.avg_fps
+    if duration and metrics.speed:
+        return max(duration - metrics.out_time, 0) / metrics.speed
+    return None
+
+
+class ProgressParser:
+    """Feed ffmpeg output lines; every completed ``progress=`` block is turned into an ``EncodeMetrics``."""
+
+    def __init__(self, total_frames=None, duration=None, on_metrics=None):
+        self.total_frames = total_frames
+        self.duration = duration
+        self.on_metrics = on_metrics
+        self.metrics = None
+        self._values = {}
+        self._start = time.monotonic()
+        self._last = (self._start, 0)
+
+    def feed(self, line):
+        key, sep, value = line.strip().partition("=")
+        if not sep or key not in PROGRESS_KEYS:
+            return None
+        if key != "progress":
+            self._values[key] = value
+            return None
+        metrics = self._build(finished=value.strip() == "end")
+        self._values = {}
+        self.metrics = metrics
+        if self.on_metrics is not None:
+            self.on_metrics(metrics)
+        return metrics
+
+    def _build(self, finished):
+        now = time.monotonic()
+        elapsed = now - self._start
+        frame = _number(self._values.get("frame"), int) or 0
+        last_time, last_frame = self._last
+        fps = (frame - last_frame) / (now - last_time) if now > last_time and not finished else 0.0
+        self._last = (now, frame)
+        out_time = (_number(self._values.get("out_time_us"), int) or 0) / 1_000_000
+        metrics = EncodeMetrics(
+            frame=frame,
+            total_frames=self.total_frames,
+            fps=round(fps, 2),
+            avg_fps=round(frame / elapsed, 2) if elapsed else 0.0,
+            speed=_number(self._values.get("speed"), suffix="x"),
+            bitrate_kbps=_number(self._values.get("bitrate"), suffix="kbits/s"),
+            total_size=_number(self._values.get("total_size"), int) or 0,
+            out_time=round(out_time, 3),
+            elapsed=round(elapsed, 3),
+            finished=finished,
+        )
+        if self.total_frames:
+            metrics.percent = round(min(frame / self.total_frames * 100, 100), 2)
+        elif self.duration:
+            metrics.percent = round(min(out_time / self.duration * 100, 100), 2)
+        if finished:
+            metrics.percent = 100.0
+        metrics.eta = eta(metrics, self.duration)
+        return metrics
+
+
+class CombinedMetrics:
+    """Sum the metrics of segments that are encoded at the same time into one job-level view."""
+
+    def __init__(self, total_frames=None, duration=None, on_metrics=None):
+        self.total_frames = total_frames
+        self.duration = duration
+        self.on_metrics = on_metrics
+        self._parts = {}
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, index, metrics):
+        with self._lock:
+            self._parts[index] = metrics
+            self._emit()
+
+    def finish(self):
+        with self._lock:
+            self._emit(finished=True)
+
+    def _emit(self, finished=False):
+        parts = list(self._parts.values())
+        elapsed = time.monotonic() - self._start
+        frame = sum(part.frame for part in parts)
+        out_time = sum(part.out_time for part in parts)
+        total_size = sum(part.total_size for part in parts)
+        combined = EncodeMetrics(
+            frame=frame,
+            total_frames=self.total_frames,
+            fps=0.0 if finished else round(sum(part.fps for part in parts), 2),
+            avg_fps=round(frame / elapsed, 2) if elapsed else 0.0,
+            speed=round(out_time / elapsed, 3) if elapsed else None,
+            bitrate_kbps=round(total_size * 8 / 1000 / out_time, 1) if out_time else None,
+            total_size=total_size,
+            out_time=round(out_time, 3),
+            elapsed=round(elapsed, 3),
+            finished=finished,
+        )
+        if finished:
+            combined.percent = 100.0
+        elif self.total_frames:
+            combined.percent = round(min(frame / self.total_frames * 100, 100), 2)
+        elif self.duration:
+            combined.percent = round(min(out_time / self.duration * 100, 100), 2)
+        combined.eta = eta(combined, self.duration)
+        if self.on_metrics is not None:
+            self.on_metrics(combined)
+
+    def parser(self, index, total_frames=None, duration=None):
+        return ProgressParser(total_frames, duration, on_metrics=lambda metrics: self.update(index, metrics))
+
+
+def settings_tags(settings):
+    return {} if settings is None else {key: getattr(settings, key) for key in
+                                        ("codec", "shader", "width", "height", "hdr", "quality")}
+
+
+class MetricsLog:
+    """Append job metrics as JSON lines, at most one record per job every ``interval`` seconds
+    plus the final one, tagged with the settings so runs can be compared later.
+
+    Records are tagged with the job's own settings (``job.settings``, set by
+    the ``Encoder`` once the shader and target size are resolved), or with
+    ``settings`` before that. With ``max_bytes`` the file is rotated like
+    the log file, keeping ``backups`` old files."""
+
+    # Shared by every log, as the batches of one run write to the same file
+    _lock = threading.Lock()
+
+    def __init__(self, path, settings=None, interval=5.0, max_bytes=None, backups=3):
+        self.path = path
+        self.tags = settings_tags(settings)
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._written = {}
+
+    def _rotate(self):
+        """``metrics.jsonl`` becomes ``metrics.jsonl.1``, and so on up to ``backups``."""
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def write(self, job, metrics):
+        now = time.monotonic()
+        with self._lock:
+            last = self._written.get(job.id)
+            if not metrics.finished and last is not None and now - last < self.interval:
+                return
+            self._written[job.id] = now
+            tags = settings_tags(job.settings) if getattr(job, "settings", None) is not None else self.tags
+            record = {"time": round(time.time(), 3), "job": job.id, "file": job.source, **tags}
+            record.update(asdict(metrics))
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
@@ -0,0 +1,317 @@
+"""Pipeline mode: the shader stage and the encoder run in separate ffmpeg processes.
+
+One ffmpeg decodes and upscales and writes raw frames to a pipe. Python
+reads them into a bounded ring of frame buffers and hands consecutive runs
+of frames (chunks) to encoder processes, several of which can run at
+once. A slow CPU encoder then no longer holds up the GPU, and a fast
+encoder no longer waits for a shader pass it could overlap with. The
+encoded chunks are joined at the end with the source's audio and
+subtitles, like the pieces of a segmented encode.
+
+Every chunk starts a fresh encoder with its own rate control and a key
+frame, so chunks are long (``MIN_CHUNK_SECONDS``), and with a single
+encoder the whole video is one chunk. For several encoders to work at
+once the upscaler has to run ahead by whole chunks, so only as many
+encoders run as the ``BUFFER_MB`` ring can hold chunks for. Free slots
+are handed out last-in first-out, so buffers are only allocated for as
+many frames as are actually waiting.
+
+Chunks are encoded at the source's average frame rate, so the mode
+assumes constant frame rate sources.
+
+The time the upscaler spends blocked on a full ring and the time the
+encoders spend waiting for frames are measured, so every run reports
+which of the two stages is the bottleneck.
+"""
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from anime4k.chunked import concat_segments
+from anime4k.command import rate_args, thread_args, video_filter
+from anime4k.metrics import ProgressParser
+from anime4k.process import stop_process
+from anime4k.scheduler import JobCancelled
+from anime4k.tools import ffmpeg_path, popen_kwargs
+
+# Memory for upscaled frames waiting to be encoded, about 80 frames of 4K yuv420p
+BUFFER_MB = 1024
+# Shortest chunk handed to an encoder, many GOPs so the restarts cost little quality or size
+MIN_CHUNK_SECONDS = 20
+# noinspection SpellCheckingInspection
+HDR10_COLOR = ("bt2020", "smpte2084", "bt2020nc")
+
+
+@dataclass
+class PipelineStats:
+    frames: int = 0
+    chunks: int = 0
+    encoders: int = 1
+    wall_s: float = 0.0
+    # Share of the run each stage spent working rather than waiting on the other one
+    upscale_busy: float = 0.0
+    encode_busy: float = 0.0
+
+    @property
+    def bottleneck(self):
+        return "upscale" if self.upscale_busy >= self.encode_busy else "encode"
+
+    def summary(self):
+        return (f"{self.frames} frames in {self.chunks} chunks, upscale {self.upscale_busy:.0%} busy, "
+                f"{self.encoders} encoder{'s' if self.encoders > 1 else ''} {self.encode_busy:.0%} busy, "
+                f"bottleneck: {self.bottleneck}")
+
+
+def frame_bytes(width, height, pix_fmt):
+    # 4:2:0 has half a sample of chroma per pixel; p010le stores every sample in two bytes.
+    return width * height * 3 // 2 * (2 if pix_fmt == "p010le" else 1)
+
+
+def color_args(info, settings):
+    primaries, transfer, space = info.color_primaries, info.color_transfer, info.color_space
+    if settings.hdr and not transfer:
+        primaries, transfer, space = HDR10_COLOR
+    args = []
+    for option, value in (("-color_primaries", primaries), ("-color_trc", transfer), ("-colorspace", space)):
+        if value and value != "unknown":
+            args += [option, value]
+    return args
+
+
+def upscale_command(source, settings, pix_fmt):
+    # noinspection SpellCheckingInspection
+    command = [ffmpeg_path(), "-loglevel", "error", "-nostats", "-progress", "pipe:2", "-i", str(source),
+               "-map", "0:v:0"]
+    if not settings.hdr:
+        command += ["-init_hw_device", "vulkan"]
+    return command + ["-vf", video_filter(settings), "-pix_fmt", pix_fmt, "-f", "rawvideo", "pipe:1"]
+
+
+def encode_command(output, settings, pix_fmt, fps, colors, threads=None):
+    # noinspection SpellCheckingInspection
+    return [ffmpeg_path(), "-loglevel", "error", "-nostats", "-y",
+            "-f", "rawvideo", "-pix_fmt", pix_fmt, "-s", f"{settings.width}x{settings.height}",
+            "-framerate", repr(fps), "-i", "pipe:0"] + colors + rate_args(settings) \
+        + thread_args(settings.codec, threads) + [str(output)]
+
+
+def _read_exact(stream, view):
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            return False
+        filled += count
+    return True
+
+
+class _Chunk:
+    def __init__(self, index, output, log):
+        self.index = index
+        self.output = output
+        self.log = log
+        self.frames = queue.Queue()
+        self.error = None
+
+
+class PipelineEncode:
+    """Upscale ``source`` in one process and encode the frames in up to ``encoders`` processes at once."""
+
+    def __init__(self, source, output, settings, info, encoders=2, buffer_mb=BUFFER_MB, chunk_frames=None,
+                 work_dir=None, on_message=None, threads=None):
+        self.source = str(source)
+        self.output = Path(output)
+        self.settings = settings
+        self.info = info
+        self.requested_encoders = self.encoders = max(1, int(encoders))
+        self.pix_fmt = "p010le" if settings.hdr else "yuv420p"
+        self.frame_size = frame_bytes(settings.width, settings.height, self.pix_fmt)
+        self.buffer_mb = buffer_mb
+        self.ring = max(2, buffer_mb * 1024 * 1024 // self.frame_size)
+        self.chunk_frames = chunk_frames or round((info.fps or 24) * MIN_CHUNK_SECONDS)
+        if self.encoders > 1:
+            # While one encoder takes the frames as they come, every other one needs a whole chunk buffered.
+            self.encoders = max(1, min(self.encoders, (self.ring + self.chunk_frames) // (self.chunk_frames + 2)))
+        if self.encoders == 1:
+            # One long-lived encoder for the whole video; None never starts a second chunk.
+            self.chunk_frames = chunk_frames
+        self.work_dir = Path(work_dir) if work_dir else self.output.parent / f".{self.output.stem}-pipeline"
+        self.on_message = on_message
+        # Encoder threads of the whole job, shared by the encoders that run at once
+        self.threads = threads and max(1, threads // self.encoders)
+        self.stats = PipelineStats(encoders=self.encoders)
+        self._buffers = [None] * self.ring
+        self._free = queue.LifoQueue()
+        self._encoder_slots = threading.Semaphore(self.encoders)
+        self._failed = threading.Event()
+        self._lock = threading.Lock()
+        self._encode_busy = 0.0
+
+    def _encode_chunk(self, chunk, colors, job):
+        busy = 0.0
+        drained = stopped = False
+        try:
+            command = encode_command(chunk.output, self.settings, self.pix_fmt, self.info.fps or 24, colors,
+                                     self.threads)
+            with open(chunk.log, "w", encoding="utf-8") as log:
+                process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=log,
+                                           **popen_kwargs())
+            writing = True
+            while True:
+                index = chunk.frames.get()
+                if index is None:
+                    drained = True
+                    break
+                if writing and not self._failed.is_set() and not (job and job.cancel_requested):
+                    began = time.monotonic()
+                    try:
+                        # Blocks while the encoder is busy, so this is the encoder's working time.
+                        process.stdin.write(self._buffers[index])
+                    except OSError as e:
+                        chunk.error = e
+                        writing = False
+                    busy += time.monotonic() - began
+                self._free.put(index)
+            began = time.monotonic()
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            stopped = self._failed.is_set() or bool(job and job.cancel_requested)
+            if stopped:
+                stop_process(process)
+            else:
+                process.wait()
+            busy += time.monotonic() - began
+            if process.returncode != 0 and chunk.error is None and not stopped:
+                with open(chunk.log, encoding="utf-8", errors="replace") as f:
+                    chunk.error = RuntimeError(f"Encoding chunk {chunk.index} failed: {f.read()[-4000:]}")
+        except Exception as e:
+            chunk.error = e
+            while not drained:
+                # The slot goes back to the ring even after a failure, or the reader would stall.
+                index = chunk.frames.get()
+                drained = index is None
+                if not drained:
+                    self._free.put(index)
+        finally:
+            if chunk.error is not None:
+                self._failed.set()
+            with self._lock:
+                self._encode_busy += busy
+            self._encoder_slots.release()
+
+    def _feed(self, upscaler, colors, job):
+        """Read frames from the upscaler and hand them out chunk by chunk; returns the chunks and stall time."""
+        for index in reversed(range(self.ring)):
+            self._free.put(index)
+        chunks, threads = [], []
+        chunk = None
+        frames = 0
+        stalled = 0.0
+        while not self._failed.is_set():
+            began = time.monotonic()
+            index = self._free.get()
+            stalled += time.monotonic() - began
+            if self._buffers[index] is None:
+                self._buffers[index] = bytearray(self.frame_size)
+            if not _read_exact(upscaler.stdout, memoryview(self._buffers[index])):
+                break
+            if chunk is None or (self.chunk_frames and frames % self.chunk_frames == 0):
+                if chunk is not None:
+                    chunk.frames.put(None)
+                began = time.monotonic()
+                self._encoder_slots.acquire()
+                stalled += time.monotonic() - began
+                number = len(chunks)
+                chunk = _Chunk(number, self.work_dir / f"chunk_{number:05d}.mkv",
+                               self.work_dir / f"chunk_{number:05d}.log")
+                chunks.append(chunk)
+                thread = threading.Thread(target=self._encode_chunk, args=(chunk, colors, job), daemon=True)
+                threads.append(thread)
+                thread.start()
+            chunk.frames.put(index)
+            frames += 1
+        if chunk is not None:
+            chunk.frames.put(None)
+        if self._failed.is_set():
+            stop_process(upscaler)
+        for thread in threads:
+            thread.join()
+        self.stats.frames = frames
+        self.stats.chunks = len(chunks)
+        return chunks, stalled
+
+    def _upscale(self, colors, parser, job):
+        """Run the upscaler and the encoders until the frames run out; returns the chunks."""
+        errors = []
+
+        def read_errors(stream):
+            for raw in stream:
+                line = raw.decode("utf-8", errors="replace")
+                if parser.feed(line) is None and "=" not in line:
+                    errors.append(line.strip())
+
+        began = time.monotonic()
+        upscaler = subprocess.Popen(upscale_command(self.source, self.settings, self.pix_fmt),
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    **popen_kwargs())
+        if job is not None:
+            job.own(upscaler)
+        stderr_thread = threading.Thread(target=read_errors, args=(upscaler.stderr,), daemon=True)
+        stderr_thread.start()
+        try:
+            chunks, stalled = self._feed(upscaler, colors, job)
+            upscaler.wait()
+            stderr_thread.join()
+        finally:
+            if job is not None:
+                job.release(upscaler)
+        wall = time.monotonic() - began
+        self.stats.wall_s = round(wall, 2)
+        self.stats.upscale_busy = round(max(0.0, 1 - stalled / wall), 3) if wall else 0.0
+        self.stats.encode_busy = round(min(1.0, self._encode_busy / (wall * self.encoders)), 3) if wall else 0.0
+
+        if job is not None and job.cancel_requested:
+            raise JobCancelled(job.name)
+        failed = next((chunk.error for chunk in chunks if chunk.error is not None), None)
+        if failed is not None:
+            raise failed
+        if upscaler.returncode != 0:
+            raise RuntimeError(f"Upscaling {self.source} failed: {' '.join(errors)[-4000:]}")
+        if not chunks:
+            raise RuntimeError(f"Upscaling {self.source} produced no frames.")
+        return chunks
+
+    def run(self, job=None, on_progress=None, on_metrics=None):
+        def metrics_callback(metrics):
+            if on_metrics is not None:
+                on_metrics(metrics)
+            if on_progress is not None and metrics.percent is not None:
+                # Hold back the last percent until the chunks are joined.
+                on_progress(min(metrics.percent, 99.0))
+
+        parser = ProgressParser(self.info.frame_count, self.info.duration, metrics_callback)
+        if self.on_message is not None and self.encoders < self.requested_encoders:
+            self.on_message(f"Pipeline: the {self.buffer_mb} MB frame buffer holds chunks for {self.encoders} "
+                            f"of {self.requested_encoders} encoders at {self.settings.width}x{self.settings.height}, "
+                            f"running {self.encoders}.")
+        if self.on_message is not None and self.chunk_frames:
+            self.on_message(f"Pipeline: {self.encoders} encoders on chunks of {self.chunk_frames} frames")
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.work_dir.mkdir(parents=True)
+        try:
+            # Unlike segments, chunks cannot be resumed, so the work directory never outlives the run.
+            chunks = self._upscale(color_args(self.info, self.settings), parser, job)
+            concat_segments([chunk.output for chunk in chunks], self.source, self.output, self.work_dir, job)
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        if self.on_message is not None:
+            self.on_message(f"Pipeline: {self.stats.summary()}")
+        if on_progress is not None:
+            on_progress(100)
+        return self.stats
@@ -0,0 +1,38 @@
+"""Named encode presets for scripted runs; a JSON file path works as a preset too."""
+import json
+from dataclasses import fields, replace
+
+from anime4k.command import EncodeSettings, parse_rendition
+
+# noinspection SpellCheckingInspection
+PRESETS = {
+    "default": {},
+    "4k-hevc-nvenc": {"codec": "hevc_nvenc"},
+    "4k-hevc-amf": {"codec": "hevc_amf"},
+    "4k-x265": {"codec": "libx265"},
+    "4k-av1-nvenc": {"codec": "av1_nvenc", "bit_rate": "8M", "max_bitrate": "16M", "buffer_size": "32M"},
+    "1080p-x264": {"width": 1920, "height": 1080, "codec": "libx264", "bit_rate": "6M", "max_bitrate": "12M",
+                   "buffer_size": "24M"},
+    "4k-x265-crf": {"codec": "libx265", "quality": 22},
+    "4k-hevc-nvenc-cq": {"codec": "hevc_nvenc", "quality": 24},
+    "4k-hevc-nvenc+1080p-x264": {"codec": "hevc_nvenc", "renditions": ["1920x1080:libx264:6M:12M:24M"]},
+}
+
+
+def load_preset(name):
+    if name in PRESETS:
+        values = PRESETS[name]
+    else:
+        try:
+            with open(name, "r", encoding="utf-8") as f:
+                values = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Unknown preset {name!r}: {e}")
+    known = {field.name for field in fields(EncodeSettings)}
+    unknown = set(values) - known
+    if unknown:
+        raise ValueError(f"Preset {name!r} has unknown settings: {', '.join(sorted(unknown))}")
+    settings = replace(EncodeSettings(), **values)
+    for spec in settings.renditions:
+        parse_rendition(spec)
+    return replace(settings, renditions=tuple(settings.renditions))
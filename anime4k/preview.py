@@ -0,0 +1,120 @@
+"""Preview renders: upscale a few short clips of a file to judge settings before the full encode.
+
+The clips are spread over the whole video. Each one is cut frame-exactly
+from the source, and all of them are upscaled in parallel with the
+settings under test. The cut and upscaled clips are then joined into two
+short videos that play side by side in the compare viewer. The measured
+encode speed gives an estimate for the full file.
+"""
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from anime4k.analysis import resolve_shader
+from anime4k.chunked import concat_list_line
+from anime4k.command import build_command, fit_settings
+from anime4k.metrics import ProgressParser
+from anime4k.runner import run_quiet, run_with_progress
+from anime4k.tools import cache_dir, ffmpeg_path
+
+
+@dataclass
+class PreviewResult:
+    source: Path
+    upscaled: Path
+    # Size of the upscaled clips, fitted to the source's aspect ratio
+    width: int
+    height: int
+    clips: int
+    frames: int
+    wall_s: float
+    # Average speed of one clip encode while all clips ran at once, so estimates err on the slow side
+    fps: float
+    # Frames per second of all clip encodes together
+    parallel_fps: float
+    estimate_s: float = None
+
+
+def clip_starts(duration, count=5, length=3.0):
+    """Start times of ``count`` clips centred on evenly spaced points of the video."""
+    length = min(length, duration / count)
+    return [round(min(max((i + 0.5) * duration / count - length / 2, 0), duration - length), 3)
+            for i in range(count)], length
+
+
+def cut_clip(source, start, length, output):
+    # Re-encoded losslessly rather than stream copied so the clip starts on the exact frame.
+    # noinspection SpellCheckingInspection
+    run_quiet([
+        ffmpeg_path(),
+        "-loglevel", "error",
+        "-y",
+        "-ss", f"{start:.3f}",
+        "-i", str(source),
+        "-t", f"{length:.3f}",
+        "-map", "0:v:0",
+        "-c:v", "libx264",
+        "-preset", "ultrafast",
+        "-qp", "0",
+        str(output),
+    ])
+
+
+def join_clips(clips, output, work_dir):
+    concat_list = work_dir / f"{output.stem}.txt"
+    with open(concat_list, "w", encoding="utf-8") as f:
+        f.writelines(concat_list_line(clip) for clip in clips)
+    # noinspection SpellCheckingInspection
+    run_quiet([ffmpeg_path(), "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", str(concat_list),
+               "-c", "copy", str(output)])
+
+
+def render_preview(source, info, settings, count=5, length=3.0, work_dir=None, on_message=None):
+    """Upscale ``count`` clips of ``length`` seconds from ``source`` (probed as ``info``) in parallel."""
+    if not info.duration:
+        raise ValueError(f"Cannot preview {source}: unknown duration.")
+    settings, choice = resolve_shader(source, info, fit_settings(info, settings))
+    if choice is not None and on_message is not None:
+        on_message(f"Shader: {choice.shader}, {choice.reason}")
+    work_dir = Path(work_dir or cache_dir() / "preview")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir(parents=True)
+    starts, length = clip_starts(info.duration, count, length)
+    originals = [work_dir / f"source_{index:02d}.mkv" for index in range(len(starts))]
+    upscaled = [work_dir / f"upscaled_{index:02d}.mkv" for index in range(len(starts))]
+    parsers = [ProgressParser(duration=length) for _ in starts]
+
+    def upscale(index):
+        cut_clip(source, starts[index], length, originals[index])
+        command = build_command(originals[index], upscaled[index], settings, video_only=True, overwrite=True)
+        run_with_progress(command, duration=length, parser=parsers[index])
+
+    if on_message is not None:
+        on_message(f"Upscaling {len(starts)} clips of {length:g}s at "
+                   + ", ".join(time.strftime("%H:%M:%S", time.gmtime(start)) for start in starts) + "...")
+    began = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(starts)) as pool:
+        for future in [pool.submit(upscale, index) for index in range(len(starts))]:
+            future.result()
+    wall = time.monotonic() - began
+
+    join_clips(originals, work_dir / "preview-source.mkv", work_dir)
+    join_clips(upscaled, work_dir / "preview-upscaled.mkv", work_dir)
+    frames = sum(parser.metrics.frame for parser in parsers if parser.metrics)
+    speeds = [parser.metrics.avg_fps for parser in parsers if parser.metrics and parser.metrics.avg_fps]
+    fps = round(sum(speeds) / len(speeds), 2) if speeds else 0.0
+    total_frames = info.frame_count or (info.duration * info.fps if info.fps else None)
+    return PreviewResult(
+        source=work_dir / "preview-source.mkv",
+        upscaled=work_dir / "preview-upscaled.mkv",
+        width=settings.width,
+        height=settings.height,
+        clips=len(starts),
+        frames=frames,
+        wall_s=round(wall, 2),
+        fps=fps,
+        parallel_fps=round(frames / wall, 2) if wall else 0.0,
+        estimate_s=round(total_frames / fps) if total_frames and fps else None,
+    )
@@ -0,0 +1,266 @@
+"""ffprobe metadata with a bounded probe pool and a persistent on-disk cache."""
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+
+from anime4k.tools import cache_dir, ffprobe_path, popen_kwargs
+
+HDR_TRANSFERS = ("smpte2084", "arib-std-b67")
+HDR_SIDE_DATA = ("Mastering display metadata", "Content light level metadata", "DOVI configuration record")
+# Version of the probe cache file; bump it whenever MediaInfo gains or changes fields.
+CACHE_VERSION = 2
+
+
+class ProbeError(Exception):
+    pass
+
+
+@dataclass
+class MediaInfo:
+    path: str
+    size: int
+    mtime_ns: int
+    duration: float = None
+    frame_count: int = None
+    fps: float = None
+    width: int = None
+    height: int = None
+    sample_aspect_ratio: str = None
+    pix_fmt: str = None
+    hdr: bool = False
+    color_primaries: str = None
+    color_transfer: str = None
+    color_space: str = None
+    streams: list = field(default_factory=list)
+
+    @property
+    def resolution(self):
+        return f"{self.width}x{self.height}"
+
+    def summary(self):
+        duration = "?" if self.duration is None else f"{self.duration:.1f}s"
+        hdr = " HDR" if self.hdr else ""
+        return f"{self.resolution} {self.pix_fmt}{hdr}, {duration}, {len(self.streams)} streams"
+
+
+def _rate(value):
+    try:
+        num, den = value.split("/")
+        return float(num) / float(den) if float(den) else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_probe(path, stat, data):
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"
+                  and not s.get("disposition", {}).get("attached_pic")), {})
+    try:
+        duration = float(data["format"]["duration"])
+    except (KeyError, TypeError, ValueError):
+        duration = None
+    fps = _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate"))
+    tags = video.get("tags", {})
+    frame_count = _int(video.get("nb_frames")) or _int(tags.get("NUMBER_OF_FRAMES")) \
+        or _int(tags.get("NUMBER_OF_FRAMES-eng"))
+    if frame_count is None and duration and fps:
+        frame_count = round(duration * fps)
+    side_data = [entry.get("side_data_type") for entry in video.get("side_data_list", [])]
+    hdr = video.get("color_transfer") in HDR_TRANSFERS or any(kind in HDR_SIDE_DATA for kind in side_data)
+
+    return MediaInfo(
+        path=path,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        duration=duration,
+        frame_count=frame_count,
+        fps=fps,
+        width=_int(video.get("width")),
+        height=_int(video.get("height")),
+        sample_aspect_ratio=video.get("sample_aspect_ratio"),
+        pix_fmt=video.get("pix_fmt"),
+        hdr=hdr,
+        color_primaries=video.get("color_primaries"),
+        color_transfer=video.get("color_transfer"),
+        color_space=video.get("color_space"),
+        streams=[{"index": s.get("index"), "type": s.get("codec_type"), "codec": s.get("codec_name"),
+                  "language": s.get("tags", {}).get("language")} for s in streams],
+    )
+
+
+def run_ffprobe(path):
+    """Read format, stream and HDR side data for ``path`` in a single ffprobe call."""
+    result = subprocess.run(
+        [
+            ffprobe_path(),
+            "-v", "error",
+            "-show_format",
+            "-show_streams",
+            "-of", "json",
+            path
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        **popen_kwargs()
+    )
+    if result.returncode != 0:
+        raise ProbeError(result.stderr.strip() or f"ffprobe failed on {path}")
+    try:
+        return json.loads(result.stdout)
+    except json.JSONDecodeError as e:
+        raise ProbeError(f"Unreadable ffprobe output for {path}: {e}")
+
+
+class ProbeCache:
+    """JSON file of probe results keyed by path and invalidated by size and mtime.
+
+    A file written by another ``CACHE_VERSION`` is dropped as a whole, and
+    an entry missing any ``MediaInfo`` field counts as a miss, so files are
+    probed again rather than taking None for metadata they do have."""
+
+    def __init__(self, path=None):
+        self.path = path or cache_dir() / "probe_cache.json"
+        self._lock = threading.Lock()
+        self._entries = None
+        self._dirty = False
+
+    def load(self):
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+            # Version 1 files were a bare mapping of paths to entries.
+            if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+                self._entries = data["entries"]
+            else:
+                self._entries = {}
+
+    def get(self, path, stat):
+        with self._lock:
+            self._load()
+            entry = self._entries.get(path)
+        if not entry or any(item.name not in entry for item in fields(MediaInfo)):
+            return None
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return MediaInfo(**entry)
+        return None
+
+    def put(self, info):
+        with self._lock:
+            self._load()
+            self._entries[info.path] = asdict(info)
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "entries": self._entries}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+class ProbeService:
+    """Probe files on a bounded pool, sharing in-flight and cached results."""
+
+    def __init__(self, cache=None, max_workers=4):
+        self.cache = cache if cache is not None else ProbeCache()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe")
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def preload(self):
+        """Read the cache file in the background so the first lookup does not wait on disk."""
+        self._executor.submit(self.cache.load)
+
+    def cached(self, path):
+        path = os.path.abspath(path)
+        try:
+            return self.cache.get(path, os.stat(path))
+        except OSError:
+            return None
+
+    def submit(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            future = self._pending.get(path)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._probe, path)
+            self._pending[path] = future
+        future.add_done_callback(lambda _: self._forget(path, future))
+        return future
+
+    def probe(self, path):
+        info = self.submit(path).result()
+        self.cache.save()
+        return info
+
+    def probe_many(self, paths, on_result=None):
+        """Probe ``paths`` in parallel. Returns ``{path: MediaInfo or ProbeError}``."""
+        futures = {path: self.submit(path) for path in paths}
+        results = {}
+        for path, future in futures.items():
+            results[path] = self._result(future)
+            if on_result is not None:
+                on_result(path, results[path])
+        self.cache.save()
+        return results
+
+    def probe_async(self, paths, on_result):
+        """Like ``probe_many`` but returns at once; ``on_result`` runs on the pool threads."""
+        paths = list(paths)
+        remaining = [len(paths)]
+        lock = threading.Lock()
+
+        def done(path, future):
+            on_result(path, self._result(future))
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self.cache.save()
+
+        for path in paths:
+            self.submit(path).add_done_callback(lambda future, p=path: done(p, future))
+
+    @staticmethod
+    def _result(future):
+        try:
+            return future.result()
+        except ProbeError as e:
+            return e
+        except OSError as e:
+            return ProbeError(str(e))
+
+    def _probe(self, path):
+        stat = os.stat(path)
+        info = self.cache.get(path, stat)
+        if info is None:
+            info = parse_probe(path, stat, run_ffprobe(path))
+            self.cache.put(info)
+        return info
+
+    def _forget(self, path, future):
+        with self._lock:
+            if self._pending.get(path) is future:
+                del self._pending[path]
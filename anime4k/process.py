@@ -0,0 +1,30 @@
+"""Stopping the ffmpeg processes a job started, and nothing else."""
+import subprocess
+
+# Seconds ffmpeg gets to finish the file after "q", then after SIGTERM, before it is killed
+QUIT_TIMEOUT = 3
+TERMINATE_TIMEOUT = 2
+
+
+def stop_process(process, quit_timeout=QUIT_TIMEOUT, terminate_timeout=TERMINATE_TIMEOUT):
+    """Ask ``process`` (an ffmpeg ``Popen``) to quit, escalating to SIGTERM and SIGKILL on timeout.
+
+    Returns the exit code."""
+    if process.poll() is not None:
+        return process.returncode
+    if process.stdin is not None:
+        try:
+            process.stdin.write(b"q")
+            process.stdin.flush()
+        except (OSError, ValueError):  # stdin already closed or the process just exited
+            pass
+        try:
+            return process.wait(quit_timeout)
+        except subprocess.TimeoutExpired:
+            pass
+    process.terminate()
+    try:
+        return process.wait(terminate_timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        return process.wait()
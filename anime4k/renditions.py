@@ -0,0 +1,156 @@
+"""Several outputs from one decode and one shader pass.
+
+A job whose settings list ``renditions`` (say a 1080p H.264 copy next to a
+4K HEVC master) is encoded by a single ffmpeg process. The filter graph
+runs the Anime4K shader once, at the largest of all targets, ``split``s
+the result, and scales every smaller output down with a plain libplacebo
+pass. Each output is encoded with its own codec and rates.
+
+ffmpeg's own progress covers the process as a whole, so every output also
+writes its encoded frame numbers to a stats file (``-stats_enc_post``,
+ffmpeg 6.1 and later), which is polled to report each rendition's progress.
+"""
+import re
+import tempfile
+import threading
+from dataclasses import replace
+from pathlib import Path
+
+from anime4k.command import parse_rendition, rate_args, rendition_output, rendition_settings, thread_args, \
+    video_filter
+from anime4k.metrics import ProgressParser
+from anime4k.reuse import ffmpeg_version
+from anime4k.runner import run_with_progress
+from anime4k.tools import ffmpeg_path
+
+# Seconds between reads of the per-output stats files
+POLL_INTERVAL = 1.0
+# Progress of each rendition is logged in steps of this many percent
+REPORT_STEP = 25
+
+
+def rendition_outputs(output, settings):
+    """Output paths of a job: the main output first, then one per rendition."""
+    return [Path(output)] + [rendition_output(output, parse_rendition(spec)) for spec in settings.renditions]
+
+
+def targets(settings):
+    """The main settings followed by the settings of every rendition."""
+    return [settings] + [rendition_settings(settings, parse_rendition(spec)) for spec in settings.renditions]
+
+
+def filter_graph(settings):
+    """Shader once at the largest target, then ``split`` into one labelled stream per output."""
+    outputs = targets(settings)
+    top = max(outputs, key=lambda target: target.width * target.height)
+    graph = f"[0:v:0]{video_filter(replace(settings, width=top.width, height=top.height))}," \
+            f"split={len(outputs)}" + "".join(f"[s{index}]" for index in range(len(outputs)))
+    labels = []
+    for index, target in enumerate(outputs):
+        if (target.width, target.height) == (top.width, top.height):
+            labels.append(f"[s{index}]")
+        else:
+            graph += f";[s{index}]libplacebo=w={target.width}:h={target.height}:downscaler=ewa_lanczos[v{index}]"
+            labels.append(f"[v{index}]")
+    return graph, labels
+
+
+def build_rendition_command(source, output, settings, overwrite=False, threads=None, stats=None):
+    """One ffmpeg command writing ``output`` and every rendition; ``stats`` are per-output frame stats files."""
+    outputs = rendition_outputs(output, settings)
+    graph, labels = filter_graph(settings)
+    # noinspection SpellCheckingInspection
+    command = [ffmpeg_path(), "-loglevel", "info"]
+    if overwrite:
+        command.append("-y")
+    command += ["-i", str(source)]
+    if not settings.hdr:
+        command += ["-init_hw_device", "vulkan"]
+    command += ["-filter_complex", graph]
+    # The outputs of one process share the job's encoder threads.
+    threads = threads and max(1, threads // len(outputs))
+    for index, (path, target) in enumerate(zip(outputs, targets(settings))):
+        command += ["-map", labels[index], "-map", "0:s?", "-map", "0:a?",
+                    "-c:s", "copy", "-c:a", "copy", "-c:d", "copy"]
+        command += rate_args(target) + thread_args(target.codec, threads)
+        if settings.hdr:
+            command += ["-map_metadata", "0"]
+        if stats is not None:
+            command += ["-stats_enc_post:v:0", str(stats[index]), "-stats_enc_post_fmt:v:0", "{n}"]
+        command.append(str(path))
+    return command
+
+
+def stats_supported():
+    """``-stats_enc_post`` arrived in ffmpeg 6.1; builds from git report no version number and have it."""
+    match = re.search(r"version n?(\d+)\.(\d+)", ffmpeg_version())
+    return match is None or (int(match.group(1)), int(match.group(2))) >= (6, 1)
+
+
+def encoded_frames(path):
+    """Frames written so far according to a stats file, 0 while it is missing or empty."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() - 64))
+            lines = f.read().split(b"\n")
+    except OSError:
+        return 0
+    # The last line may be half written; the one before it is complete.
+    for line in reversed(lines[:-1]):
+        if line.strip().isdigit():
+            return int(line) + 1
+    return 0
+
+
+class RenditionEncode:
+    """Upscale ``source`` once and encode the main output and all renditions in the same process."""
+
+    def __init__(self, source, output, settings, info, on_message=None, threads=None):
+        self.source = str(source)
+        self.output = Path(output)
+        self.settings = settings
+        self.info = info
+        self.on_message = on_message
+        self.threads = threads
+        self.outputs = rendition_outputs(output, settings)
+        self.names = [f"{target.width}x{target.height} {target.codec}" for target in targets(settings)]
+
+    def message(self, text):
+        if self.on_message is not None:
+            self.on_message(text)
+
+    def _watch(self, stats, done):
+        reported = [0] * len(stats)
+        while not done.wait(POLL_INTERVAL):
+            for index, path in enumerate(stats):
+                percent = min(100, encoded_frames(path) * 100 // self.info.frame_count)
+                step = percent // REPORT_STEP * REPORT_STEP
+                if step > reported[index]:
+                    reported[index] = step
+                    self.message(f"{self.names[index]}: {step}%")
+
+    def run(self, job=None, on_progress=None, on_metrics=None):
+        parser = ProgressParser(self.info.frame_count, self.info.duration, on_metrics)
+        self.message(f"Encoding {len(self.outputs)} outputs from one upscale: {', '.join(self.names)}")
+        with tempfile.TemporaryDirectory(prefix="pyanime4k-renditions-") as stats_dir:
+            stats = None
+            if self.info.frame_count and stats_supported():
+                stats = [Path(stats_dir) / f"output_{index}.txt" for index in range(len(self.outputs))]
+            command = build_rendition_command(self.source, self.output, self.settings, threads=self.threads,
+                                              stats=stats)
+            done = threading.Event()
+            watcher = None
+            if stats is not None:
+                watcher = threading.Thread(target=self._watch, args=(stats, done), daemon=True)
+                watcher.start()
+            try:
+                run_with_progress(command, duration=self.info.duration, on_progress=on_progress, job=job,
+                                  parser=parser)
+            finally:
+                done.set()
+                if watcher is not None:
+                    watcher.join()
+        for name, path in zip(self.names[1:], self.outputs[1:]):
+            self.message(f"{name} -> {path}")
+        return self.outputs
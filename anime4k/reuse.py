@@ -0,0 +1,146 @@
+"""Content-addressed index of finished upscales, so unchanged jobs are not encoded twice.
+
+Every job gets a key made of a partial content hash of the source, all
+encode settings with a hash of the shader file, and the ffmpeg version. The
+index lives next to the outputs in the output directory and maps keys to
+output files together with a partial hash of each output. An output is
+only reused while it still matches that hash, and a job whose source was
+renamed gets a hard link to the existing output instead of a new encode.
+"""
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import asdict
+
+from anime4k.tools import SHADER_DIR, ffmpeg_path, popen_kwargs
+
+INDEX_NAME = ".pyanime4k-index.json"
+# Bytes read from the start, middle and end of a file for its partial hash
+SAMPLE_SIZE = 4 * 1024 * 1024
+
+
+def partial_hash(path, sample_size=SAMPLE_SIZE):
+    """SHA-1 of the size and three samples of ``path``; the whole file when it is small."""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= 3 * sample_size:
+            digest.update(f.read())
+        else:
+            for offset in (0, (size - sample_size) // 2, size - sample_size):
+                f.seek(offset)
+                digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _file_hash(path, mtime_ns):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def shader_hash(shader):
+    path = SHADER_DIR / shader
+    try:
+        return _file_hash(str(path), os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_version(ffmpeg=None):
+    """First line of ``ffmpeg -version``, e.g. ``ffmpeg version 7.1 Copyright ...``."""
+    result = subprocess.run([ffmpeg or ffmpeg_path(), "-version"], stdin=subprocess.DEVNULL, capture_output=True,
+                            text=True, errors="replace", **popen_kwargs())
+    return result.stdout.split("\n", 1)[0].strip()
+
+
+def job_key(source, settings, source_hash=None):
+    values = asdict(settings)
+    for name, default in (("quality", 0), ("renditions", ()), ("native", "scale"), ("aspect", "keep")):
+        if not values[name] or values[name] == default:
+            # Settings added later are left out at their defaults, so older index entries stay valid.
+            del values[name]
+    data = {
+        "source": source_hash or partial_hash(source),
+        "settings": values,
+        "shader": shader_hash(settings.shader),
+        "ffmpeg": ffmpeg_version(),
+    }
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class OutputIndex:
+    """The index file of one output directory. Safe to share between the jobs of a batch."""
+
+    def __init__(self, output_dir):
+        self.output_dir = str(output_dir)
+        self.path = os.path.join(self.output_dir, INDEX_NAME)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def _verified(self, entry):
+        path = os.path.join(self.output_dir, entry["output"])
+        try:
+            if os.path.getsize(path) != entry["size"]:
+                return None
+            return path if partial_hash(path) == entry["hash"] else None
+        except (OSError, KeyError):
+            return None
+
+    def lookup(self, key):
+        """Path of an output made for ``key`` that is still intact, else None."""
+        with self._lock:
+            entry = self._load().get(key)
+        if entry is None:
+            return None
+        return self._verified(entry)
+
+    def record(self, key, output, source):
+        entry = {
+            "output": os.path.basename(output),
+            "size": os.path.getsize(output),
+            "hash": partial_hash(output),
+            "source": os.path.basename(source),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with self._lock:
+            # Re-read so entries written by another batch into the same folder are kept.
+            entries = self._load()
+            entries[key] = entry
+            self._save({k: v for k, v in entries.items()
+                        if os.path.exists(os.path.join(self.output_dir, v["output"]))})
+
+    def reuse(self, key, output):
+        """Make ``output`` the finished result for ``key`` if the index has one; True on success."""
+        existing = self.lookup(key)
+        if existing is None:
+            return False
+        if os.path.exists(output):
+            if os.path.samefile(existing, output):
+                return True
+            # Whatever is there was not made from this source and these settings; an encode would overwrite it.
+            os.remove(output)
+        try:
+            os.link(existing, output)
+        except OSError:
+            # File systems without hard links (FAT, some network shares) get a copy.
+            shutil.copy2(existing, output)
+        return True
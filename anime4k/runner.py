@@ -0,0 +1,60 @@
+"""Run ffmpeg commands while reporting progress and honouring job cancellation.
+
+A process started for a job is owned by that job while it runs, so
+cancelling the job stops exactly that process and no other ffmpeg.
+"""
+import subprocess
+
+from anime4k.scheduler import JobCancelled
+from anime4k.tools import popen_kwargs
+
+
+def run_with_progress(command, duration=None, on_progress=None, job=None, parser=None):
+    """``parser`` is an optional ``ProgressParser`` fed with every output line for detailed metrics."""
+    from ffmpeg_progress_yield import FfmpegProgress
+
+    process = FfmpegProgress(command)
+    if parser is not None:
+        process.stderr_callback = parser.feed
+    owned = None
+    try:
+        for progress in process.run_command_with_progress(popen_kwargs=popen_kwargs(), duration_override=duration):
+            if job is not None and owned is None:
+                owned = process.process
+                job.own(owned)
+            if job is not None and job.cancel_requested:
+                # Keep reading until the stopped process exits; leaving the loop would kill it outright.
+                continue
+            if on_progress is not None:
+                on_progress(progress)
+    except RuntimeError:
+        # A process stopped by a cancel exits with an error, which is not a failure of the job.
+        if job is not None and job.cancel_requested:
+            raise JobCancelled(job.name)
+        raise
+    finally:
+        if owned is not None:
+            job.release(owned)
+    if job is not None and job.cancel_requested:
+        # "q" lets ffmpeg finish the file cleanly, but it is still cut short.
+        raise JobCancelled(job.name)
+    return process
+
+
+def run_quiet(command, job=None):
+    """Run a short ffmpeg command (split, concat, remux) and raise on failure."""
+    # No stdin to send "q" to, so a cancel goes straight to SIGTERM, which ffmpeg also handles cleanly.
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, errors="replace", **popen_kwargs())
+    if job is not None:
+        job.own(process)
+    try:
+        stdout, stderr = process.communicate()
+    finally:
+        if job is not None:
+            job.release(process)
+    if job is not None and job.cancel_requested:
+        raise JobCancelled(job.name)
+    if process.returncode != 0:
+        raise RuntimeError(f"Error running command {command}: {stderr[-4000:]}")
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
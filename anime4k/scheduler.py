@@ -0,0 +1,185 @@
+"""Bounded worker pool that runs queued encode jobs in parallel."""
+import itertools
+import threading
+from collections import deque
+
+from anime4k.process import stop_process
+
+
+class JobState:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, name, work, source=None, output=None):
+        self.id = next(Job._ids)
+        self.name = name
+        self.work = work
+        self.source = source
+        self.output = output
+        # Row of the job in the persistent queue, when it has one
+        self.record_id = None
+        # Settings the job runs with, once its encoder has resolved them
+        self.settings = None
+        self.state = JobState.QUEUED
+        self.error = None
+        self.cancel_requested = False
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.state in JobState.FINISHED
+
+    def check_cancelled(self):
+        if self.cancel_requested:
+            raise JobCancelled(self.name)
+
+    def own(self, process):
+        """Register a subprocess of this job so ``stop`` can end it; stopped at once if already cancelled."""
+        with self._lock:
+            self._processes.add(process)
+        if self.cancel_requested:
+            self.stop()
+
+    def release(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def stop(self):
+        """Stop this job's own subprocesses in the background, each one escalating from ``q`` to SIGKILL."""
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            threading.Thread(target=stop_process, args=(process,), daemon=True).start()
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.name!r} {self.state}>"
+
+
+class JobScheduler:
+    """Run jobs on up to ``max_workers`` threads, starting the next queued job
+    as soon as any running one finishes."""
+
+    def __init__(self, max_workers=1, on_state_change=None):
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._jobs = []
+        self._running = set()
+        self._workers = 0
+        self._max_workers = max(1, int(max_workers))
+        self.on_state_change = on_state_change
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    def set_max_workers(self, max_workers):
+        with self._cond:
+            self._max_workers = max(1, int(max_workers))
+            self._spawn_workers()
+
+    @property
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs)
+
+    @property
+    def running(self):
+        with self._cond:
+            return list(self._running)
+
+    def submit(self, job):
+        with self._cond:
+            self._jobs.append(job)
+            self._queue.append(job)
+        self._notify(job)
+        with self._cond:
+            self._spawn_workers()
+        return job
+
+    def cancel(self, job=None):
+        """Cancel ``job``, or every unfinished job when ``job`` is None.
+
+        Queued jobs are dropped immediately; running jobs get
+        ``cancel_requested`` set and the processes they own are stopped."""
+        cancelled = []
+        running = []
+        with self._cond:
+            targets = [job] if job is not None else list(self._jobs)
+            for target in targets:
+                if target.finished:
+                    continue
+                target.cancel_requested = True
+                if target.state == JobState.QUEUED:
+                    self._queue.remove(target)
+                    target.state = JobState.CANCELLED
+                    cancelled.append(target)
+                else:
+                    running.append(target)
+            self._cond.notify_all()
+        for target in running:
+            target.stop()
+        for target in cancelled:
+            self._notify(target)
+
+    def clear(self):
+        with self._cond:
+            self._jobs = [job for job in self._jobs if not job.finished]
+
+    def wait(self, timeout=None):
+        """Block until nothing is queued or running. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._running, timeout)
+
+    def _spawn_workers(self):
+        while self._workers < min(self._max_workers, len(self._queue) + len(self._running)):
+            self._workers += 1
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                if not self._queue or len(self._running) >= self._max_workers:
+                    self._workers -= 1
+                    self._cond.notify_all()
+                    return
+                job = self._queue.popleft()
+                job.state = JobState.RUNNING
+                self._running.add(job)
+            self._notify(job)
+            self._run(job)
+            self._notify(job)
+            with self._cond:
+                self._running.discard(job)
+                self._cond.notify_all()
+
+    # noinspection PyBroadException
+    def _run(self, job):
+        try:
+            job.work(job)
+            job.state = JobState.CANCELLED if job.cancel_requested else JobState.DONE
+        except JobCancelled:
+            job.state = JobState.CANCELLED
+        except Exception as e:
+            if job.cancel_requested:
+                job.state = JobState.CANCELLED
+            else:
+                job.error = e
+                job.state = JobState.FAILED
+
+    def _notify(self, job):
+        if self.on_state_change is not None:
+            self.on_state_change(job)
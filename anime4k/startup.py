@@ -0,0 +1,29 @@
+"""Startup timing for ``--startup-profile``; stdlib only so it can load first."""
+import sys
+import time
+
+# Modules that must stay off the startup path; they are imported on first use.
+LAZY_MODULES = ("cv2", "numpy", "psutil", "ffmpeg_progress_yield")
+
+
+class StartupProfile:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.marks = []
+
+    def mark(self, label):
+        if self.enabled:
+            self.marks.append((label, time.perf_counter()))
+
+    def report(self, stream=sys.stderr):
+        if not self.enabled:
+            return
+        previous = self.start
+        stream.write(f"{'step':<28}{'delta ms':>10}{'total ms':>10}\n")
+        for label, when in self.marks:
+            stream.write(f"{label:<28}{(when - previous) * 1000:>10.1f}{(when - self.start) * 1000:>10.1f}\n")
+            previous = when
+        loaded = [name for name in LAZY_MODULES if name in sys.modules]
+        stream.write(f"lazy modules loaded at startup: {', '.join(loaded) or 'none'}\n")
+        stream.flush()
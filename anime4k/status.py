@@ -0,0 +1,55 @@
+"""Coalesced per-job status rows and the rotating log file behind the GUI log view."""
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+
+from anime4k.tools import cache_dir
+
+# The log view keeps this many lines; everything is also written to the log file.
+LOG_MAX_BLOCKS = 2000
+STATUS_INTERVAL_MS = 250
+
+
+class StatusBoard:
+    """Latest status line per job. Workers overwrite rows freely, the GUI reads them at its own pace."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._dirty = False
+
+    def set(self, key, line):
+        with self._lock:
+            if self._rows.get(key) != line:
+                self._rows[key] = line
+                self._dirty = True
+
+    def remove(self, key):
+        with self._lock:
+            if self._rows.pop(key, None) is not None:
+                self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._dirty = bool(self._rows)
+            self._rows.clear()
+
+    def take(self):
+        """Rows in insertion order if anything changed since the last call, otherwise None."""
+        with self._lock:
+            if not self._dirty:
+                return None
+            self._dirty = False
+            return list(self._rows.values())
+
+
+def log_file(name="PyAnime4K.log", max_bytes=5 * 1024 * 1024, backups=3):
+    logger = logging.getLogger("anime4k.log")
+    if not logger.handlers:
+        handler = RotatingFileHandler(cache_dir() / name, maxBytes=max_bytes, backupCount=backups,
+                                      encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
@@ -0,0 +1,41 @@
+"""Locations of the bundled ffmpeg binaries and per-user cache files."""
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SHADER_DIR = ROOT / "shaders"
+
+
+def _binary(name):
+    bundled = ROOT / "ffmpeg" / (f"{name}.exe" if sys.platform == "win32" else name)
+    if bundled.exists():
+        return str(bundled)
+    return shutil.which(name) or str(bundled)
+
+
+def ffmpeg_path():
+    return _binary("ffmpeg")
+
+
+def ffprobe_path():
+    return _binary("ffprobe")
+
+
+def popen_kwargs():
+    """Extra Popen arguments so child processes never open a console window."""
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.CREATE_NO_WINDOW}
+    return {}
+
+
+def cache_dir():
+    if sys.platform == "win32":
+        base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    path = base / "PyAnime4K"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
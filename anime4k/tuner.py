@@ -0,0 +1,144 @@
+"""Adaptive number of parallel jobs, tuned while a batch runs.
+
+Every ``interval`` seconds the tuner looks at CPU load, available memory
+and the combined fps of the running jobs, and adds a job while that still
+raises throughput. It climbs one job at a time. An extra job that does not
+raise the total fps by at least ``MIN_GAIN`` is taken back, and the
+current count then becomes the ceiling. Low memory always lowers the
+count, and the ceiling it set is lifted again once memory is back above
+``RECOVERED_FREE_MEMORY``. Hardware encoders start at two jobs and stop
+at a few sessions; CPU encoders start at one job and share the cores, so
+every new CPU job gets ``-threads`` (x264, aom) or an x265 thread pool
+sized to its share. A batch that mixes codecs is held to the strictest
+of their limits.
+
+Every change is reported through ``on_decision``.
+"""
+import importlib.util
+import os
+import threading
+
+from anime4k.capabilities import HARDWARE_SUFFIXES
+from anime4k.scheduler import JobState
+
+# A hardware encoder's throughput stops growing after a few sessions.
+HARDWARE_SESSIONS = 3
+MIN_GAIN = 0.05
+CPU_BUSY_PERCENT = 85
+MIN_FREE_MEMORY = 0.10
+# Free memory at which a ceiling set by low memory is lifted again
+RECOVERED_FREE_MEMORY = 0.20
+
+
+def is_hardware(codec):
+    return codec.endswith(HARDWARE_SUFFIXES)
+
+
+class ConcurrencyTuner:
+    """``codecs`` is the codec of the batch, or a list of the codecs its jobs use."""
+
+    def __init__(self, scheduler, codecs, on_decision=None, interval=15.0, cpu_count=None):
+        self.scheduler = scheduler
+        self.codecs = sorted({codecs} if isinstance(codecs, str) else set(codecs))
+        self.on_decision = on_decision
+        self.interval = interval
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.hardware = all(is_hardware(codec) for codec in self.codecs)
+        # The strictest limit of all codecs in the batch
+        self.ceiling = min(HARDWARE_SESSIONS if is_hardware(codec) else max(1, self.cpu_count // 2)
+                           for codec in self.codecs)
+        self.workers = min(2, self.ceiling) if self.hardware else 1
+        self._fps = {}
+        self._baseline = None
+        # Ceiling from before low memory lowered it, restored once memory recovers
+        self._memory_ceiling = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        scheduler.set_max_workers(self.workers)
+
+    def threads(self, codec=None):
+        """Encoder threads for a job of ``codec`` that starts now, None for hardware encoders."""
+        if is_hardware(codec) if codec else self.hardware:
+            return None
+        return max(1, self.cpu_count // self.workers)
+
+    def record(self, job, metrics):
+        with self._lock:
+            if metrics.finished:
+                self._fps.pop(job.id, None)
+            else:
+                self._fps[job.id] = metrics.fps
+
+    def throughput(self):
+        """Combined fps of the running jobs and how many of them have reported."""
+        running = {job.id for job in self.scheduler.running}
+        with self._lock:
+            fps = [value for job_id, value in self._fps.items() if job_id in running]
+        return sum(fps), len(fps)
+
+    def _set(self, workers, reason):
+        self.workers = workers
+        self.scheduler.set_max_workers(workers)
+        if self.on_decision is not None:
+            self.on_decision(f"{workers} parallel job{'s' if workers > 1 else ''}: {reason}")
+
+    def step(self, cpu_percent, free_memory):
+        """One tuning decision from CPU load (percent) and free memory (fraction of total)."""
+        fps, reporting = self.throughput()
+        waiting = sum(job.state == JobState.QUEUED for job in self.scheduler.jobs)
+        if free_memory < MIN_FREE_MEMORY:
+            if self.workers > 1:
+                if self._memory_ceiling is None:
+                    self._memory_ceiling = self.ceiling
+                self.ceiling = self.workers - 1
+                self._baseline = None
+                self._set(self.workers - 1, f"only {free_memory:.0%} memory free")
+            return
+        if self._memory_ceiling is not None and free_memory >= RECOVERED_FREE_MEMORY:
+            self.ceiling, self._memory_ceiling = max(self.ceiling, self._memory_ceiling), None
+            if self.on_decision is not None:
+                self.on_decision(f"{free_memory:.0%} memory free again, up to {self.ceiling} parallel jobs")
+        if self._baseline is not None:
+            if reporting < self.workers:
+                # The added job has not reported yet, or one just finished; judge on the next round.
+                return
+            baseline, self._baseline = self._baseline, None
+            if fps < baseline * (1 + MIN_GAIN):
+                self.ceiling = self.workers - 1
+                self._set(self.workers - 1, f"no gain from one more job ({fps:.1f} fps against {baseline:.1f})")
+                return
+            if self.on_decision is not None:
+                self.on_decision(f"{self.workers} parallel jobs raised throughput to {fps:.1f} fps "
+                                 f"from {baseline:.1f}")
+        if waiting and self.workers < self.ceiling and cpu_percent < CPU_BUSY_PERCENT and reporting:
+            self._baseline = fps
+            self._set(self.workers + 1, f"CPU {cpu_percent:.0f}%, {free_memory:.0%} memory free, "
+                                        f"{fps:.1f} fps so far")
+
+    def _run(self):
+        import psutil
+
+        psutil.cpu_percent()
+        while not self._stopped.wait(self.interval):
+            memory = psutil.virtual_memory()
+            self.step(psutil.cpu_percent(), memory.available / memory.total)
+
+    def start(self):
+        if importlib.util.find_spec("psutil") is None:
+            if self.on_decision is not None:
+                self.on_decision(f"psutil is not installed, staying at {self.workers} parallel jobs")
+            return self
+        if self.on_decision is not None:
+            kinds = ", ".join(f"{'hardware' if is_hardware(codec) else 'CPU'} encoder {codec}"
+                              for codec in self.codecs)
+            self.on_decision(f"starting with {self.workers} parallel job{'s' if self.workers > 1 else ''} "
+                             f"for {kinds}, at most {self.ceiling}")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()